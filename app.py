@@ -9,14 +9,19 @@ from flask_jwt_extended import JWTManager, create_access_token, jwt_required, ge
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 import os
+import atexit
 from datetime import datetime, timedelta
 import logging
 
 from src.trust_engine import TrustEngine
-from src.database import Database
+from src.database import create_database
 from src.auth import AuthManager
-from src.utils import setup_logging, validate_input
+from src.utils import setup_logging, validate_input, load_config
 from src.demo_data import DemoDataGenerator
+from src.write_behind import WriteBehindQueue
+from src.geoip import GeoIPLocator
+from src.user_agent_parser import UserAgentParser
+from src.factor_pool import FactorPool, parse_deadlines
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -33,8 +38,32 @@ limiter = Limiter(
 limiter.init_app(app)
 
 # Initialize components
-db = Database()
-trust_engine = TrustEngine(db)
+config = load_config()
+db = create_database(config)
+writer = db
+if config['write_behind']['enabled']:
+    writer = WriteBehindQueue(
+        db,
+        batch_size=config['write_behind']['batch_size'],
+        max_depth=config['write_behind']['max_depth'],
+        max_delay_ms=config['write_behind']['max_delay_ms']
+    )
+    atexit.register(writer.close)
+geoip = GeoIPLocator(config['geoip']['database'], cache_size=config['geoip']['cache_size'])
+atexit.register(geoip.close)
+user_agent_parser = UserAgentParser(cache_size=config['user_agent_cache']['size'])
+if config['user_agent_cache']['warm_up']:
+    user_agent_parser.warm_up(db.get_common_user_agents(limit=config['user_agent_cache']['size']))
+factor_pool = None
+if config['factor_pool']['enabled']:
+    factor_pool = FactorPool(
+        max_workers=config['factor_pool']['size'],
+        default_deadline_ms=config['factor_pool']['deadline_ms'],
+        deadlines_ms=parse_deadlines(config['factor_pool']['deadlines_ms'])
+    )
+    atexit.register(factor_pool.close)
+trust_engine = TrustEngine(db, writer=writer, geoip=geoip, user_agent_parser=user_agent_parser,
+                           factor_pool=factor_pool)
 auth_manager = AuthManager(db)
 demo_generator = DemoDataGenerator(db)
 
@@ -45,11 +74,20 @@ logger = logging.getLogger(__name__)
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    return jsonify({
+    health = {
         'status': 'healthy',
         'timestamp': datetime.utcnow().isoformat(),
-        'version': '1.0.0'
-    })
+        'version': '1.0.0',
+        'database_pool': db.get_pool_stats(),
+        'geoip': geoip.stats(),
+        'user_agent_cache': user_agent_parser.stats(),
+        'score_factors_cache': db.get_score_factors_cache_stats()
+    }
+    if writer is not db:
+        health['write_behind'] = writer.stats()
+    if factor_pool is not None:
+        health['factor_pool'] = factor_pool.stats()
+    return jsonify(health)
 
 @app.route('/api/auth/login', methods=['POST'])
 @limiter.limit("5 per minute")
@@ -79,10 +117,12 @@ def login():
             'timestamp': datetime.utcnow()
         }
         
-        trust_result = trust_engine.analyze_activity(context)
-        
-        # Log the activity
-        db.log_activity(user['id'], 'login', trust_result, context)
+        # Trust score and activity log for this decision commit together
+        with writer.unit_of_work() as uow:
+            trust_result = trust_engine.analyze_activity(context, uow=uow)
+            
+            # Log the activity
+            uow.log_activity(user['id'], 'login', trust_result, context)
         
         response = {
             'access_token': access_token,
@@ -185,11 +225,13 @@ def analyze_transaction():
             'timestamp': datetime.utcnow()
         }
         
-        # Analyze with trust engine
-        trust_result = trust_engine.analyze_activity(context)
-        
-        # Log the activity
-        db.log_activity(user_id, 'transaction', trust_result, context)
+        # Analyze with trust engine; the trust score and activity log for
+        # this decision commit together
+        with writer.unit_of_work() as uow:
+            trust_result = trust_engine.analyze_activity(context, uow=uow)
+            
+            # Log the activity
+            uow.log_activity(user_id, 'transaction', trust_result, context)
         
         response = {
             'transaction_id': trust_result.get('transaction_id'),
@@ -10,9 +10,9 @@ from datetime import datetime
 # Add src directory to path
 sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
 
-from src.database import Database
+from src.database import create_database
 from src.demo_data import DemoDataGenerator
-from src.utils import setup_logging
+from src.utils import setup_logging, load_config
 
 def main():
     """Initialize the TrustAI database with demo data"""
@@ -23,9 +23,11 @@ def main():
     print("🛡️ TrustAI Database Initialization")
     print("=" * 50)
     
-    # Initialize database
+    # Initialize database (seeding writes thousands of rows, skip the fsyncs)
     print("📊 Initializing database...")
-    db = Database()
+    config = load_config()
+    config['database_profile'] = 'bulk-load'
+    db = create_database(config)
     
     # Create demo data generator
     demo_generator = DemoDataGenerator(db)
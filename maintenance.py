@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+TrustAI Maintenance Commands - Rebuild derived tables after migrations or backfills
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+# Add src directory to path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
+
+from src.database import create_database
+from src.migrations import MIGRATION_BUSY_TIMEOUT_MS, merge_duplicates as merge_duplicate_rows
+from src.utils import setup_logging, load_config
+
+
+def rebuild_activity_hours(db):
+    """Recompute the per-user hour-of-week activity histogram from activities"""
+    print("🕒 Rebuilding activity hour histogram...")
+    started = time.monotonic()
+    buckets = db.rebuild_activity_hours()
+    print(f"✅ Wrote {buckets} user/hour buckets in {time.monotonic() - started:.2f}s")
+
+
+def rebuild_velocity(db):
+    """Recompute the sliding-window transaction velocity buckets"""
+    if getattr(db, 'velocity', None) is not None:
+        # Rebuilding here would only refill this process's throwaway copy
+        sys.exit("❌ VELOCITY_STORE=memory keeps velocity counters inside each server process, "
+                 "which rebuilds them from transactions at startup; restart the servers instead")
+    print("⚡ Rebuilding transaction velocity buckets...")
+    started = time.monotonic()
+    buckets = db.rebuild_velocity()
+    print(f"✅ Wrote {buckets} velocity buckets in {time.monotonic() - started:.2f}s")
+
+
+def rebuild_location_clusters(db):
+    """Recompute the per-user location clusters from stored locations"""
+    print("📍 Rebuilding location clusters...")
+    started = time.monotonic()
+    clusters = db.rebuild_location_clusters()
+    print(f"✅ Wrote {clusters} location clusters in {time.monotonic() - started:.2f}s")
+
+
+def rebuild_location_index(db):
+    """Recompute the spatial index over stored locations"""
+    print("🗺️ Rebuilding location index...")
+    started = time.monotonic()
+    rows = db.rebuild_location_index()
+    print(f"✅ Indexed {rows} locations in {time.monotonic() - started:.2f}s")
+
+
+def rebuild_device_index(db):
+    """Recompute the per-user device component index"""
+    print("📱 Rebuilding device index...")
+    started = time.monotonic()
+    rows = db.rebuild_device_index()
+    print(f"✅ Indexed {rows} device components in {time.monotonic() - started:.2f}s")
+
+
+def rebuild_behavior_profiles(db):
+    """Recompute the per-user behavior profiles from activities"""
+    print("🧭 Rebuilding behavior profiles...")
+    started = time.monotonic()
+    profiles = db.rebuild_behavior_profiles()
+    print(f"✅ Wrote {profiles} behavior profiles in {time.monotonic() - started:.2f}s")
+
+
+def rebuild_amount_stats(db):
+    """Recompute the per-user transaction amount statistics in one pass over transactions"""
+    print("💰 Rebuilding transaction amount statistics...")
+    started = time.monotonic()
+    users = db.rebuild_amount_stats()
+    print(f"✅ Wrote amount statistics for {users} users in {time.monotonic() - started:.2f}s")
+
+
+def rebuild_decayed_trust_scores(db):
+    """Recompute every user's time-decayed trust score from the score history"""
+    print("📉 Rebuilding decayed trust scores...")
+    started = time.monotonic()
+    users = db.rebuild_decayed_trust_scores()
+    print(f"✅ Wrote decayed trust scores for {users} users in {time.monotonic() - started:.2f}s")
+
+
+def merge_duplicates(db_path):
+    """Merge device fingerprints and locations stored more than once per user, so migration 7 can apply"""
+    print("🧹 Merging duplicate device fingerprints and locations...")
+    started = time.monotonic()
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute(f'PRAGMA busy_timeout = {MIGRATION_BUSY_TIMEOUT_MS}')
+        conn.execute('BEGIN IMMEDIATE')
+        removed = merge_duplicate_rows(conn)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    print(f"✅ Removed {removed} duplicate rows in {time.monotonic() - started:.2f}s")
+
+
+COMMANDS = {
+    'rebuild-activity-hours': rebuild_activity_hours,
+    'rebuild-velocity': rebuild_velocity,
+    'rebuild-location-clusters': rebuild_location_clusters,
+    'rebuild-location-index': rebuild_location_index,
+    'rebuild-device-index': rebuild_device_index,
+    'rebuild-behavior-profiles': rebuild_behavior_profiles,
+    'rebuild-amount-stats': rebuild_amount_stats,
+    'rebuild-decayed-trust-scores': rebuild_decayed_trust_scores,
+}
+
+# Commands run on the SQLite file itself: they fix data that stops the
+# startup migrations, so they cannot go through create_database
+SQLITE_FILE_COMMANDS = {
+    'merge-duplicates': merge_duplicates,
+}
+
+
+def main():
+    """Run one maintenance command against the configured database"""
+    parser = argparse.ArgumentParser(description='TrustAI maintenance commands')
+    parser.add_argument('command', choices=sorted(COMMANDS) + sorted(SQLITE_FILE_COMMANDS), help='command to run')
+    args = parser.parse_args()
+
+    setup_logging()
+    config = load_config()
+    if args.command in SQLITE_FILE_COMMANDS:
+        url = config['database_url']
+        if not url.startswith('sqlite:///'):
+            # The SQLAlchemy backend merges duplicates in its own migration
+            parser.error(f"{args.command} applies to SQLite databases only")
+        SQLITE_FILE_COMMANDS[args.command](url[len('sqlite:///'):] or 'trustai.db')
+        return
+
+    db = create_database(config)
+    try:
+        COMMANDS[args.command](db)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
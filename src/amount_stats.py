@@ -0,0 +1,196 @@
+"""
+TrustAI Amount Statistics - Streaming per-user transaction amount mean, variance and quantiles
+"""
+
+import math
+from collections import Counter
+from itertools import groupby
+from typing import Dict, List
+
+# Quantile sketch resolution: bucket b >= 1 holds amounts in
+# [growth^(b-1), growth^b), so a quantile is off by at most 12% either way
+# and ₹1 to ₹1 crore fits in about 70 buckets per user. Bucket 0 holds
+# everything below ₹1.
+AMOUNT_BUCKET_GROWTH = 1.25
+
+
+def amount_bucket(amount: float) -> int:
+    """Sketch bucket of an amount"""
+    if amount < 1:
+        return 0
+    return int(math.log(amount) / math.log(AMOUNT_BUCKET_GROWTH)) + 1
+
+
+def bucket_amount(bucket: int) -> float:
+    """Representative (geometric middle) amount of a sketch bucket"""
+    if bucket == 0:
+        return 0.5
+    return AMOUNT_BUCKET_GROWTH ** (bucket - 0.5)
+
+
+class AmountStats:
+    """
+    Running count, mean and variance (Welford) of a user's transaction
+    amounts plus a log-bucketed histogram for approximate quantiles.
+
+    add() is O(1), and two summaries merge exactly (Chan et al.), so a bulk
+    write folds its transactions into one delta per user.
+    """
+
+    def __init__(self, count: int = 0, mean: float = 0.0, m2: float = 0.0, buckets: Dict[int, int] = None):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2                  # sum of squared differences from the mean
+        self.buckets = Counter(buckets or {})
+
+    def add(self, amount: float):
+        """Count one transaction amount"""
+        self.count += 1
+        delta = amount - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (amount - self.mean)
+        self.buckets[amount_bucket(amount)] += 1
+
+    def merge(self, other: 'AmountStats'):
+        """Fold another summary into this one"""
+        if not other.count:
+            return
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self.m2 += other.m2 + delta * delta * self.count * other.count / total
+        self.mean += delta * other.count / total
+        self.count = total
+        self.buckets.update(other.buckets)
+
+    def copy(self) -> 'AmountStats':
+        return AmountStats(self.count, self.mean, self.m2, self.buckets)
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(max(self.variance, 0.0))
+
+    def z_score(self, amount: float) -> float:
+        """Standard deviations between amount and the mean (0 without history)"""
+        if not self.count:
+            return 0.0
+        std = self.std
+        if std == 0:
+            return 0.0 if amount == self.mean else math.copysign(math.inf, amount - self.mean)
+        return (amount - self.mean) / std
+
+    def rank(self, amount: float) -> float:
+        """Approximate share (0-1) of past amounts below amount"""
+        if not self.count:
+            return 0.0
+        bucket = amount_bucket(amount)
+        below = sum(count for b, count in self.buckets.items() if b < bucket)
+        return (below + self.buckets.get(bucket, 0) / 2) / self.count
+
+    def quantile(self, q: float) -> float:
+        """Approximate q-quantile (0-1) of past amounts (0 without history)"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= target:
+                return bucket_amount(bucket)
+        return bucket_amount(max(self.buckets))
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            'count': self.count,
+            'mean': round(self.mean, 2),
+            'std': round(self.std, 2),
+            'p50': round(self.quantile(0.5), 2),
+            'p95': round(self.quantile(0.95), 2),
+            'p99': round(self.quantile(0.99), 2)
+        }
+
+    def __repr__(self):
+        return f"<AmountStats count={self.count} mean={self.mean:.2f}>"
+
+
+def add_amount(stats: Dict[int, AmountStats], user_id: int, amount: float):
+    """Count one transaction into the per-user summaries of a write"""
+    user_stats = stats.get(user_id)
+    if user_stats is None:
+        user_stats = stats[user_id] = AmountStats()
+    user_stats.add(amount or 0.0)
+
+
+# SQLite persistence in user_amount_stats and user_amount_buckets
+# (migration 13). Both upserts merge a delta into the stored row in SQL,
+# so concurrent writers never read-modify-write.
+AMOUNT_STATS_UPSERT_SQL = '''
+    INSERT INTO user_amount_stats (user_id, amount_count, amount_mean, amount_m2)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT (user_id) DO UPDATE SET
+        amount_count = amount_count + excluded.amount_count,
+        amount_mean = amount_mean + (excluded.amount_mean - amount_mean)
+                                    * excluded.amount_count / (amount_count + excluded.amount_count),
+        amount_m2 = amount_m2 + excluded.amount_m2
+                    + (excluded.amount_mean - amount_mean) * (excluded.amount_mean - amount_mean)
+                      * amount_count * excluded.amount_count / (amount_count + excluded.amount_count)
+'''
+
+AMOUNT_BUCKET_UPSERT_SQL = '''
+    INSERT INTO user_amount_buckets (user_id, bucket, amount_count)
+    VALUES (?, ?, ?)
+    ON CONFLICT (user_id, bucket) DO UPDATE SET amount_count = amount_count + excluded.amount_count
+'''
+
+
+def save_amount_stats(conn, stats: Dict[int, AmountStats]):
+    """Merge per-user deltas into the stored summaries"""
+    conn.executemany(AMOUNT_STATS_UPSERT_SQL, [
+        (user_id, user_stats.count, user_stats.mean, user_stats.m2)
+        for user_id, user_stats in stats.items() if user_stats.count
+    ])
+    conn.executemany(AMOUNT_BUCKET_UPSERT_SQL, [
+        (user_id, bucket, count)
+        for user_id, user_stats in stats.items()
+        for bucket, count in user_stats.buckets.items()
+    ])
+
+
+def load_amount_stats(conn, user_ids: List[int]) -> Dict[int, AmountStats]:
+    """Stored summaries of user_ids (at most one row plus ~70 buckets per user)"""
+    placeholders = ','.join('?' * len(user_ids))
+    stats = {user_id: AmountStats() for user_id in user_ids}
+    cursor = conn.execute(f'''
+        SELECT user_id, amount_count, amount_mean, amount_m2 FROM user_amount_stats
+        WHERE user_id IN ({placeholders})
+    ''', user_ids)
+    for user_id, count, mean, m2 in cursor:
+        stats[user_id].count, stats[user_id].mean, stats[user_id].m2 = count, mean, m2
+    cursor = conn.execute(f'''
+        SELECT user_id, bucket, amount_count FROM user_amount_buckets
+        WHERE user_id IN ({placeholders})
+    ''', user_ids)
+    for user_id, bucket, count in cursor:
+        stats[user_id].buckets[bucket] = count
+    return stats
+
+
+def rebuild_amount_stats(conn) -> int:
+    """
+    Recompute the amount summaries in one streaming pass over transactions,
+    holding one user's summary at a time; returns the users written
+    """
+    conn.execute('DELETE FROM user_amount_stats')
+    conn.execute('DELETE FROM user_amount_buckets')
+    cursor = conn.execute('SELECT user_id, amount FROM transactions ORDER BY user_id')
+    users = 0
+    for user_id, rows in groupby(cursor, key=lambda row: row[0]):
+        user_stats = AmountStats()
+        for _, amount in rows:
+            user_stats.add(amount or 0.0)
+        save_amount_stats(conn, {user_id: user_stats})
+        users += 1
+    return users
@@ -9,12 +9,14 @@ from typing import Dict, Optional, Any
 import logging
 from datetime import datetime, timedelta
 
+from src.storage import TrustStore
+
 logger = logging.getLogger(__name__)
 
 class AuthManager:
     """Handle user authentication and MFA"""
     
-    def __init__(self, database):
+    def __init__(self, database: TrustStore):
         self.db = database
         self.mfa_challenges = {}  # In production, use Redis or database
     
@@ -150,17 +152,9 @@ class AuthManager:
             new_password_hash = self.hash_password(new_password)
             
             # Update in database
-            conn = self.db.get_connection()
-            try:
-                conn.execute(
-                    'UPDATE users SET password_hash = ? WHERE id = ?',
-                    (new_password_hash, user_id)
-                )
-                conn.commit()
-                return True
-            finally:
-                conn.close()
-                
+            self.db.update_user_password(user_id, new_password_hash)
+            return True
+            
         except Exception as e:
             logger.error(f"Password change error: {str(e)}")
             return False
@@ -169,10 +163,7 @@ class AuthManager:
         """Request password reset"""
         try:
             # Find user by email
-            conn = self.db.get_connection()
-            cursor = conn.execute('SELECT id, username FROM users WHERE email = ?', (email,))
-            user = cursor.fetchone()
-            conn.close()
+            user = self.db.get_user_by_email(email)
             
             if not user:
                 return None
@@ -183,7 +174,7 @@ class AuthManager:
             # Store reset token (expires in 1 hour)
             # In production, store in database with expiration
             self.mfa_challenges[f"reset_{reset_token}"] = {
-                'user_id': user[0],
+                'user_id': user['id'],
                 'type': 'password_reset',
                 'expires_at': datetime.utcnow() + timedelta(hours=1)
             }
@@ -215,21 +206,13 @@ class AuthManager:
             new_password_hash = self.hash_password(new_password)
             
             # Update password
-            conn = self.db.get_connection()
-            try:
-                conn.execute(
-                    'UPDATE users SET password_hash = ? WHERE id = ?',
-                    (new_password_hash, challenge['user_id'])
-                )
-                conn.commit()
-                
-                # Remove reset token
-                del self.mfa_challenges[challenge_key]
-                
-                return True
-            finally:
-                conn.close()
-                
+            self.db.update_user_password(challenge['user_id'], new_password_hash)
+            
+            # Remove reset token
+            del self.mfa_challenges[challenge_key]
+            
+            return True
+            
         except Exception as e:
             logger.error(f"Password reset error: {str(e)}")
             return False
@@ -237,17 +220,9 @@ class AuthManager:
     def verify_user_email(self, user_id: int) -> bool:
         """Mark user email as verified"""
         try:
-            conn = self.db.get_connection()
-            try:
-                conn.execute(
-                    'UPDATE users SET verified = TRUE WHERE id = ?',
-                    (user_id,)
-                )
-                conn.commit()
-                return True
-            finally:
-                conn.close()
-                
+            self.db.set_user_verified(user_id)
+            return True
+            
         except Exception as e:
             logger.error(f"Email verification error: {str(e)}")
             return False
@@ -0,0 +1,254 @@
+"""
+TrustAI Behavior Profiles - Compact per-user summaries of activity behavior, maintained as activities are logged
+"""
+
+import json
+from collections import Counter
+from itertools import groupby
+from typing import Any, Dict, Iterable, List, Tuple
+
+# Merchants tracked per user; beyond this the table keeps the heavy hitters
+# (space-saving: a new merchant takes over the least frequent slot)
+MERCHANT_SLOTS = 16
+
+
+class BehaviorProfile:
+    """
+    Fixed-size summary of a user's activities: how often each action type
+    and merchant occurs and running statistics of transaction amounts.
+    The hour-of-week histogram lives in user_activity_hours.
+    """
+
+    def __init__(self, activity_count: int = 0,
+                 action_counts: Dict[str, int] = None,
+                 merchant_counts: Dict[str, int] = None,
+                 amount_count: int = 0,
+                 amount_mean: float = 0.0,
+                 amount_max: float = 0.0):
+        self.activity_count = activity_count
+        self.action_counts = Counter(action_counts or {})
+        self.merchant_counts = dict(merchant_counts or {})
+        self.amount_count = amount_count
+        self.amount_mean = amount_mean
+        self.amount_max = amount_max
+
+    def add(self, action_type: str, context: Dict[str, Any]):
+        """Count one logged activity"""
+        self.activity_count += 1
+        self.action_counts[action_type] += 1
+        if context.get('merchant'):
+            self._add_merchant(context['merchant'], 1)
+        if context.get('amount') is not None:
+            self._add_amounts(1, float(context['amount']), float(context['amount']))
+
+    def merge(self, other: 'BehaviorProfile'):
+        """Fold another profile (e.g. the activities of one bulk write) into this one"""
+        self.activity_count += other.activity_count
+        self.action_counts.update(other.action_counts)
+        for merchant, count in sorted(other.merchant_counts.items()):
+            self._add_merchant(merchant, count)
+        if other.amount_count:
+            self._add_amounts(other.amount_count, other.amount_mean, other.amount_max)
+
+    def copy(self) -> 'BehaviorProfile':
+        return BehaviorProfile(self.activity_count, self.action_counts, self.merchant_counts,
+                               self.amount_count, self.amount_mean, self.amount_max)
+
+    def _add_merchant(self, merchant: str, count: int):
+        if merchant in self.merchant_counts or len(self.merchant_counts) < MERCHANT_SLOTS:
+            self.merchant_counts[merchant] = self.merchant_counts.get(merchant, 0) + count
+            return
+        smallest = min(self.merchant_counts, key=lambda name: (self.merchant_counts[name], name))
+        self.merchant_counts[merchant] = self.merchant_counts.pop(smallest) + count
+
+    def _add_amounts(self, count: int, mean: float, maximum: float):
+        total = self.amount_count + count
+        self.amount_mean += (mean - self.amount_mean) * count / total
+        self.amount_max = max(self.amount_max, maximum) if self.amount_count else maximum
+        self.amount_count = total
+
+    def __repr__(self):
+        return f"<BehaviorProfile activities={self.activity_count}>"
+
+
+def profile_activities(activities: Iterable[tuple], profiles: Dict[int, BehaviorProfile]):
+    """
+    Pass (user_id, action_type, trust_result, context) activities through,
+    counting each into profiles, so a bulk insert can stream them
+    """
+    for activity in activities:
+        user_id, action_type, _, context = activity
+        profile = profiles.get(user_id)
+        if profile is None:
+            profile = profiles[user_id] = BehaviorProfile()
+        profile.add(action_type, context)
+        yield activity
+
+
+# SQLite persistence in user_behavior_profiles and user_behavior_counts
+# (migration 12). Reading a profile is one row plus at most
+# MERCHANT_SLOTS + one row per action type.
+PROFILE_CHUNK_SIZE = 500
+
+
+def load_profiles(conn, user_ids: List[int]) -> Dict[int, BehaviorProfile]:
+    """Stored profiles of user_ids (missing users get an empty profile)"""
+    profiles = {user_id: BehaviorProfile() for user_id in user_ids}
+    for start in range(0, len(user_ids), PROFILE_CHUNK_SIZE):
+        chunk = user_ids[start:start + PROFILE_CHUNK_SIZE]
+        placeholders = ','.join('?' * len(chunk))
+        cursor = conn.execute(f'''
+            SELECT user_id, activity_count, amount_count, amount_mean, amount_max
+            FROM user_behavior_profiles WHERE user_id IN ({placeholders})
+        ''', chunk)
+        for user_id, activity_count, amount_count, amount_mean, amount_max in cursor:
+            profile = profiles[user_id]
+            profile.activity_count = activity_count
+            profile.amount_count = amount_count
+            profile.amount_mean = amount_mean
+            profile.amount_max = amount_max
+
+        cursor = conn.execute(f'''
+            SELECT user_id, feature, value, seen_count
+            FROM user_behavior_counts WHERE user_id IN ({placeholders})
+        ''', chunk)
+        for user_id, feature, value, seen_count in cursor:
+            profile = profiles[user_id]
+            if feature == 'action':
+                profile.action_counts[value] = seen_count
+            else:
+                profile.merchant_counts[value] = seen_count
+    return profiles
+
+
+def _profile_rows(user_id: int, profile: BehaviorProfile):
+    """(profile row, count rows) to store for one user"""
+    row = (user_id, profile.activity_count, profile.amount_count, profile.amount_mean, profile.amount_max)
+    counts = [(user_id, 'action', action, count) for action, count in profile.action_counts.items()]
+    counts += [(user_id, 'merchant', merchant, count) for merchant, count in profile.merchant_counts.items()]
+    return row, counts
+
+
+def merchant_changes(stored: Dict[str, int], delta: Dict[str, int]) -> Tuple[Dict[str, int], List[str]]:
+    """
+    Fold a delta's merchant counts into a user's stored merchant slots the
+    way BehaviorProfile.merge does, returning (merchants whose count changed,
+    with the new count; merchants evicted from their slot)
+    """
+    profile = BehaviorProfile(merchant_counts=stored)
+    for merchant, count in sorted(delta.items()):
+        profile._add_merchant(merchant, count)
+    changed = {
+        merchant: count for merchant, count in profile.merchant_counts.items()
+        if stored.get(merchant) != count
+    }
+    evicted = [merchant for merchant in stored if merchant not in profile.merchant_counts]
+    return changed, evicted
+
+
+# Deltas are merged into the stored rows by the upserts themselves, so a
+# logged activity touches one summary row plus one count row per action type
+# and merchant it involves. The amount columns follow _add_amounts.
+PROFILE_UPSERT_SQL = '''
+    INSERT INTO user_behavior_profiles (user_id, activity_count, amount_count, amount_mean, amount_max)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (user_id) DO UPDATE SET
+        activity_count = activity_count + excluded.activity_count,
+        amount_count = amount_count + excluded.amount_count,
+        amount_mean = CASE WHEN excluded.amount_count = 0 THEN amount_mean
+                           ELSE amount_mean + (excluded.amount_mean - amount_mean)
+                                              * excluded.amount_count / (amount_count + excluded.amount_count)
+                      END,
+        amount_max = CASE WHEN excluded.amount_count = 0 THEN amount_max
+                          WHEN amount_count = 0 THEN excluded.amount_max
+                          ELSE MAX(amount_max, excluded.amount_max)
+                     END
+'''
+
+ACTION_COUNT_UPSERT_SQL = '''
+    INSERT INTO user_behavior_counts (user_id, feature, value, seen_count) VALUES (?, 'action', ?, ?)
+    ON CONFLICT (user_id, feature, value) DO UPDATE SET seen_count = seen_count + excluded.seen_count
+'''
+
+# Merchant slots can evict each other, so their new counts are worked out
+# from the stored slots (at most MERCHANT_SLOTS rows) and written as is
+MERCHANT_COUNT_UPSERT_SQL = '''
+    INSERT INTO user_behavior_counts (user_id, feature, value, seen_count) VALUES (?, 'merchant', ?, ?)
+    ON CONFLICT (user_id, feature, value) DO UPDATE SET seen_count = excluded.seen_count
+'''
+
+
+def _load_merchants(conn, user_ids: List[int]) -> Dict[int, Dict[str, int]]:
+    merchants = {user_id: {} for user_id in user_ids}
+    for start in range(0, len(user_ids), PROFILE_CHUNK_SIZE):
+        chunk = user_ids[start:start + PROFILE_CHUNK_SIZE]
+        placeholders = ','.join('?' * len(chunk))
+        cursor = conn.execute(f'''
+            SELECT user_id, value, seen_count FROM user_behavior_counts
+            WHERE feature = 'merchant' AND user_id IN ({placeholders})
+        ''', chunk)
+        for user_id, merchant, seen_count in cursor:
+            merchants[user_id][merchant] = seen_count
+    return merchants
+
+
+def save_profiles(conn, deltas: Dict[int, BehaviorProfile]):
+    """Merge per-user deltas into the stored profiles"""
+    if not deltas:
+        return
+    # The summary upsert comes first: it takes the write lock before the
+    # merchant slots are read
+    conn.executemany(PROFILE_UPSERT_SQL, [
+        (user_id, delta.activity_count, delta.amount_count, delta.amount_mean, delta.amount_max)
+        for user_id, delta in deltas.items()
+    ])
+    conn.executemany(ACTION_COUNT_UPSERT_SQL, [
+        (user_id, action, count)
+        for user_id, delta in deltas.items()
+        for action, count in delta.action_counts.items()
+    ])
+
+    merchant_deltas = {user_id: delta.merchant_counts for user_id, delta in deltas.items() if delta.merchant_counts}
+    stored = _load_merchants(conn, list(merchant_deltas))
+    for user_id, merchant_counts in merchant_deltas.items():
+        changed, evicted = merchant_changes(stored[user_id], merchant_counts)
+        conn.executemany('''
+            DELETE FROM user_behavior_counts WHERE user_id = ? AND feature = 'merchant' AND value = ?
+        ''', [(user_id, merchant) for merchant in evicted])
+        conn.executemany(MERCHANT_COUNT_UPSERT_SQL, [
+            (user_id, merchant, count) for merchant, count in changed.items()
+        ])
+
+
+def _write_profile(conn, user_id: int, profile: BehaviorProfile):
+    row, counts = _profile_rows(user_id, profile)
+    conn.execute('''
+        INSERT OR REPLACE INTO user_behavior_profiles
+        (user_id, activity_count, amount_count, amount_mean, amount_max)
+        VALUES (?, ?, ?, ?, ?)
+    ''', row)
+    conn.execute('DELETE FROM user_behavior_counts WHERE user_id = ?', (user_id,))
+    conn.executemany('''
+        INSERT INTO user_behavior_counts (user_id, feature, value, seen_count) VALUES (?, ?, ?, ?)
+    ''', counts)
+
+
+def rebuild_behavior_profiles(conn) -> int:
+    """
+    Recompute the behavior profiles in one streaming pass over activities,
+    holding one user's profile at a time; returns the profiles written
+    """
+    conn.execute('DELETE FROM user_behavior_profiles')
+    conn.execute('DELETE FROM user_behavior_counts')
+    cursor = conn.execute('''
+        SELECT user_id, action_type, context FROM activities
+        ORDER BY user_id, timestamp
+    ''')
+    users = 0
+    for user_id, rows in groupby(cursor, key=lambda row: row[0]):
+        profile = BehaviorProfile()
+        for _, action_type, context in rows:
+            profile.add(action_type, json.loads(context) if context else {})
+        _write_profile(conn, user_id, profile)
+        users += 1
+    return users
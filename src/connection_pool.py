@@ -0,0 +1,218 @@
+"""
+TrustAI Connection Pool - Bounded, thread-safe pool of reusable SQLite connections
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Any
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no pooled connection becomes available within the wait time"""
+
+
+class PooledConnection(sqlite3.Connection):
+    """
+    sqlite3 connection whose close() hands it back to its pool instead of
+    closing it, so existing `conn = db.get_connection() ... conn.close()`
+    call sites reuse connections without any changes
+    """
+
+    _pool = None
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.release(self)
+        else:
+            super().close()
+
+    def discard(self):
+        """Really close the underlying SQLite connection"""
+        super().close()
+
+
+class ConnectionPool:
+    """
+    Bounded pool of SQLite connections shared by all request threads.
+
+    Connections are opened lazily up to max_size and handed out most recently
+    used first. A borrower that finds the pool exhausted waits up to timeout
+    seconds before PoolTimeoutError is raised. Every new connection is passed
+    through the registered setup hooks (row factory, pragmas, functions).
+    """
+
+    def __init__(self, db_path: str, max_size: int = 5, timeout: float = 30.0, **connect_kwargs):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+
+        self.db_path = db_path
+        self.max_size = max_size
+        self.timeout = timeout
+        self.connect_kwargs = connect_kwargs  # extra sqlite3.connect() arguments
+        self._setup_hooks: List[Callable[[sqlite3.Connection], None]] = []
+        self._condition = threading.Condition()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle: List[PooledConnection] = []   # LIFO: most recently used last
+        self._in_use: Dict[int, str] = {}         # id(conn) -> borrowing thread name
+        self._size = 0                            # open connections, idle or in use
+        self._closed = False
+        self._stats = {
+            'created': 0,
+            'acquired': 0,
+            'reused': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'discarded': 0,
+            'wait_seconds': 0.0
+        }
+
+    def add_setup_hook(self, hook: Callable[[sqlite3.Connection], None]):
+        """Register a callable run on every connection the pool opens from now on"""
+        with self._condition:
+            self._setup_hooks.append(hook)
+
+    def acquire(self, timeout: float = None) -> PooledConnection:
+        """Borrow a connection, waiting up to timeout seconds if the pool is exhausted"""
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        conn = None
+
+        with self._condition:
+            # Connections must not be shared with a forked worker process
+            if self._pid != os.getpid():
+                self._reset()
+
+            waited = False
+            while True:
+                if self._closed:
+                    raise PoolTimeoutError("Connection pool is closed")
+                if self._idle:
+                    conn = self._idle.pop()
+                    self._stats['reused'] += 1
+                    break
+                if self._size < self.max_size:
+                    self._size += 1  # reserve a slot, open it outside the lock
+                    break
+
+                remaining = timeout - (time.monotonic() - started)
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeoutError(
+                        f"No database connection available after {timeout:.1f}s "
+                        f"({self.max_size} in use)"
+                    )
+                if not waited:
+                    self._stats['waits'] += 1
+                    waited = True
+                self._condition.wait(remaining)
+
+            if waited:
+                self._stats['wait_seconds'] += time.monotonic() - started
+
+        if conn is None:
+            try:
+                conn = self._open()
+            except Exception:
+                with self._condition:
+                    self._size -= 1
+                    self._condition.notify()
+                raise
+
+        with self._condition:
+            self._in_use[id(conn)] = threading.current_thread().name
+            self._stats['acquired'] += 1
+
+        return conn
+
+    def release(self, conn: PooledConnection):
+        """Return a borrowed connection; releasing twice is a no-op"""
+        with self._condition:
+            if self._in_use.pop(id(conn), None) is None:
+                return
+
+        try:
+            # Never hand an open transaction to the next borrower
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error as e:
+            logger.warning(f"Discarding broken pooled connection: {str(e)}")
+            self._discard(conn)
+            return
+
+        with self._condition:
+            if self._closed or self._pid != os.getpid():
+                self._size -= 1
+                conn.discard()
+            else:
+                self._idle.append(conn)
+            self._condition.notify()
+
+    def recycle_idle(self):
+        """Close idle connections so later borrowers get ones opened with the current hooks"""
+        with self._condition:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._condition.notify_all()
+        for conn in idle:
+            conn.discard()
+
+    def close_all(self):
+        """Close idle connections; connections still in use are closed on release"""
+        with self._condition:
+            self._closed = True
+            for conn in self._idle:
+                conn.discard()
+            self._size -= len(self._idle)
+            self._idle = []
+            self._condition.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of pool usage counters"""
+        with self._condition:
+            stats = dict(self._stats)
+            stats.update({
+                'max_size': self.max_size,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': len(self._in_use),
+                'in_use_by_thread': sorted(self._in_use.values())
+            })
+            stats['wait_seconds'] = round(stats['wait_seconds'], 4)
+            return stats
+
+    def _open(self) -> PooledConnection:
+        conn = sqlite3.connect(
+            self.db_path,
+            factory=PooledConnection,
+            check_same_thread=False,
+            **self.connect_kwargs
+        )
+        try:
+            for hook in list(self._setup_hooks):
+                hook(conn)
+        except Exception:
+            conn.discard()
+            raise
+
+        conn._pool = self
+        with self._condition:
+            self._stats['created'] += 1
+        return conn
+
+    def _discard(self, conn: PooledConnection):
+        try:
+            conn.discard()
+        except sqlite3.Error:
+            pass
+        with self._condition:
+            self._size -= 1
+            self._stats['discarded'] += 1
+            self._condition.notify()
@@ -5,25 +5,234 @@ TrustAI Database Module - SQLite database operations
 import sqlite3
 import json
 import hashlib
+import itertools
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional
+from typing import Dict, Iterable, List, Any, Optional, Sequence, Tuple
 import logging
 import os
 
+from src.amount_stats import AmountStats, add_amount, load_amount_stats, rebuild_amount_stats, save_amount_stats
+from src.behavior_profile import BehaviorProfile, load_profiles, profile_activities, rebuild_behavior_profiles, save_profiles
+from src.connection_pool import ConnectionPool
+from src.device_fingerprint import index_keys
+from src.geo import bounding_box, within_radius
+from src.location_clusters import rebuild_location_clusters, record_location
+from src.score_factors import ScoreFactorCache, location_trust, score_factors
+from src.sqlite_writer import SQLiteWriter
+from src.migrations import run_migrations, rebuild_activity_hours, rebuild_location_index
+from src.sqlite_profiles import DEFAULT_PROFILE, get_profile, apply_profile
+from src.snapshot import SNAPSHOT_SECTIONS, UserFeatureSnapshot, time_patterns_from_histogram
+from src.trust_decay import fold_trust_scores, rebuild_decayed_trust_scores
+from src.unit_of_work import UnitOfWork
+from src.velocity import VelocityCounters, load_velocity, rebuild_velocity, recent_transactions, save_velocity
+
 logger = logging.getLogger(__name__)
 
+DEVICE_COMPONENT_INSERT_SQL = '''
+    INSERT OR IGNORE INTO device_fingerprint_components (user_id, component, value, fingerprint)
+    VALUES (?, ?, ?, ?)
+'''
+
+TRANSACTION_INSERT_SQL = '''
+    INSERT INTO transactions 
+    (user_id, amount, merchant, transaction_type, trust_score, risk_level, timestamp)
+    VALUES (?, ?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+'''
+
+def _format_timestamp(value) -> Optional[str]:
+    # Store timestamps the way CURRENT_TIMESTAMP does so they compare as text
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.strftime('%Y-%m-%d %H:%M:%S') if value else None
+
+def _log_write_failure(future):
+    if future.exception() is not None:
+        logger.error(f"Background write error: {str(future.exception())}")
+
+def create_database(config: Dict[str, Any]):
+    """
+    Build the storage backend selected by config['database_url'].
+
+    sqlite:/// URLs use the pooled sqlite3 Database below, memory:// keeps
+    everything in process (batch jobs, benchmarks) and any other URL
+    (postgresql://..., mysql://...) uses the SQLAlchemy backend.
+    """
+    url = config['database_url']
+    pool = config['database_pool']
+    cache = ScoreFactorCache(config['score_factors_cache']['ttl_seconds'], config['score_factors_cache']['size'])
+
+    if url.startswith('memory://'):
+        from src.memory_backend import InMemoryDatabase
+        return InMemoryDatabase(score_factors_cache=cache)
+
+    if url.startswith('sqlite:///'):
+        return Database(
+            db_path=url[len('sqlite:///'):] or 'trustai.db',
+            pool_size=pool['size'],
+            pool_timeout=pool['timeout'],
+            profile=config['database_profile'],
+            single_writer=config['database_single_writer'],
+            velocity_store=config['velocity_store'],
+            score_factors_cache=cache
+        )
+
+    from src.sqlalchemy_backend import SQLAlchemyDatabase
+    return SQLAlchemyDatabase(url, pool_size=pool['size'], pool_timeout=pool['timeout'], score_factors_cache=cache)
+
 class Database:
     """Database operations for TrustAI system"""
     
-    def __init__(self, db_path: str = "trustai.db"):
+    # Stay well below SQLite's bound-parameter limit for IN (...) lists
+    BATCH_CHUNK_SIZE = 500
+    
+    # Write methods apply_writes can group into one transaction, mapped to
+    # the helper that runs them on an open connection
+    GROUPED_WRITES = {
+        'log_activity': '_insert_activity',
+        'log_transaction': '_insert_transaction',
+        'store_trust_score': '_insert_trust_score',
+        'store_device_fingerprint': '_upsert_device_fingerprint',
+        'store_user_location': '_upsert_user_location',
+        'apply_writes': '_apply_grouped_writes'
+    }
+    
+    # Grouped writes that have a multi-row (executemany) helper
+    BULK_WRITES = {
+        'log_activity': '_insert_activities',
+        'log_transaction': '_insert_transactions',
+        'store_trust_score': '_insert_trust_scores'
+    }
+    
+    def __init__(self, db_path: str = "trustai.db", pool_size: int = 5, pool_timeout: float = 30.0,
+                 profile: str = DEFAULT_PROFILE, single_writer: bool = False,
+                 velocity_store: str = 'sqlite', score_factors_cache: ScoreFactorCache = None):
         self.db_path = db_path
+        self.profile_name = profile
+        self.profile = get_profile(profile)
+        self.pool = ConnectionPool(
+            db_path,
+            max_size=pool_size,
+            timeout=pool_timeout,
+            cached_statements=self.profile['cached_statements']
+        )
+        self.pool.add_setup_hook(self._configure_connection)
+        self.writer = None
+        # get_score_factors summaries, dropped when the user logs an activity
+        self.score_factors_cache = score_factors_cache or ScoreFactorCache()
         self.init_db()
+        
+        # Transaction velocity lives in transaction_velocity ('sqlite', shared by
+        # every process) or in this process only ('memory', no extra writes)
+        if velocity_store not in ('sqlite', 'memory'):
+            raise ValueError(f"Unknown velocity store '{velocity_store}'")
+        self.velocity = None
+        if velocity_store == 'memory':
+            self.velocity = VelocityCounters()
+            conn = self.get_connection()
+            try:
+                for user_id, timestamp, amount in recent_transactions(conn):
+                    self.velocity.add(user_id, timestamp, amount)
+            finally:
+                conn.close()
+        
+        if single_writer:
+            # From here on only the writer thread writes; pooled connections
+            # are read-only so a stray write fails loudly instead of contending
+            self.writer = SQLiteWriter(
+                db_path,
+                setup=self._configure_connection,
+                cached_statements=self.profile['cached_statements']
+            )
+            self.pool.add_setup_hook(self._make_read_only)
+            self.pool.recycle_idle()
     
     def get_connection(self):
-        """Get database connection"""
-        conn = sqlite3.connect(self.db_path)
+        """Borrow a pooled database connection; close() returns it to the pool"""
+        return self.pool.acquire()
+    
+    def _configure_connection(self, conn):
+        """Per-connection setup run once when the pool opens a connection"""
         conn.row_factory = sqlite3.Row  # Enable dict-like access
-        return conn
+        apply_profile(conn, self.profile)
+    
+    def _make_read_only(self, conn):
+        conn.execute('PRAGMA query_only = ON')
+    
+    def add_connection_hook(self, hook):
+        """Run hook(conn) on every connection opened from now on"""
+        self.pool.add_setup_hook(hook)
+    
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """Get connection pool usage statistics"""
+        stats = self.pool.stats()
+        if self.writer:
+            stats['writer'] = self.writer.stats()
+        return stats
+    
+    def close(self):
+        """Stop the writer thread (if any) and close all pooled connections"""
+        if self.writer:
+            self.writer.close()
+        self.pool.close_all()
+    
+    def _write(self, helper, *args, wait: bool = True):
+        """
+        Run helper(conn, *args) as one committed write and return its result.
+        
+        In single-writer mode the command is handed to the writer thread;
+        with wait=False it returns None straight away and a failure is only
+        logged. Otherwise the write runs on a pooled connection. Either way
+        the score factors of the users it wrote are dropped after the commit.
+        """
+        if self.writer is None:
+            conn = self.get_connection()
+            try:
+                with self.score_factors_cache.deferred() as written:
+                    result = helper(conn, *args)
+                    conn.commit()
+            finally:
+                conn.close()  # the pool rolls back anything left uncommitted
+            self.score_factors_cache.invalidate(written)
+            return result
+        
+        # The writer thread resolves the future after its batch has committed
+        written = set()
+        future = self.writer.submit(self._collect_written, written, helper, *args)
+        if wait:
+            try:
+                return future.result()
+            finally:
+                self.score_factors_cache.invalidate(written)
+        future.add_done_callback(lambda _: self.score_factors_cache.invalidate(written))
+        future.add_done_callback(_log_write_failure)
+        return None
+    
+    def _collect_written(self, conn, written: set, helper, *args):
+        with self.score_factors_cache.deferred() as pending:
+            try:
+                return helper(conn, *args)
+            finally:
+                written.update(pending)
+    
+    def _execute(self, conn, sql: str, params: tuple = ()):
+        conn.execute(sql, params)
+    
+    def apply_writes(self, writes: List[Tuple[str, tuple]]):
+        """Apply (method name, args) writes in one transaction with a single commit"""
+        self._write(self._apply_grouped_writes, writes)
+    
+    def _apply_grouped_writes(self, conn, writes: List[Tuple[str, tuple]]):
+        # Consecutive writes of the same kind go through one executemany
+        for method, group in itertools.groupby(writes, key=lambda write: write[0]):
+            if method in self.BULK_WRITES:
+                getattr(self, self.BULK_WRITES[method])(conn, (args for _, args in group))
+            else:
+                for _, args in group:
+                    getattr(self, self.GROUPED_WRITES[method])(conn, *args)
+    
+    def unit_of_work(self) -> UnitOfWork:
+        """Collect the writes for one decision and commit them in one transaction"""
+        return UnitOfWork(self)
     
     def init_db(self):
         """Initialize database tables"""
@@ -133,43 +342,53 @@ class Database:
             ''')
             
             conn.commit()
+            
+            # Indexes and later schema changes. A failure stops startup rather
+            # than serving on a partial schema.
+            applied = run_migrations(conn)
+            if applied:
+                logger.info(f"Applied schema migrations: {applied}")
+            
             logger.info("Database initialized successfully")
             
         except Exception as e:
             logger.error(f"Database initialization error: {str(e)}")
             conn.rollback()
+            raise
         finally:
             conn.close()
     
     # User operations
     def create_user(self, username: str, email: str, password_hash: str, role: str = 'user') -> int:
         """Create a new user"""
-        conn = self.get_connection()
         try:
-            cursor = conn.execute(
-                'INSERT INTO users (username, email, password_hash, role) VALUES (?, ?, ?, ?)',
-                (username, email, password_hash, role)
-            )
-            user_id = cursor.lastrowid
-            conn.commit()
-            return user_id
+            return self._write(self._insert_user, username, email, password_hash, role)
         except Exception as e:
             logger.error(f"User creation error: {str(e)}")
-            conn.rollback()
             return None
-        finally:
-            conn.close()
+    
+    def _insert_user(self, conn, username: str, email: str, password_hash: str, role: str) -> int:
+        cursor = conn.execute(
+            'INSERT INTO users (username, email, password_hash, role) VALUES (?, ?, ?, ?)',
+            (username, email, password_hash, role)
+        )
+        # A lookup of the id before it existed may have cached defaults
+        self.score_factors_cache.invalidate([cursor.lastrowid])
+        return cursor.lastrowid
     
     def get_user(self, user_id: int) -> Optional[Dict[str, Any]]:
         """Get user by ID"""
         conn = self.get_connection()
         try:
-            cursor = conn.execute('SELECT * FROM users WHERE id = ?', (user_id,))
-            row = cursor.fetchone()
-            return dict(row) if row else None
+            return self._fetch_user(conn, user_id)
         finally:
             conn.close()
     
+    def _fetch_user(self, conn, user_id: int) -> Optional[Dict[str, Any]]:
+        cursor = conn.execute('SELECT * FROM users WHERE id = ?', (user_id,))
+        row = cursor.fetchone()
+        return dict(row) if row else None
+    
     def get_user_by_username(self, username: str) -> Optional[Dict[str, Any]]:
         """Get user by username"""
         conn = self.get_connection()
@@ -180,28 +399,58 @@ class Database:
         finally:
             conn.close()
     
-    def update_last_login(self, user_id: int):
-        """Update user's last login timestamp"""
+    def get_user_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+        """Get user by email"""
         conn = self.get_connection()
         try:
-            conn.execute(
-                'UPDATE users SET last_login = CURRENT_TIMESTAMP WHERE id = ?',
-                (user_id,)
-            )
-            conn.commit()
+            cursor = conn.execute('SELECT * FROM users WHERE email = ?', (email,))
+            row = cursor.fetchone()
+            return dict(row) if row else None
         finally:
             conn.close()
     
+    def update_last_login(self, user_id: int):
+        """Update user's last login timestamp"""
+        self._write(self._execute, 'UPDATE users SET last_login = CURRENT_TIMESTAMP WHERE id = ?', (user_id,))
+    
+    def update_user_password(self, user_id: int, password_hash: str):
+        """Replace a user's password hash"""
+        self._write(self._execute, 'UPDATE users SET password_hash = ? WHERE id = ?', (password_hash, user_id))
+    
+    def set_user_verified(self, user_id: int):
+        """Mark a user's email as verified"""
+        self._write(self._set_user_verified, user_id)
+    
+    def _set_user_verified(self, conn, user_id: int):
+        conn.execute('UPDATE users SET verified = TRUE WHERE id = ?', (user_id,))
+        self.score_factors_cache.invalidate([user_id])
+    
     # Activity logging
-    def log_activity(self, user_id: int, action_type: str, trust_result: Dict[str, Any], context: Dict[str, Any]):
+    def log_activity(self, user_id: int, action_type: str, trust_result: Dict[str, Any], context: Dict[str, Any],
+                     wait: bool = True):
         """Log user activity"""
-        conn = self.get_connection()
         try:
-            conn.execute('''
-                INSERT INTO activities 
-                (user_id, action_type, trust_score, risk_level, decision, context, ip_address, user_agent)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
+            self._write(self._insert_activity, user_id, action_type, trust_result, context, wait=wait)
+        except Exception as e:
+            logger.error(f"Activity logging error: {str(e)}")
+    
+    def log_activities_bulk(self, activities: Iterable[Tuple[int, str, Dict[str, Any], Dict[str, Any]]]) -> int:
+        """
+        Log many activities in one transaction and return the number written.
+        
+        Each item holds log_activity's arguments (user_id, action_type,
+        trust_result, context). Items are streamed, so a generator of any
+        length is written with bounded memory.
+        """
+        return self._write(self._insert_activities, activities)
+    
+    def _insert_activity(self, conn, user_id: int, action_type: str, trust_result: Dict[str, Any], context: Dict[str, Any]):
+        self._insert_activities(conn, [(user_id, action_type, trust_result, context)])
+    
+    def _insert_activities(self, conn, activities: Iterable[Tuple[int, str, Dict[str, Any], Dict[str, Any]]]) -> int:
+        profiles = {}
+        rows = (
+            (
                 user_id,
                 action_type,
                 trust_result['score'],
@@ -209,13 +458,21 @@ class Database:
                 trust_result['decision'],
                 json.dumps(context, default=str),
                 context.get('ip_address'),
-                context.get('user_agent')
-            ))
-            conn.commit()
-        except Exception as e:
-            logger.error(f"Activity logging error: {str(e)}")
-        finally:
-            conn.close()
+                context.get('user_agent'),
+                _format_timestamp(context.get('timestamp'))
+            )
+            for user_id, action_type, trust_result, context in profile_activities(activities, profiles)
+        )
+        # Rows are stamped with the time the activity happened when the
+        # context carries one (seeding, replays, write-behind), else now
+        cursor = conn.executemany('''
+            INSERT INTO activities 
+            (user_id, action_type, trust_score, risk_level, decision, context, ip_address, user_agent, timestamp)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+        ''', rows)
+        save_profiles(conn, profiles)
+        self.score_factors_cache.invalidate(profiles)
+        return cursor.rowcount
     
     def get_user_activities(self, user_id: int, limit: int = 10) -> List[Dict[str, Any]]:
         """Get recent user activities"""
@@ -241,114 +498,291 @@ class Database:
     
     # Transaction operations
     def log_transaction(self, user_id: int, amount: float, merchant: str, 
-                       transaction_type: str, trust_score: float, risk_level: str) -> int:
-        """Log a transaction"""
-        conn = self.get_connection()
+                       transaction_type: str, trust_score: float, risk_level: str,
+                       timestamp: datetime = None, wait: bool = True) -> int:
+        """Log a transaction (returns None when not waiting for the writer)"""
         try:
-            cursor = conn.execute('''
-                INSERT INTO transactions 
-                (user_id, amount, merchant, transaction_type, trust_score, risk_level)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (user_id, amount, merchant, transaction_type, trust_score, risk_level))
-            
-            transaction_id = cursor.lastrowid
-            conn.commit()
-            return transaction_id
+            return self._write(
+                self._insert_transaction, user_id, amount, merchant, transaction_type, trust_score, risk_level,
+                timestamp, wait=wait
+            )
         except Exception as e:
             logger.error(f"Transaction logging error: {str(e)}")
             return None
+    
+    def log_transactions_bulk(self, transactions: Iterable[tuple]) -> int:
+        """
+        Log many transactions in one transaction and return the number written.
+        
+        Each item holds log_transaction's arguments (user_id, amount, merchant,
+        transaction_type, trust_score, risk_level[, timestamp]). Items are
+        streamed, so a generator of any length is written with bounded memory.
+        """
+        return self._write(self._insert_transactions, transactions)
+    
+    def _insert_transaction(self, conn, user_id: int, amount: float, merchant: str,
+                            transaction_type: str, trust_score: float, risk_level: str,
+                            timestamp: datetime = None) -> int:
+        timestamp = _format_timestamp(timestamp)
+        cursor = conn.execute(TRANSACTION_INSERT_SQL, (
+            user_id, amount, merchant, transaction_type, trust_score, risk_level, timestamp
+        ))
+        counters = self._velocity_counters()
+        counters.add(user_id, timestamp, amount)
+        self._save_velocity(conn, counters)
+        amounts = {}
+        add_amount(amounts, user_id, amount)
+        save_amount_stats(conn, amounts)
+        self.score_factors_cache.invalidate([user_id])
+        return cursor.lastrowid
+    
+    def _insert_transactions(self, conn, transactions: Iterable[tuple]) -> int:
+        rows = (
+            (*transaction[:6], _format_timestamp(transaction[6] if len(transaction) > 6 else None))
+            for transaction in transactions
+        )
+        counters = self._velocity_counters()
+        amounts = {}
+        count = conn.executemany(TRANSACTION_INSERT_SQL, self._count_velocity(rows, counters, amounts)).rowcount
+        self._save_velocity(conn, counters)
+        save_amount_stats(conn, amounts)
+        self.score_factors_cache.invalidate(amounts)
+        return count
+    
+    def _velocity_counters(self) -> VelocityCounters:
+        # Memory mode counts straight into the shared counters (a rolled back
+        # insert stays counted); sqlite mode collects the batch to merge it
+        return self.velocity if self.velocity is not None else VelocityCounters()
+    
+    def _count_velocity(self, rows: Iterable[tuple], counters: VelocityCounters, amounts: Dict[int, AmountStats]):
+        for row in rows:
+            counters.add(row[0], row[6], row[1])
+            add_amount(amounts, row[0], row[1])
+            yield row
+    
+    def _save_velocity(self, conn, counters: VelocityCounters):
+        if self.velocity is None:
+            save_velocity(conn, counters)
+    
+    def _fetch_velocity(self, conn, user_ids: List[int]) -> Dict[int, Dict[int, Dict[str, float]]]:
+        if self.velocity is not None:
+            return {user_id: self.velocity.get(user_id) for user_id in user_ids}
+        return load_velocity(conn, user_ids)
+    
+    def rebuild_velocity(self) -> int:
+        """
+        Recompute the transaction velocity buckets from the last 24 hours of
+        transactions. With velocity_store='memory' only this process's
+        counters are rebuilt.
+        """
+        if self.velocity is not None:
+            counters = VelocityCounters()
+            conn = self.get_connection()
+            try:
+                for user_id, timestamp, amount in recent_transactions(conn):
+                    counters.add(user_id, timestamp, amount)
+            finally:
+                conn.close()
+            self.velocity = counters
+            return sum(1 for _ in counters.buckets())
+        return self._write(rebuild_velocity)
+    
+    def get_user_amount_stats(self, user_id: int) -> AmountStats:
+        """Get user's running transaction amount statistics"""
+        conn = self.get_connection()
+        try:
+            return load_amount_stats(conn, [user_id])[user_id]
         finally:
             conn.close()
     
+    def rebuild_amount_stats(self) -> int:
+        """Recompute the per-user amount statistics from transactions"""
+        return self._write(rebuild_amount_stats)
+    
     def get_user_transactions(self, user_id: int, since: datetime = None, limit: int = 100) -> List[Dict[str, Any]]:
         """Get user transactions"""
         conn = self.get_connection()
         try:
-            if since:
-                cursor = conn.execute('''
-                    SELECT * FROM transactions 
-                    WHERE user_id = ? AND timestamp >= ?
-                    ORDER BY timestamp DESC 
-                    LIMIT ?
-                ''', (user_id, since, limit))
-            else:
-                cursor = conn.execute('''
-                    SELECT * FROM transactions 
-                    WHERE user_id = ?
-                    ORDER BY timestamp DESC 
-                    LIMIT ?
-                ''', (user_id, limit))
-            
-            return [dict(row) for row in cursor.fetchall()]
+            return self._fetch_transactions(conn, user_id, since, limit)
         finally:
             conn.close()
     
+    def _fetch_transactions(self, conn, user_id: int, since: datetime = None, limit: int = 100) -> List[Dict[str, Any]]:
+        if since:
+            cursor = conn.execute('''
+                SELECT * FROM transactions 
+                WHERE user_id = ? AND timestamp >= ?
+                ORDER BY timestamp DESC 
+                LIMIT ?
+            ''', (user_id, since, limit))
+        else:
+            cursor = conn.execute('''
+                SELECT * FROM transactions 
+                WHERE user_id = ?
+                ORDER BY timestamp DESC 
+                LIMIT ?
+            ''', (user_id, limit))
+        
+        return [dict(row) for row in cursor.fetchall()]
+    
     # Device fingerprint operations
-    def store_device_fingerprint(self, user_id: int, fingerprint: str):
+    def store_device_fingerprint(self, user_id: int, fingerprint: str, wait: bool = True):
         """Store or update device fingerprint"""
-        conn = self.get_connection()
         try:
-            # Check if fingerprint exists
-            cursor = conn.execute(
-                'SELECT id FROM device_fingerprints WHERE user_id = ? AND fingerprint = ?',
-                (user_id, fingerprint)
-            )
-            
-            if cursor.fetchone():
-                # Update last seen
-                conn.execute(
-                    'UPDATE device_fingerprints SET last_seen = CURRENT_TIMESTAMP WHERE user_id = ? AND fingerprint = ?',
-                    (user_id, fingerprint)
-                )
-            else:
-                # Insert new fingerprint
-                conn.execute(
-                    'INSERT INTO device_fingerprints (user_id, fingerprint) VALUES (?, ?)',
-                    (user_id, fingerprint)
-                )
-            
-            conn.commit()
+            self._write(self._upsert_device_fingerprint, user_id, fingerprint, wait=wait)
         except Exception as e:
             logger.error(f"Device fingerprint storage error: {str(e)}")
-        finally:
-            conn.close()
+    
+    def _upsert_device_fingerprint(self, conn, user_id: int, fingerprint: str):
+        # Relies on the (user_id, fingerprint) unique index from migration 7
+        conn.execute('''
+            INSERT INTO device_fingerprints (user_id, fingerprint) VALUES (?, ?)
+            ON CONFLICT (user_id, fingerprint) DO UPDATE SET
+                last_seen = CURRENT_TIMESTAMP,
+                seen_count = seen_count + 1
+        ''', (user_id, fingerprint))
+        conn.executemany(DEVICE_COMPONENT_INSERT_SQL, [
+            (user_id, name, value, fingerprint) for name, value in index_keys(fingerprint)
+        ])
+        self.score_factors_cache.invalidate([user_id])
     
     def get_user_devices(self, user_id: int, days: int = 30) -> List[Dict[str, Any]]:
         """Get user's recent devices"""
         conn = self.get_connection()
         try:
-            since = datetime.utcnow() - timedelta(days=days)
-            cursor = conn.execute('''
-                SELECT * FROM device_fingerprints 
-                WHERE user_id = ? AND last_seen >= ?
-                ORDER BY last_seen DESC
-            ''', (user_id, since))
-            
-            return [dict(row) for row in cursor.fetchall()]
+            return self._fetch_devices(conn, user_id, days)
         finally:
             conn.close()
     
+    def _fetch_devices(self, conn, user_id: int, days: int = 30) -> List[Dict[str, Any]]:
+        since = datetime.utcnow() - timedelta(days=days)
+        cursor = conn.execute('''
+            SELECT * FROM device_fingerprints 
+            WHERE user_id = ? AND last_seen >= ?
+            ORDER BY last_seen DESC
+        ''', (user_id, since))
+        
+        return [dict(row) for row in cursor.fetchall()]
+
+    def _fetch_device_count(self, conn, user_id: int, days: int = 30) -> int:
+        since = datetime.utcnow() - timedelta(days=days)
+        cursor = conn.execute(
+            'SELECT COUNT(*) FROM device_fingerprints WHERE user_id = ? AND last_seen >= ?',
+            (user_id, since)
+        )
+        return cursor.fetchone()[0]
+
+    def find_similar_devices(self, user_id: int, fingerprint: str, days: int = 30) -> List[str]:
+        """
+        Fingerprints of the user's devices seen in the last `days` that are
+        this one or share an indexed component with it (the only ones that
+        can be similar to it), looked up through the device component index
+        """
+        return self.find_similar_devices_bulk([(user_id, fingerprint)], days)[0]
+
+    def find_similar_devices_bulk(self, probes: List[Tuple[int, str]], days: int = 30) -> List[List[str]]:
+        """find_similar_devices for many (user_id, fingerprint) pairs in a single read transaction"""
+        conn = self.get_connection()
+        try:
+            conn.execute('BEGIN')
+            return [self._fetch_similar_devices(conn, user_id, fingerprint, days) for user_id, fingerprint in probes]
+        finally:
+            conn.rollback()
+            conn.close()
+
+    def _fetch_similar_devices(self, conn, user_id: int, fingerprint: str, days: int) -> List[str]:
+        since = datetime.utcnow() - timedelta(days=days)
+        keys = index_keys(fingerprint)
+        # Each arm is a primary key prefix lookup; CROSS JOIN keeps the
+        # candidates driving the join, so every one is a probe of the
+        # (user_id, fingerprint) unique index rather than a scan of the
+        # user's devices
+        lookups = ''.join(
+            ' UNION SELECT fingerprint FROM device_fingerprint_components'
+            ' WHERE user_id = ? AND component = ? AND value = ?'
+            for _ in keys
+        )
+        cursor = conn.execute(f'''
+            SELECT d.fingerprint FROM (SELECT ? AS fingerprint{lookups}) AS c
+            CROSS JOIN device_fingerprints AS d
+            WHERE d.user_id = ? AND d.fingerprint = c.fingerprint AND d.last_seen >= ?
+        ''', (fingerprint, *(arg for name, value in keys for arg in (user_id, name, value)), user_id, since))
+        return [row[0] for row in cursor]
+
+    def rebuild_device_index(self) -> int:
+        """Recompute the device component index from device_fingerprints"""
+        return self._write(self._rebuild_device_index)
+
+    def _rebuild_device_index(self, conn) -> int:
+        conn.execute('DELETE FROM device_fingerprint_components')
+        rows = [
+            (row['user_id'], name, value, row['fingerprint'])
+            for row in conn.execute('SELECT user_id, fingerprint FROM device_fingerprints')
+            for name, value in index_keys(row['fingerprint'])
+        ]
+        conn.executemany(DEVICE_COMPONENT_INSERT_SQL, rows)
+        return len(rows)
+    
     # Trust score operations
-    def store_trust_score(self, user_id: int, result: Dict[str, Any]):
+    def store_trust_score(self, user_id: int, result: Dict[str, Any], wait: bool = True):
         """Store trust score result"""
-        conn = self.get_connection()
         try:
-            conn.execute('''
-                INSERT INTO trust_scores (user_id, score, factors)
-                VALUES (?, ?, ?)
-            ''', (user_id, result['score'], json.dumps(result.get('risk_factors', {}))))
-            
-            # Update user's current trust score
-            conn.execute(
-                'UPDATE users SET trust_score = ? WHERE id = ?',
-                (result['score'], user_id)
-            )
-            
-            conn.commit()
+            self._write(self._insert_trust_score, user_id, result, wait=wait)
         except Exception as e:
             logger.error(f"Trust score storage error: {str(e)}")
-        finally:
-            conn.close()
+    
+    def store_trust_scores_bulk(self, scores: Iterable[Tuple[int, Dict[str, Any]]]) -> int:
+        """
+        Store many (user_id, result) trust scores in one transaction and
+        return the number written; each user's current score becomes the
+        last one given for them
+        """
+        return self._write(self._insert_trust_scores, scores)
+    
+    def _insert_trust_score(self, conn, user_id: int, result: Dict[str, Any]):
+        self._insert_trust_scores(conn, [(user_id, result)])
+    
+    def _insert_trust_scores(self, conn, scores: Iterable[Tuple[int, Dict[str, Any]]]) -> int:
+        # user_id -> [latest score, sum of scores, number of scores]
+        totals = {}
+        
+        def rows():
+            for user_id, result in scores:
+                user_totals = totals.setdefault(user_id, [0.0, 0.0, 0])
+                user_totals[0] = result['score']
+                user_totals[1] += result['score']
+                user_totals[2] += 1
+                yield user_id, result['score'], json.dumps(result.get('risk_factors', {}))
+        
+        cursor = conn.executemany('''
+            INSERT INTO trust_scores (user_id, score, factors)
+            VALUES (?, ?, ?)
+        ''', rows())
+        count = cursor.rowcount
+        if not totals:
+            return count
+        self.score_factors_cache.invalidate(totals)
+        
+        # Update users' current and decayed trust scores, once per user; the
+        # insert above already holds the write lock, so the read is stable
+        now = datetime.utcnow()
+        user_ids = list(totals)
+        updates = []
+        for start in range(0, len(user_ids), self.BATCH_CHUNK_SIZE):
+            chunk = user_ids[start:start + self.BATCH_CHUNK_SIZE]
+            cursor = conn.execute(f'''
+                SELECT id, decayed_trust_score, trust_score_weight, trust_score_updated_at
+                FROM users WHERE id IN ({','.join('?' * len(chunk))})
+            ''', chunk)
+            for user_id, score, weight, updated_at in cursor.fetchall():
+                latest, score_sum, score_count = totals[user_id]
+                score, weight = fold_trust_scores(score, weight, updated_at, score_sum, score_count, now)
+                updates.append((latest, score, weight, _format_timestamp(now), user_id))
+        conn.executemany('''
+            UPDATE users SET trust_score = ?, decayed_trust_score = ?, trust_score_weight = ?, trust_score_updated_at = ?
+            WHERE id = ?
+        ''', updates)
+        return count
     
     def get_recent_trust_scores(self, user_id: int, limit: int = 5) -> List[float]:
         """Get recent trust scores for a user"""
@@ -365,6 +799,10 @@ class Database:
         finally:
             conn.close()
     
+    def rebuild_decayed_trust_scores(self) -> int:
+        """Recompute every user's decayed trust score from trust_scores"""
+        return self._write(rebuild_decayed_trust_scores)
+    
     def get_trust_score_history(self, user_id: int, limit: int = 30) -> List[Dict[str, Any]]:
         """Get trust score history"""
         conn = self.get_connection()
@@ -381,56 +819,120 @@ class Database:
             conn.close()
     
     # Location operations
-    def store_user_location(self, user_id: int, ip_address: str, location_data: Dict[str, Any]):
+    def store_user_location(self, user_id: int, ip_address: str, location_data: Dict[str, Any], wait: bool = True):
         """Store user location data"""
-        conn = self.get_connection()
         try:
-            # Check if location exists
-            cursor = conn.execute(
-                'SELECT id FROM user_locations WHERE user_id = ? AND ip_address = ?',
-                (user_id, ip_address)
-            )
-            
-            if cursor.fetchone():
-                # Update last seen
-                conn.execute(
-                    'UPDATE user_locations SET last_seen = CURRENT_TIMESTAMP WHERE user_id = ? AND ip_address = ?',
-                    (user_id, ip_address)
-                )
-            else:
-                # Insert new location
-                conn.execute('''
-                    INSERT INTO user_locations 
-                    (user_id, ip_address, latitude, longitude, city, country)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                ''', (
-                    user_id, ip_address,
-                    location_data.get('latitude'),
-                    location_data.get('longitude'),
-                    location_data.get('city'),
-                    location_data.get('country')
-                ))
-            
-            conn.commit()
+            self._write(self._upsert_user_location, user_id, ip_address, location_data, wait=wait)
         except Exception as e:
             logger.error(f"Location storage error: {str(e)}")
-        finally:
-            conn.close()
+    
+    def _upsert_user_location(self, conn, user_id: int, ip_address: str, location_data: Dict[str, Any]):
+        # Relies on the (user_id, ip_address) unique index from migration 7;
+        # a fresh lookup refreshes the stored geodata when it has any
+        conn.execute('''
+            INSERT INTO user_locations 
+            (user_id, ip_address, latitude, longitude, city, country)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (user_id, ip_address) DO UPDATE SET
+                latitude = COALESCE(excluded.latitude, latitude),
+                longitude = COALESCE(excluded.longitude, longitude),
+                city = COALESCE(excluded.city, city),
+                country = COALESCE(excluded.country, country),
+                last_seen = CURRENT_TIMESTAMP,
+                seen_count = seen_count + 1
+        ''', (
+            user_id, ip_address,
+            location_data.get('latitude'),
+            location_data.get('longitude'),
+            location_data.get('city'),
+            location_data.get('country')
+        ))
+        if location_data.get('latitude') is not None and location_data.get('longitude') is not None:
+            record_location(
+                conn, user_id, location_data['latitude'], location_data['longitude'],
+                _format_timestamp(datetime.utcnow())
+            )
+        self.score_factors_cache.invalidate([user_id])
     
     def get_user_locations(self, user_id: int, days: int = 30) -> List[Dict[str, Any]]:
         """Get user's recent locations"""
         conn = self.get_connection()
         try:
-            since = datetime.utcnow() - timedelta(days=days)
-            cursor = conn.execute('''
-                SELECT * FROM user_locations 
-                WHERE user_id = ? AND last_seen >= ?
-                ORDER BY last_seen DESC
-            ''', (user_id, since))
-            
-            return [dict(row) for row in cursor.fetchall()]
+            return self._fetch_locations(conn, user_id, days)
+        finally:
+            conn.close()
+    
+    def _fetch_locations(self, conn, user_id: int, days: int = 30) -> List[Dict[str, Any]]:
+        since = datetime.utcnow() - timedelta(days=days)
+        cursor = conn.execute('''
+            SELECT * FROM user_locations 
+            WHERE user_id = ? AND last_seen >= ?
+            ORDER BY last_seen DESC
+        ''', (user_id, since))
+        
+        return [dict(row) for row in cursor.fetchall()]
+
+    def find_locations_near(self, user_id: Optional[int], latitude: float, longitude: float,
+                            radius_km: float) -> List[Dict[str, Any]]:
+        """
+        Stored locations within radius_km of a point, nearest first, each with
+        a distance_km. user_id None searches every user's locations.
+        """
+        # Box filter refined by exact distance. One user's few locations are
+        # read through the user_id indexes; across users the box is looked up
+        # in the R*Tree from migration 11 (its user_id column is not indexed,
+        # so it is no help for a single user).
+        min_lat, max_lat, min_lon, max_lon = bounding_box(latitude, longitude, radius_km)
+        if user_id is not None:
+            query = '''
+                SELECT * FROM user_locations
+                WHERE user_id = ? AND latitude BETWEEN ? AND ? AND longitude BETWEEN ? AND ?
+            '''
+            params = (user_id, min_lat, max_lat, min_lon, max_lon)
+        else:
+            query = '''
+                SELECT l.* FROM user_locations_rtree r
+                JOIN user_locations l ON l.id = r.id
+                WHERE r.max_lat >= ? AND r.min_lat <= ? AND r.max_lon >= ? AND r.min_lon <= ?
+            '''
+            params = (min_lat, max_lat, min_lon, max_lon)
+
+        conn = self.get_connection()
+        try:
+            rows = [dict(row) for row in conn.execute(query, params)]
         finally:
             conn.close()
+        return within_radius(rows, latitude, longitude, radius_km)
+
+    def get_user_location_clusters(self, user_id: int, days: int = 30) -> List[Dict[str, Any]]:
+        """Get user's location clusters seen recently, latest first"""
+        conn = self.get_connection()
+        try:
+            return self._fetch_location_clusters(conn, [user_id], days)[user_id]
+        finally:
+            conn.close()
+
+    def _fetch_location_clusters(self, conn, user_ids: List[int], days: int = 30) -> Dict[int, List[Dict[str, Any]]]:
+        # At most MAX_CLUSTERS_PER_USER rows per user (migration 10)
+        placeholders = ','.join('?' * len(user_ids))
+        cursor = conn.execute(f'''
+            SELECT * FROM user_location_clusters
+            WHERE user_id IN ({placeholders}) AND last_seen >= ?
+            ORDER BY user_id, last_seen DESC
+        ''', (*user_ids, _format_timestamp(datetime.utcnow() - timedelta(days=days))))
+
+        clusters = {user_id: [] for user_id in user_ids}
+        for row in cursor:
+            clusters[row['user_id']].append(dict(row))
+        return clusters
+
+    def rebuild_location_clusters(self) -> int:
+        """Recompute the per-user location clusters from user_locations"""
+        return self._write(rebuild_location_clusters)
+
+    def rebuild_location_index(self) -> int:
+        """Recompute the R*Tree location index from user_locations"""
+        return self._write(rebuild_location_index)
 
     # Admin dashboard methods
     def get_total_users(self) -> int:
@@ -494,6 +996,21 @@ class Database:
         finally:
             conn.close()
 
+    def get_common_user_agents(self, limit: int = 1000) -> List[str]:
+        """Distinct user agents in activities, most frequent first"""
+        conn = self.get_connection()
+        try:
+            cursor = conn.execute('''
+                SELECT user_agent FROM activities
+                WHERE user_agent IS NOT NULL AND user_agent != ''
+                GROUP BY user_agent
+                ORDER BY COUNT(*) DESC
+                LIMIT ?
+            ''', (limit,))
+            return [row[0] for row in cursor.fetchall()]
+        finally:
+            conn.close()
+
     def get_risk_distribution(self) -> Dict[str, int]:
         """Get distribution of risk levels"""
         conn = self.get_connection()
@@ -547,61 +1064,70 @@ class Database:
         """Get user's behavioral patterns"""
         conn = self.get_connection()
         try:
-            cursor = conn.execute('''
-                SELECT action_type, context, timestamp
-                FROM activities
-                WHERE user_id = ?
-                ORDER BY timestamp DESC
-                LIMIT 50
-            ''', (user_id,))
-
-            patterns = []
-            for row in cursor.fetchall():
-                pattern = {
-                    'action_type': row[0],
-                    'timestamp': row[2]
-                }
-                if row[1]:
-                    context = json.loads(row[1])
-                    pattern.update({
-                        'hour_of_day': datetime.fromisoformat(row[2]).hour,
-                        'day_of_week': datetime.fromisoformat(row[2]).weekday(),
-                        'amount': context.get('amount', 0),
-                        'merchant': context.get('merchant', ''),
-                        'transaction_type': context.get('transaction_type', '')
-                    })
-                patterns.append(pattern)
-
-            return patterns
+            return self._fetch_behavior_patterns(conn, user_id)
         finally:
             conn.close()
 
+    def _fetch_behavior_patterns(self, conn, user_id: int) -> List[Dict[str, Any]]:
+        cursor = conn.execute('''
+            SELECT action_type, context, timestamp
+            FROM activities
+            WHERE user_id = ?
+            ORDER BY timestamp DESC
+            LIMIT 50
+        ''', (user_id,))
+
+        patterns = []
+        for row in cursor.fetchall():
+            pattern = {
+                'action_type': row[0],
+                'timestamp': row[2]
+            }
+            if row[1]:
+                context = json.loads(row[1])
+                pattern.update({
+                    'hour_of_day': datetime.fromisoformat(row[2]).hour,
+                    'day_of_week': datetime.fromisoformat(row[2]).weekday(),
+                    'amount': context.get('amount', 0),
+                    'merchant': context.get('merchant', ''),
+                    'transaction_type': context.get('transaction_type', '')
+                })
+            patterns.append(pattern)
+
+        return patterns
+
     def get_user_time_patterns(self, user_id: int) -> Dict[str, Any]:
         """Get user's typical activity time patterns"""
         conn = self.get_connection()
         try:
-            cursor = conn.execute('''
-                SELECT strftime('%H', timestamp) as hour, COUNT(*) as count
-                FROM activities
-                WHERE user_id = ?
-                GROUP BY strftime('%H', timestamp)
-                ORDER BY count DESC
-            ''', (user_id,))
+            return self._fetch_time_patterns(conn, user_id)
+        finally:
+            conn.close()
 
-            hours_data = cursor.fetchall()
-            if not hours_data:
-                return {'typical_hours': []}
+    def _fetch_time_patterns(self, conn, user_id: int) -> Dict[str, Any]:
+        # At most 168 rows, maintained by triggers on activities (migration 8)
+        cursor = conn.execute('''
+            SELECT hour_of_week, activity_count FROM user_activity_hours
+            WHERE user_id = ? AND activity_count > 0
+        ''', (user_id,))
+        return time_patterns_from_histogram(dict(cursor.fetchall()))
 
-            # Get top 3 most active hours
-            typical_hours = [int(row[0]) for row in hours_data[:3]]
+    def rebuild_activity_hours(self) -> int:
+        """Recompute the per-user activity hour histogram from activities"""
+        return self._write(rebuild_activity_hours)
 
-            return {
-                'typical_hours': typical_hours,
-                'activity_distribution': {int(row[0]): row[1] for row in hours_data}
-            }
+    def get_user_behavior_profile(self, user_id: int) -> BehaviorProfile:
+        """Get user's behavior profile"""
+        conn = self.get_connection()
+        try:
+            return load_profiles(conn, [user_id])[user_id]
         finally:
             conn.close()
 
+    def rebuild_behavior_profiles(self) -> int:
+        """Recompute the per-user behavior profiles from activities"""
+        return self._write(rebuild_behavior_profiles)
+
     def get_user_incidents(self, user_id: int) -> List[Dict[str, Any]]:
         """Get user's security incidents"""
         conn = self.get_connection()
@@ -616,20 +1142,55 @@ class Database:
         finally:
             conn.close()
 
+    def _fetch_incident_count(self, conn, user_id: int) -> int:
+        cursor = conn.execute('SELECT COUNT(*) FROM incidents WHERE user_id = ?', (user_id,))
+        return cursor.fetchone()[0]
+
     def get_user_activity_score(self, user_id: int) -> float:
         """Calculate user activity score based on engagement"""
         conn = self.get_connection()
         try:
-            # Count activities in last 30 days
-            cursor = conn.execute('''
-                SELECT COUNT(*) FROM activities
-                WHERE user_id = ? AND timestamp >= datetime('now', '-30 days')
-            ''', (user_id,))
+            return self._fetch_activity_score(conn, user_id)
+        finally:
+            conn.close()
+
+    def _fetch_activity_score(self, conn, user_id: int) -> float:
+        # Count activities in last 30 days
+        cursor = conn.execute('''
+            SELECT COUNT(*) FROM activities
+            WHERE user_id = ? AND timestamp >= datetime('now', '-30 days')
+        ''', (user_id,))
+
+        activity_count = cursor.fetchone()[0]
+
+        # Convert to score (max 30 points)
+        return min(30, activity_count)
 
-            activity_count = cursor.fetchone()[0]
+    def get_score_factors(self, user_id: int) -> Dict[str, Any]:
+        """Get user's device, location and behavior trust, account age and verification status"""
+        return self.score_factors_cache.get_or_load(user_id, self._fetch_score_factors)
 
-            # Convert to score (max 30 points)
-            return min(30, activity_count)
+    def get_score_factors_cache_stats(self) -> Dict[str, Any]:
+        """Score factor cache statistics"""
+        return self.score_factors_cache.stats()
+
+    def _fetch_score_factors(self, user_id: int) -> Dict[str, Any]:
+        # The five factor getters in one statement on one connection
+        conn = self.get_connection()
+        try:
+            row = conn.execute('''
+                SELECT
+                    (SELECT AVG(MIN(100.0, trust_level + 5.0 * (seen_count - 1))) FROM device_fingerprints
+                     WHERE user_id = u.id),
+                    (SELECT COUNT(*) FROM user_locations WHERE user_id = u.id AND seen_count > 1),
+                    (SELECT AVG(trust_score) FROM activities
+                     WHERE user_id = u.id AND timestamp >= datetime('now', '-7 days')),
+                    julianday('now') - julianday(u.created_at),
+                    u.verified
+                FROM users u
+                WHERE u.id = ?
+            ''', (user_id,)).fetchone()
+            return score_factors(*row) if row else score_factors(None, 0, None, None, False)
         finally:
             conn.close()
 
@@ -637,8 +1198,9 @@ class Database:
         """Get user's device trust level"""
         conn = self.get_connection()
         try:
+            # Every repeat sighting of a device adds 5 points to its base level
             cursor = conn.execute('''
-                SELECT AVG(trust_level) FROM device_fingerprints
+                SELECT AVG(MIN(100.0, trust_level + 5.0 * (seen_count - 1))) FROM device_fingerprints
                 WHERE user_id = ?
             ''', (user_id,))
 
@@ -651,21 +1213,14 @@ class Database:
         """Get user's location trust level"""
         conn = self.get_connection()
         try:
-            # Simple calculation based on number of known locations
+            # Simple calculation based on number of known locations; an IP
+            # seen only once is not known yet
             cursor = conn.execute('''
                 SELECT COUNT(*) FROM user_locations
-                WHERE user_id = ?
+                WHERE user_id = ? AND seen_count > 1
             ''', (user_id,))
 
-            location_count = cursor.fetchone()[0]
-
-            # More known locations = higher trust (up to a point)
-            if location_count == 0:
-                return 30.0
-            elif location_count <= 3:
-                return 60.0 + (location_count * 10)
-            else:
-                return 90.0
+            return location_trust(cursor.fetchone()[0])
         finally:
             conn.close()
 
@@ -708,3 +1263,99 @@ class Database:
             return bool(result[0]) if result else False
         finally:
             conn.close()
+
+    # Feature snapshots
+    def get_user_snapshot(self, user_id: int) -> UserFeatureSnapshot:
+        """Load everything the trust factors need for one user in a single read transaction"""
+        return UserFeatureSnapshot(user_id, **self.get_user_snapshot_sections(user_id, SNAPSHOT_SECTIONS))
+
+    def get_user_snapshot_sections(self, user_id: int, sections: Sequence[str]) -> Dict[str, Any]:
+        """Load some sections of a user's snapshot in one read transaction on its own connection"""
+        conn = self.get_connection()
+        try:
+            conn.execute('BEGIN')
+            loaders = {
+                'user': lambda: self._fetch_user(conn, user_id),
+                'device_count': lambda: self._fetch_device_count(conn, user_id, days=30),
+                'velocity': lambda: self._fetch_velocity(conn, [user_id])[user_id],
+                'amount_stats': lambda: load_amount_stats(conn, [user_id])[user_id],
+                'location_clusters': lambda: self._fetch_location_clusters(conn, [user_id], days=30)[user_id],
+                'behavior_profile': lambda: load_profiles(conn, [user_id])[user_id],
+                'incident_count': lambda: self._fetch_incident_count(conn, user_id),
+                'activity_score': lambda: self._fetch_activity_score(conn, user_id),
+                'time_patterns': lambda: self._fetch_time_patterns(conn, user_id)
+            }
+            return {section: loaders[section]() for section in sections}
+        finally:
+            conn.rollback()
+            conn.close()
+
+    def get_user_snapshots(self, user_ids: List[int]) -> Dict[int, UserFeatureSnapshot]:
+        """Load snapshots for many users with set-based queries in a single read transaction"""
+        user_ids = sorted(set(user_ids))
+        snapshots = {user_id: UserFeatureSnapshot(user_id) for user_id in user_ids}
+
+        conn = self.get_connection()
+        try:
+            conn.execute('BEGIN')
+            for start in range(0, len(user_ids), self.BATCH_CHUNK_SIZE):
+                chunk = user_ids[start:start + self.BATCH_CHUNK_SIZE]
+                self._load_snapshot_chunk(conn, chunk, snapshots)
+            return snapshots
+        finally:
+            conn.rollback()
+            conn.close()
+
+    def _load_snapshot_chunk(self, conn, user_ids: List[int], snapshots: Dict[int, UserFeatureSnapshot]):
+        """Run the set-based snapshot queries for one chunk of user IDs"""
+        placeholders = ','.join('?' * len(user_ids))
+        since = datetime.utcnow() - timedelta(days=30)
+
+        for row in conn.execute(f'SELECT * FROM users WHERE id IN ({placeholders})', user_ids):
+            snapshots[row['id']].user = dict(row)
+
+        cursor = conn.execute(f'''
+            SELECT user_id, COUNT(*) FROM device_fingerprints
+            WHERE user_id IN ({placeholders}) AND last_seen >= ?
+            GROUP BY user_id
+        ''', (*user_ids, since))
+        for row in cursor:
+            snapshots[row[0]].device_count = row[1]
+
+        for user_id, velocity in self._fetch_velocity(conn, user_ids).items():
+            snapshots[user_id].velocity = velocity
+
+        for user_id, amount_stats in load_amount_stats(conn, user_ids).items():
+            snapshots[user_id].amount_stats = amount_stats
+
+        for user_id, clusters in self._fetch_location_clusters(conn, user_ids, days=30).items():
+            snapshots[user_id].location_clusters = clusters
+
+        for user_id, profile in load_profiles(conn, user_ids).items():
+            snapshots[user_id].behavior_profile = profile
+
+        cursor = conn.execute(f'''
+            SELECT user_id, COUNT(*) FROM incidents
+            WHERE user_id IN ({placeholders})
+            GROUP BY user_id
+        ''', user_ids)
+        for row in cursor:
+            snapshots[row[0]].incident_count = row[1]
+
+        cursor = conn.execute(f'''
+            SELECT user_id, COUNT(*) FROM activities
+            WHERE user_id IN ({placeholders}) AND timestamp >= datetime('now', '-30 days')
+            GROUP BY user_id
+        ''', user_ids)
+        for row in cursor:
+            snapshots[row[0]].activity_score = min(30, row[1])
+
+        histograms = {}
+        cursor = conn.execute(f'''
+            SELECT user_id, hour_of_week, activity_count FROM user_activity_hours
+            WHERE user_id IN ({placeholders}) AND activity_count > 0
+        ''', user_ids)
+        for row in cursor:
+            histograms.setdefault(row[0], {})[row[1]] = row[2]
+        for user_id, histogram in histograms.items():
+            snapshots[user_id].time_patterns = time_patterns_from_histogram(histogram)
@@ -19,6 +19,10 @@ class DemoDataGenerator:
         self.db = database
         self.fake = Faker()
         
+        # Rows built by _create_*_activity, written in bulk by _flush_pending
+        self._pending_activities = []
+        self._pending_transactions = []
+        
         # Demo user personas
         self.user_personas = [
             {
@@ -138,6 +142,8 @@ class DemoDataGenerator:
             self._generate_fraudulent_behavior(user_id, start_date, end_date)
         elif behavior == 'traveling':
             self._generate_traveling_behavior(user_id, start_date, end_date)
+        
+        self._flush_pending()
     
     def _generate_normal_behavior(self, user_id: int, start_date: datetime, end_date: datetime):
         """Generate normal user behavior patterns"""
@@ -284,7 +290,7 @@ class DemoDataGenerator:
             'explanation': f"Trust score: {trust_score:.1f}/100"
         }
         
-        self.db.log_activity(user_id, 'login', trust_result, context)
+        self._pending_activities.append((user_id, 'login', trust_result, context))
     
     def _create_transaction_activity(self, user_id: int, timestamp: datetime, amount: float, trust_score: float):
         """Create a transaction activity record"""
@@ -312,11 +318,20 @@ class DemoDataGenerator:
             'explanation': f"Trust score: {trust_score:.1f}/100"
         }
         
-        self.db.log_activity(user_id, 'transaction', trust_result, context)
+        self._pending_activities.append((user_id, 'transaction', trust_result, context))
         
         # Also log in transactions table
         status = 'completed' if decision == 'allow' else ('pending' if decision == 'verify' else 'blocked')
-        self.db.log_transaction(user_id, amount, merchant, transaction_type, trust_score, risk_level)
+        self._pending_transactions.append((user_id, amount, merchant, transaction_type, trust_score, risk_level, timestamp))
+    
+    def _flush_pending(self):
+        """Write the buffered activity and transaction rows with the bulk APIs"""
+        activities, self._pending_activities = self._pending_activities, []
+        transactions, self._pending_transactions = self._pending_transactions, []
+        if activities:
+            self.db.log_activities_bulk(activities)
+        if transactions:
+            self.db.log_transactions_bulk(transactions)
     
     def _get_risk_level(self, trust_score: float) -> str:
         """Convert trust score to risk level"""
@@ -357,4 +372,5 @@ class DemoDataGenerator:
                 
                 self._create_login_activity(user['id'], login_time, trust_score)
         
+        self._flush_pending()
         logger.info("Real-time demo data generated")
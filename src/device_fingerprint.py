@@ -0,0 +1,92 @@
+"""
+TrustAI Device Fingerprints - Structured fingerprints from parsed user agents and network prefixes
+"""
+
+import ipaddress
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.user_agent_parser import UserAgentParser
+
+# How much each matching component counts towards similarity (sums to 1).
+# A known device on a new network still scores above 0.8, a browser
+# switch on the same machine lands between 0.5 and 0.8.
+COMPONENT_WEIGHTS = {
+    'browser': 0.20,
+    'browser_version': 0.10,
+    'os': 0.20,
+    'os_version': 0.10,
+    'device_type': 0.10,
+    'device_model': 0.15,
+    'network': 0.15,
+}
+
+# Components the per-user device index is keyed on: the ones that tell a
+# user's devices apart. browser, os and device_type are shared by most of
+# them and weigh exactly 0.5 together, so a device can only score above 0.5
+# (the lowest similarity that counts as the same device) by also matching
+# one of these; candidates sharing none of them cannot change the score.
+INDEXED_COMPONENTS = ('browser_version', 'os_version', 'device_model', 'network')
+
+# Network prefix lengths that group addresses of one home or office
+IPV4_PREFIX = 24
+IPV6_PREFIX = 48
+
+
+def _clean(value) -> str:
+    # Keep the separators out of component values
+    return str(value).replace('|', '/').replace('=', '-')
+
+
+def _network_prefix(ip_address: str) -> str:
+    if not ip_address:
+        return ''
+    try:
+        address = ipaddress.ip_address(ip_address)
+    except ValueError:
+        return ''
+    prefix = IPV4_PREFIX if address.version == 4 else IPV6_PREFIX
+    return str(ipaddress.ip_network(f"{address}/{prefix}", strict=False))
+
+
+def device_components(user_agent: str, ip_address: str, parser: UserAgentParser) -> Dict[str, str]:
+    """Fingerprint components of a user agent string (parsed through parser) and IP address"""
+    return dict(parser.parse(user_agent), network=_network_prefix(ip_address))
+
+
+def format_fingerprint(components: Dict[str, str]) -> str:
+    """Stable text form stored in device_fingerprints.fingerprint"""
+    return '|'.join(f"{name}={_clean(components.get(name, ''))}" for name in COMPONENT_WEIGHTS)
+
+
+def parse_fingerprint(fingerprint: str) -> Optional[Dict[str, str]]:
+    """Components of a stored fingerprint, None for the old opaque hashes"""
+    if '=' not in fingerprint:
+        return None
+    components = dict(part.split('=', 1) for part in fingerprint.split('|') if '=' in part)
+    if set(components) != set(COMPONENT_WEIGHTS):
+        return None
+    return components
+
+
+def fingerprint_similarity(fp1: str, fp2: str) -> float:
+    """Weighted share of matching components (0-1); old hashes only match themselves"""
+    if fp1 == fp2:
+        return 1.0
+    components1, components2 = parse_fingerprint(fp1), parse_fingerprint(fp2)
+    if components1 is None or components2 is None:
+        return 0.0
+    # Rounded so sums of the weights compare cleanly against thresholds
+    return round(sum(weight for name, weight in COMPONENT_WEIGHTS.items() if components1[name] == components2[name]), 6)
+
+
+def index_keys(fingerprint: str) -> List[Tuple[str, str]]:
+    """(component, value) pairs of a fingerprint kept in the device index, none for the old opaque hashes"""
+    components = parse_fingerprint(fingerprint)
+    if components is None:
+        return []
+    return [(name, components[name]) for name in INDEXED_COMPONENTS]
+
+
+def best_similarity(fingerprint: str, candidates: Iterable[str]) -> float:
+    """Similarity of the closest candidate device (0.0 if there are none)"""
+    return max((fingerprint_similarity(fingerprint, candidate) for candidate in candidates), default=0.0)
@@ -0,0 +1,101 @@
+"""
+TrustAI Factor Pool - Shared bounded thread pool that loads risk factor inputs against per-factor deadlines
+"""
+
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def parse_deadlines(spec: str) -> Dict[str, float]:
+    """Parse 'factor=ms,factor=ms' into per-factor deadlines in milliseconds"""
+    deadlines = {}
+    for item in spec.split(','):
+        if '=' in item:
+            name, value = item.split('=', 1)
+            deadlines[name.strip()] = float(value)
+    return deadlines
+
+
+class FactorPool:
+    """
+    Loads the inputs of one decision's factors (snapshot sections on their
+    own database connections, the GeoIP lookup) concurrently on a pool
+    shared by every request, so a decision waits for its slowest read rather
+    than for the sum of all of them. Scoring itself stays on the caller's
+    thread: it is CPU work that the pool could not speed up.
+
+    Each factor has a deadline counted from when the decision's loads are
+    submitted. A factor whose inputs are not all loaded by its deadline is
+    reported as timed out for the caller to score with its default; the pool
+    never grows past max_workers threads.
+    """
+
+    def __init__(self, max_workers: int = 8, default_deadline_ms: float = 50.0,
+                 deadlines_ms: Dict[str, float] = None):
+        self.max_workers = max_workers
+        self.default_deadline_ms = default_deadline_ms
+        self.deadlines_ms = dict(deadlines_ms or {})
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='trustai-factor')
+        self._lock = threading.Lock()
+        self._evaluations = 0
+        self._timeouts = Counter()
+
+    def deadline_ms(self, name: str) -> float:
+        return self.deadlines_ms.get(name, self.default_deadline_ms)
+
+    def gather(self, loads: Dict[str, Callable[[], Any]],
+               inputs: Dict[str, Sequence[str]]) -> Tuple[Dict[str, Any], List[str]]:
+        """
+        Run every load and wait for each factor's inputs (names in loads;
+        names without a load are skipped) up to the factor's deadline.
+        Returns (the loads that finished, names of the factors that missed
+        their deadline). An exception raised by a load is re-raised, as it
+        would be when run inline.
+        """
+        started = time.monotonic()
+        futures = {name: self._executor.submit(load) for name, load in loads.items()}
+
+        loaded, timed_out = {}, []
+        # Earliest deadline first, so a load shared with a later factor gets that factor's full wait
+        for factor in sorted(inputs, key=self.deadline_ms):
+            deadline = started + self.deadline_ms(factor) / 1000
+            for name in inputs[factor]:
+                if name not in futures or name in loaded:
+                    continue
+                try:
+                    loaded[name] = futures[name].result(timeout=max(0.0, deadline - time.monotonic()))
+                except FutureTimeout:
+                    timed_out.append(factor)
+                    break
+
+        for name, future in futures.items():
+            if name not in loaded:
+                future.cancel()  # drops it if it never got a thread
+
+        with self._lock:
+            self._evaluations += 1
+            self._timeouts.update(timed_out)
+        if timed_out:
+            logger.warning(f"Risk factors missed their deadline: {', '.join(timed_out)}")
+        return loaded, [factor for factor in inputs if factor in timed_out]
+
+    def stats(self) -> Dict[str, Any]:
+        """Pool statistics"""
+        with self._lock:
+            return {
+                'max_workers': self.max_workers,
+                'evaluations': self._evaluations,
+                'timeouts': dict(self._timeouts),
+                'default_deadline_ms': self.default_deadline_ms,
+                'deadlines_ms': dict(self.deadlines_ms)
+            }
+
+    def close(self):
+        """Stop the worker threads (queued loads are dropped)"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,69 @@
+"""
+TrustAI Geo Math - Vectorized great-circle distances, travel speeds and radius searches
+"""
+
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+# Mean Earth radius (km)
+EARTH_RADIUS_KM = 6371.0088
+
+# Location history within this distance of the current point counts as familiar
+FAMILIAR_RADIUS_KM = 50.0
+
+
+def haversine_km(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """
+    Great-circle distance in km between points given in degrees.
+
+    Arguments broadcast like any NumPy expression, so one point against an
+    array of history points is a single call.
+    """
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(value, dtype=float)) for value in (lat1, lon1, lat2, lon2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def travel_speed_kmh(distance_km, elapsed_seconds) -> np.ndarray:
+    """Speed needed to cover distance_km in elapsed_seconds; 0 where no time has passed"""
+    distance_km = np.asarray(distance_km, dtype=float)
+    elapsed_seconds = np.asarray(elapsed_seconds, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(elapsed_seconds > 0, distance_km / (elapsed_seconds / 3600), 0.0)
+
+
+def bounding_box(latitude: float, longitude: float, radius_km: float) -> Tuple[float, float, float, float]:
+    """
+    (min_lat, max_lat, min_lon, max_lon) of a box holding every point within
+    radius_km; longitude spans everything when the circle reaches a pole or
+    crosses the antimeridian
+    """
+    angle = radius_km / EARTH_RADIUS_KM
+    delta_lat = float(np.degrees(angle))
+    min_lat, max_lat = latitude - delta_lat, latitude + delta_lat
+    if min_lat <= -90 or max_lat >= 90:
+        return max(min_lat, -90.0), min(max_lat, 90.0), -180.0, 180.0
+
+    delta_lon = float(np.degrees(np.arcsin(np.sin(angle) / np.cos(np.radians(latitude)))))
+    min_lon, max_lon = longitude - delta_lon, longitude + delta_lon
+    if min_lon < -180 or max_lon > 180:
+        return min_lat, max_lat, -180.0, 180.0
+    return min_lat, max_lat, min_lon, max_lon
+
+
+def within_radius(rows: List[Dict[str, Any]], latitude: float, longitude: float,
+                  radius_km: float) -> List[Dict[str, Any]]:
+    """Rows (with latitude/longitude) within radius_km, nearest first, each with a distance_km"""
+    if not rows:
+        return []
+    distances = haversine_km(latitude, longitude,
+                             [row['latitude'] for row in rows],
+                             [row['longitude'] for row in rows])
+    nearby = [
+        dict(row, distance_km=float(distance))
+        for row, distance in zip(rows, distances)
+        if distance <= radius_km
+    ]
+    return sorted(nearby, key=lambda row: row['distance_km'])
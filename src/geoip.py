@@ -0,0 +1,105 @@
+"""
+TrustAI GeoIP Lookup - Resolve IP addresses to coordinates from a local MaxMind database
+"""
+
+import logging
+import os
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+import geoip2.database
+import geoip2.errors
+import maxminddb
+
+logger = logging.getLogger(__name__)
+
+
+class GeoIPLocator:
+    """
+    IP geolocation against a local MaxMind-format City database (.mmdb).
+
+    The file is memory-mapped and every lookup goes through a bounded LRU
+    cache keyed by IP, so repeat addresses cost a dictionary hit. Without a
+    usable database every lookup returns None and the geolocation factor
+    treats the location as unknown.
+    """
+
+    def __init__(self, database_path: str = None, cache_size: int = 10000):
+        self.database_path = database_path
+        self.reader = self._open_reader(database_path)
+        self._cached_lookup = lru_cache(maxsize=cache_size)(self._lookup)
+
+    @staticmethod
+    def _open_reader(database_path: str):
+        if not database_path:
+            logger.info("No GeoIP database configured, IP locations will be unknown")
+            return None
+        if not os.path.exists(database_path):
+            logger.warning(f"GeoIP database {database_path} not found, IP locations will be unknown")
+            return None
+
+        try:
+            # MODE_AUTO memory-maps the file, through the C extension when installed
+            reader = geoip2.database.Reader(database_path, mode=maxminddb.MODE_AUTO)
+        except Exception as e:
+            logger.error(f"Error opening GeoIP database {database_path}: {str(e)}")
+            return None
+
+        database_type = reader.metadata().database_type
+        if 'City' not in database_type:
+            logger.error(f"GeoIP database {database_path} is a {database_type} database, a City database is required")
+            reader.close()
+            return None
+        return reader
+
+    @property
+    def enabled(self) -> bool:
+        return self.reader is not None
+
+    def lookup(self, ip_address: str) -> Optional[Dict[str, Any]]:
+        """
+        Location of ip_address as {'latitude', 'longitude', 'city', 'country'},
+        or None when it is invalid, private or not in the database. The dict is
+        shared through the cache and must not be modified.
+        """
+        return self._cached_lookup(ip_address)
+
+    def _lookup(self, ip_address: str) -> Optional[Dict[str, Any]]:
+        if self.reader is None:
+            return None
+
+        try:
+            response = self.reader.city(ip_address)
+        except (geoip2.errors.AddressNotFoundError, ValueError):
+            return None
+        except Exception as e:
+            logger.error(f"GeoIP lookup error for {ip_address}: {str(e)}")
+            return None
+
+        if response.location.latitude is None or response.location.longitude is None:
+            return None
+        return {
+            'latitude': response.location.latitude,
+            'longitude': response.location.longitude,
+            'city': response.city.name,
+            'country': response.country.iso_code
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """Database and cache statistics"""
+        info = self._cached_lookup.cache_info()
+        return {
+            'enabled': self.enabled,
+            'database': self.database_path,
+            'cache_hits': info.hits,
+            'cache_misses': info.misses,
+            'cache_size': info.currsize,
+            'cache_max_size': info.maxsize
+        }
+
+    def close(self):
+        """Release the memory-mapped database"""
+        if self.reader is not None:
+            self.reader.close()
+            self.reader = None
+        self._cached_lookup.cache_clear()
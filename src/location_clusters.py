@@ -0,0 +1,131 @@
+"""
+TrustAI Location Clusters - Compact per-user "home areas" maintained online from location sightings
+"""
+
+from itertools import groupby
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.geo import haversine_km
+
+# A sighting this close to a cluster centroid joins that cluster
+CLUSTER_RADIUS_KM = 25.0
+
+# Per-user state is bounded: beyond this many clusters the lightest
+# (then least recently seen) one is dropped
+MAX_CLUSTERS_PER_USER = 8
+
+
+def update_clusters(clusters: List[Dict[str, Any]], latitude: float, longitude: float,
+                    seen_at: Any, weight: int = 1) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+    """
+    Fold one sighting (weight times at seen_at) into a user's clusters, in place.
+
+    Returns (cluster, evicted): the cluster the point joined or started (a new
+    one has id None) and the cluster dropped to stay within
+    MAX_CLUSTERS_PER_USER, if any.
+    """
+    if clusters:
+        distances = haversine_km(latitude, longitude,
+                                 [cluster['latitude'] for cluster in clusters],
+                                 [cluster['longitude'] for cluster in clusters])
+        nearest = int(np.argmin(distances))
+        if distances[nearest] <= CLUSTER_RADIUS_KM:
+            cluster = clusters[nearest]
+            total = cluster['weight'] + weight
+            centroid_lat = cluster['latitude'] + (latitude - cluster['latitude']) * weight / total
+            centroid_lon = cluster['longitude'] + (longitude - cluster['longitude']) * weight / total
+
+            # Grow the radius by how far the centroid moved so it still covers
+            # every earlier member, and far enough to cover the new point;
+            # members joined within CLUSTER_RADIUS_KM, so that bounds it
+            shift = float(haversine_km(cluster['latitude'], cluster['longitude'], centroid_lat, centroid_lon))
+            reach = float(haversine_km(centroid_lat, centroid_lon, latitude, longitude))
+            cluster.update({
+                'latitude': centroid_lat,
+                'longitude': centroid_lon,
+                'radius_km': min(CLUSTER_RADIUS_KM, max(cluster['radius_km'] + shift, reach)),
+                'weight': total,
+                'last_seen': max(cluster['last_seen'], seen_at)
+            })
+            return cluster, None
+
+    cluster = {
+        'id': None,
+        'latitude': latitude,
+        'longitude': longitude,
+        'radius_km': 0.0,
+        'weight': weight,
+        'last_seen': seen_at
+    }
+    evicted = None
+    if len(clusters) >= MAX_CLUSTERS_PER_USER:
+        evicted = min(clusters, key=lambda c: (c['weight'], c['last_seen']))
+        clusters.remove(evicted)
+    clusters.append(cluster)
+    return cluster, evicted
+
+
+# SQLite persistence in user_location_clusters (migration 10)
+CLUSTER_COLUMNS = ('id', 'latitude', 'longitude', 'radius_km', 'weight', 'last_seen')
+
+
+def load_clusters(conn, user_id: int) -> List[Dict[str, Any]]:
+    """All clusters of one user"""
+    cursor = conn.execute(f'''
+        SELECT {', '.join(CLUSTER_COLUMNS)} FROM user_location_clusters WHERE user_id = ?
+    ''', (user_id,))
+    return [dict(zip(CLUSTER_COLUMNS, row)) for row in cursor]
+
+
+def save_cluster(conn, user_id: int, cluster: Dict[str, Any], evicted: Optional[Dict[str, Any]]):
+    """Write back the result of update_clusters"""
+    if evicted is not None:
+        conn.execute('DELETE FROM user_location_clusters WHERE id = ?', (evicted['id'],))
+    values = (cluster['latitude'], cluster['longitude'], cluster['radius_km'], cluster['weight'], cluster['last_seen'])
+    if cluster['id'] is None:
+        cluster['id'] = conn.execute('''
+            INSERT INTO user_location_clusters (latitude, longitude, radius_km, weight, last_seen, user_id)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (*values, user_id)).lastrowid
+    else:
+        conn.execute('''
+            UPDATE user_location_clusters
+            SET latitude = ?, longitude = ?, radius_km = ?, weight = ?, last_seen = ?
+            WHERE id = ?
+        ''', (*values, cluster['id']))
+
+
+def record_location(conn, user_id: int, latitude: float, longitude: float, seen_at: str):
+    """Fold one sighting into the user's stored clusters"""
+    clusters = load_clusters(conn, user_id)
+    save_cluster(conn, user_id, *update_clusters(clusters, latitude, longitude, seen_at))
+
+
+def rebuild_location_clusters(conn) -> int:
+    """
+    Recompute user_location_clusters from user_locations, returning the rows
+    written. Each stored location counts seen_count times at its last_seen,
+    so the result approximates rather than replays the online updates.
+    """
+    cursor = conn.execute('''
+        SELECT user_id, latitude, longitude, seen_count, last_seen FROM user_locations
+        WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+        ORDER BY user_id, last_seen
+    ''')
+    rows = []
+    for user_id, locations in groupby(cursor, key=lambda row: row[0]):
+        clusters = []
+        for _, latitude, longitude, seen_count, last_seen in locations:
+            update_clusters(clusters, latitude, longitude, last_seen, weight=seen_count)
+        rows.extend(
+            (cluster['latitude'], cluster['longitude'], cluster['radius_km'], cluster['weight'], cluster['last_seen'], user_id)
+            for cluster in clusters
+        )
+
+    conn.execute('DELETE FROM user_location_clusters')
+    return conn.executemany('''
+        INSERT INTO user_location_clusters (latitude, longitude, radius_km, weight, last_seen, user_id)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', rows).rowcount
@@ -0,0 +1,821 @@
+"""
+TrustAI In-Memory Storage Backend - Database API over dicts and deques, no I/O
+"""
+
+import copy
+import json
+import itertools
+import threading
+from collections import Counter, deque
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Any, Optional, Sequence, Tuple
+
+from src.amount_stats import AmountStats, add_amount
+from src.behavior_profile import BehaviorProfile
+from src.device_fingerprint import index_keys
+from src.snapshot import SNAPSHOT_SECTIONS, UserFeatureSnapshot, hour_of_week, time_patterns_from_histogram
+from src.trust_decay import fold_trust_scores
+from src.unit_of_work import UnitOfWork
+from src.geo import within_radius
+from src.location_clusters import update_clusters
+from src.score_factors import ScoreFactorCache, location_trust
+from src.velocity import VelocityCounters
+
+
+def _now() -> str:
+    # Same 'YYYY-MM-DD HH:MM:SS' format SQLite's CURRENT_TIMESTAMP produces
+    return datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _format_timestamp(value: Any) -> Optional[str]:
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.strftime('%Y-%m-%d %H:%M:%S') if value else None
+
+
+def _since(**delta) -> str:
+    return (datetime.utcnow() - timedelta(**delta)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _copy_rows(rows: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    return {key: dict(row) for key, row in rows.items()}
+
+
+# How apply_writes copies each per-user structure before a group of writes
+# changes it (history deques only ever gain rows, so a shallow copy does)
+_STATE_COPIES = {
+    '_users': dict,
+    '_activities': copy.copy,
+    '_transactions': copy.copy,
+    '_trust_scores': copy.copy,
+    '_devices': _copy_rows,
+    '_locations': _copy_rows,
+    '_location_clusters': lambda clusters: [dict(cluster) for cluster in clusters],
+    '_activity_hours': Counter,
+    '_behavior_profiles': BehaviorProfile.copy,
+    '_amount_stats': AmountStats.copy,
+    '_device_components': set,
+}
+
+
+class InMemoryDatabase:
+    """
+    Process-local implementation of the Database method surface.
+
+    Per-user history lives in deques, most recently logged first, capped at
+    history_limit rows, so TrustEngine can score millions of events in batch
+    jobs and benchmarks with bounded memory. The scoring windows (100
+    transactions, 50 activities) must fit inside history_limit. A single
+    lock makes every call atomic, so snapshots are consistent.
+    """
+
+    # Per-user state each write method changes, saved by apply_writes so a
+    # failing write can undo the ones before it
+    WRITE_STATE = {
+        'log_activity': ('_activities', '_activity_hours', '_behavior_profiles'),
+        'log_transaction': ('_transactions', '_amount_stats'),
+        'store_trust_score': ('_trust_scores', '_users'),
+        'store_device_fingerprint': ('_devices',),
+        'store_user_location': ('_locations', '_location_clusters'),
+    }
+
+    def __init__(self, history_limit: int = 1000, activity_log_limit: int = 100000,
+                 score_factors_cache: ScoreFactorCache = None):
+        if history_limit < 100:
+            raise ValueError("history_limit must cover the 100-transaction scoring window")
+
+        self.history_limit = history_limit
+        self._lock = threading.RLock()
+        self._ids = {table: itertools.count(1) for table in (
+            'users', 'activities', 'transactions', 'device_fingerprints',
+            'user_locations', 'user_location_clusters', 'trust_scores', 'incidents'
+        )}
+
+        self._users: Dict[int, Dict[str, Any]] = {}
+        self._users_by_username: Dict[str, int] = {}
+        self._users_by_email: Dict[str, int] = {}
+
+        # user_id -> deque of rows, most recent first
+        self._activities: Dict[int, deque] = {}
+        self._transactions: Dict[int, deque] = {}
+        self._trust_scores: Dict[int, deque] = {}
+        self._incidents: Dict[int, deque] = {}
+        # user_id -> key -> row
+        self._devices: Dict[int, Dict[str, Dict[str, Any]]] = {}
+        self._locations: Dict[int, Dict[str, Dict[str, Any]]] = {}
+        # (user_id, component, value) -> fingerprints, the device component index
+        self._device_components: Dict[Tuple[int, str, str], set] = {}
+        # user_id -> location clusters, bounded per user
+        self._location_clusters: Dict[int, List[Dict[str, Any]]] = {}
+        # user_id -> activity count per hour of the week, over all history
+        self._activity_hours: Dict[int, Counter] = {}
+        # user_id -> behavior profile, over all history
+        self._behavior_profiles: Dict[int, BehaviorProfile] = {}
+        # Sliding-window transaction counts and amounts per user
+        self._velocity = VelocityCounters()
+        # user_id -> running transaction amount statistics, over all history
+        self._amount_stats: Dict[int, AmountStats] = {}
+
+        # Every user's activities, most recent first, for the admin dashboard
+        self._activity_log = deque(maxlen=activity_log_limit)
+        # get_score_factors summaries, dropped when the user logs an activity
+        self.score_factors_cache = score_factors_cache or ScoreFactorCache()
+
+    def _history(self, index: Dict[int, deque], user_id: int) -> deque:
+        history = index.get(user_id)
+        if history is None:
+            history = index[user_id] = deque(maxlen=self.history_limit)
+        return history
+
+    def init_db(self):
+        """Nothing to initialize; kept for Database compatibility"""
+
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """No connections to pool; report the store size instead"""
+        with self._lock:
+            return {
+                'backend': 'memory',
+                'users': len(self._users),
+                'logged_activities': len(self._activity_log)
+            }
+
+    def close(self):
+        """Nothing to close; kept for Database compatibility"""
+
+    def apply_writes(self, writes: List[Tuple[str, tuple]]):
+        """
+        Apply (method name, args) writes all or nothing: readers never see
+        part of them, and if one raises, the ones before it are undone
+        before the exception propagates, as a rolled-back transaction would be
+        """
+        writes = list(self._flatten_writes(writes))
+        with self._lock:
+            saved, velocity, activity_log = self._save_write_state(writes)
+            try:
+                for method, args in writes:
+                    getattr(self, method)(*args)
+            except Exception:
+                for (name, key), value in saved.items():
+                    index = getattr(self, name)
+                    if value is None:
+                        index.pop(key, None)
+                    else:
+                        index[key] = value
+                for user_id, rings in velocity.items():
+                    self._velocity.restore_user(user_id, rings)
+                self._restore_activity_log(*activity_log)
+                raise
+
+    def _flatten_writes(self, writes: Iterable[Tuple[str, tuple]]) -> Iterable[Tuple[str, tuple]]:
+        # A write-behind batch nests unit-of-work groups as apply_writes calls
+        for method, args in writes:
+            if method == 'apply_writes':
+                yield from self._flatten_writes(args[0])
+            else:
+                yield method, args
+
+    def _save_write_state(self, writes: List[Tuple[str, tuple]]):
+        """Copies of the state writes will change: ({(structure, key): value or None}, velocity rings, activity log mark)"""
+        saved, velocity = {}, {}
+
+        def save(name, key):
+            if (name, key) not in saved:
+                value = getattr(self, name).get(key)
+                saved[name, key] = None if value is None else _STATE_COPIES[name](value)
+
+        for method, args in writes:
+            user_id = args[0]
+            for name in self.WRITE_STATE.get(method, ()):
+                save(name, user_id)
+            if method == 'store_device_fingerprint':
+                for component, value in index_keys(args[1]):
+                    save('_device_components', (user_id, component, value))
+            if method == 'log_transaction' and user_id not in velocity:
+                velocity[user_id] = self._velocity.save_user(user_id)
+
+        # The shared activity log only gains rows at its head, dropping its
+        # oldest ones when full: remember the head and the rows it may drop
+        log = self._activity_log
+        activities = sum(method == 'log_activity' for method, _ in writes)
+        activity_log = (log[0]['id'] if log else 0, len(log), list(itertools.islice(reversed(log), activities)))
+        return saved, velocity, activity_log
+
+    def _restore_activity_log(self, head_id: int, length: int, oldest: List[Dict[str, Any]]):
+        log = self._activity_log
+        while log and log[0]['id'] > head_id:
+            log.popleft()
+        for activity in reversed(oldest[:length - len(log)]):
+            log.append(activity)
+
+    def unit_of_work(self) -> UnitOfWork:
+        """Collect the writes for one decision and apply them together"""
+        return UnitOfWork(self)
+
+    # User operations
+    def create_user(self, username: str, email: str, password_hash: str, role: str = 'user') -> int:
+        """Create a new user"""
+        with self._lock:
+            if username in self._users_by_username or email in self._users_by_email:
+                return None
+
+            user_id = next(self._ids['users'])
+            self._users[user_id] = {
+                'id': user_id,
+                'username': username,
+                'email': email,
+                'password_hash': password_hash,
+                'role': role,
+                'verified': 0,
+                'created_at': _now(),
+                'last_login': None,
+                'trust_score': 70.0,
+                'decayed_trust_score': None,
+                'trust_score_weight': 0.0,
+                'trust_score_updated_at': None
+            }
+            self._users_by_username[username] = user_id
+            self._users_by_email[email] = user_id
+            self.score_factors_cache.invalidate([user_id])
+            return user_id
+
+    def get_user(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Get user by ID"""
+        with self._lock:
+            user = self._users.get(user_id)
+            return dict(user) if user else None
+
+    def get_user_by_username(self, username: str) -> Optional[Dict[str, Any]]:
+        """Get user by username"""
+        with self._lock:
+            return self.get_user(self._users_by_username.get(username))
+
+    def get_user_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+        """Get user by email"""
+        with self._lock:
+            return self.get_user(self._users_by_email.get(email))
+
+    def _update_user(self, user_id: int, **values):
+        with self._lock:
+            if user_id in self._users:
+                self._users[user_id].update(values)
+
+    def update_last_login(self, user_id: int):
+        """Update user's last login timestamp"""
+        self._update_user(user_id, last_login=_now())
+
+    def update_user_password(self, user_id: int, password_hash: str):
+        """Replace a user's password hash"""
+        self._update_user(user_id, password_hash=password_hash)
+
+    def set_user_verified(self, user_id: int):
+        """Mark a user's email as verified"""
+        with self._lock:
+            self._update_user(user_id, verified=1)
+            self.score_factors_cache.invalidate([user_id])
+
+    # Activity logging
+    def log_activity(self, user_id: int, action_type: str, trust_result: Dict[str, Any], context: Dict[str, Any]):
+        """Log user activity"""
+        timestamp = _format_timestamp(context.get('timestamp')) or _now()
+        activity = {
+            'user_id': user_id,
+            'action_type': action_type,
+            'trust_score': trust_result['score'],
+            'risk_level': trust_result['risk_level'],
+            'decision': trust_result['decision'],
+            'context': json.dumps(context, default=str),
+            'ip_address': context.get('ip_address'),
+            'user_agent': context.get('user_agent'),
+            'timestamp': timestamp
+        }
+        with self._lock:
+            activity['id'] = next(self._ids['activities'])
+            self._history(self._activities, user_id).appendleft(activity)
+            self._activity_log.appendleft(activity)
+            hours = self._activity_hours.setdefault(user_id, Counter())
+            hours[hour_of_week(datetime.fromisoformat(timestamp))] += 1
+            self._behavior_profiles.setdefault(user_id, BehaviorProfile()).add(action_type, context)
+            self.score_factors_cache.invalidate([user_id])
+
+    def get_user_activities(self, user_id: int, limit: int = 10) -> List[Dict[str, Any]]:
+        """Get recent user activities"""
+        with self._lock:
+            recent = list(itertools.islice(self._activities.get(user_id, ()), limit))
+        return [dict(activity, context=json.loads(activity['context'])) for activity in recent]
+
+    # Transaction operations
+    def log_activities_bulk(self, activities: Iterable[Tuple[int, str, Dict[str, Any], Dict[str, Any]]]) -> int:
+        """Log many (user_id, action_type, trust_result, context) activities"""
+        return self._apply_each(self.log_activity, activities)
+
+    def _apply_each(self, method, rows: Iterable[tuple]) -> int:
+        count = 0
+        with self._lock:
+            for row in rows:
+                method(*row)
+                count += 1
+        return count
+
+    def log_transaction(self, user_id: int, amount: float, merchant: str,
+                        transaction_type: str, trust_score: float, risk_level: str,
+                        timestamp: datetime = None) -> int:
+        """Log a transaction"""
+        timestamp = _format_timestamp(timestamp) or _now()
+        with self._lock:
+            transaction_id = next(self._ids['transactions'])
+            self._velocity.add(user_id, timestamp, amount)
+            add_amount(self._amount_stats, user_id, amount)
+            self._history(self._transactions, user_id).appendleft({
+                'id': transaction_id,
+                'user_id': user_id,
+                'amount': amount,
+                'merchant': merchant,
+                'transaction_type': transaction_type,
+                'trust_score': trust_score,
+                'risk_level': risk_level,
+                'status': 'pending',
+                'timestamp': timestamp
+            })
+            self.score_factors_cache.invalidate([user_id])
+            return transaction_id
+
+    def log_transactions_bulk(self, records: Iterable[tuple]) -> int:
+        """Log many log_transaction argument tuples (optionally ending in a timestamp)"""
+        return self._apply_each(self.log_transaction, records)
+
+    def get_user_amount_stats(self, user_id: int) -> AmountStats:
+        """Get user's running transaction amount statistics"""
+        with self._lock:
+            return self._amount_stats.get(user_id, AmountStats()).copy()
+
+    def rebuild_amount_stats(self) -> int:
+        """
+        Recompute the amount statistics from the transactions still held in
+        memory (at most history_limit per user), returning the users written
+        """
+        with self._lock:
+            self._amount_stats = {}
+            for user_id, history in self._transactions.items():
+                for transaction in reversed(history):
+                    add_amount(self._amount_stats, user_id, transaction['amount'])
+            return len(self._amount_stats)
+
+    def get_user_transactions(self, user_id: int, since: datetime = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """Get user transactions"""
+        since = since.strftime('%Y-%m-%d %H:%M:%S') if since else ''
+        with self._lock:
+            rows = (row for row in self._transactions.get(user_id, ()) if row['timestamp'] >= since)
+            return [dict(row) for row in itertools.islice(rows, limit)]
+
+    # Device fingerprint operations
+    def store_device_fingerprint(self, user_id: int, fingerprint: str):
+        """Store or update device fingerprint"""
+        timestamp = _now()
+        with self._lock:
+            devices = self._devices.setdefault(user_id, {})
+            if fingerprint in devices:
+                devices[fingerprint]['last_seen'] = timestamp
+                devices[fingerprint]['seen_count'] += 1
+            else:
+                devices[fingerprint] = {
+                    'id': next(self._ids['device_fingerprints']),
+                    'user_id': user_id,
+                    'fingerprint': fingerprint,
+                    'first_seen': timestamp,
+                    'last_seen': timestamp,
+                    'trust_level': 50.0,
+                    'seen_count': 1
+                }
+                for name, value in index_keys(fingerprint):
+                    self._device_components.setdefault((user_id, name, value), set()).add(fingerprint)
+            self.score_factors_cache.invalidate([user_id])
+
+    def get_user_devices(self, user_id: int, days: int = 30) -> List[Dict[str, Any]]:
+        """Get user's recent devices"""
+        return self._recent(self._devices, user_id, days)
+
+    def find_similar_devices(self, user_id: int, fingerprint: str, days: int = 30) -> List[str]:
+        """
+        Fingerprints of the user's devices seen in the last `days` that are
+        this one or share an indexed component with it (the only ones that
+        can be similar to it), looked up through the device component index
+        """
+        since = _since(days=days)
+        with self._lock:
+            candidates = {fingerprint}
+            for name, value in index_keys(fingerprint):
+                candidates.update(self._device_components.get((user_id, name, value), ()))
+            devices = self._devices.get(user_id, {})
+            return [
+                candidate for candidate in candidates
+                if candidate in devices and devices[candidate]['last_seen'] >= since
+            ]
+
+    def find_similar_devices_bulk(self, probes: List[Tuple[int, str]], days: int = 30) -> List[List[str]]:
+        """find_similar_devices for many (user_id, fingerprint) pairs under a single hold of the store lock"""
+        with self._lock:
+            return [self.find_similar_devices(user_id, fingerprint, days) for user_id, fingerprint in probes]
+
+    def rebuild_device_index(self) -> int:
+        """Recompute the device component index from the stored devices, returning the entries written"""
+        with self._lock:
+            self._device_components = {}
+            count = 0
+            for user_id, devices in self._devices.items():
+                for fingerprint in devices:
+                    for name, value in index_keys(fingerprint):
+                        self._device_components.setdefault((user_id, name, value), set()).add(fingerprint)
+                        count += 1
+            return count
+
+    def _recent(self, index: Dict[int, Dict[str, Dict[str, Any]]], user_id: int, days: int) -> List[Dict[str, Any]]:
+        since = _since(days=days)
+        with self._lock:
+            rows = [dict(row) for row in index.get(user_id, {}).values() if row['last_seen'] >= since]
+        return sorted(rows, key=lambda row: row['last_seen'], reverse=True)
+
+    # Trust score operations
+    def store_trust_score(self, user_id: int, result: Dict[str, Any]):
+        """Store trust score result"""
+        now = _now()
+        with self._lock:
+            self._history(self._trust_scores, user_id).appendleft({
+                'id': next(self._ids['trust_scores']),
+                'user_id': user_id,
+                'score': result['score'],
+                'factors': json.dumps(result.get('risk_factors', {})),
+                'timestamp': now
+            })
+            # Update user's current and decayed trust scores
+            user = self._users.get(user_id)
+            if user is not None:
+                score, weight = fold_trust_scores(
+                    user['decayed_trust_score'], user['trust_score_weight'], user['trust_score_updated_at'],
+                    result['score'], 1, datetime.fromisoformat(now)
+                )
+                self._update_user(
+                    user_id, trust_score=result['score'], decayed_trust_score=score,
+                    trust_score_weight=weight, trust_score_updated_at=now
+                )
+            self.score_factors_cache.invalidate([user_id])
+
+    def store_trust_scores_bulk(self, scores: Iterable[Tuple[int, Dict[str, Any]]]) -> int:
+        """Store many (user_id, result) trust scores"""
+        return self._apply_each(self.store_trust_score, scores)
+
+    def get_recent_trust_scores(self, user_id: int, limit: int = 5) -> List[float]:
+        """Get recent trust scores for a user"""
+        with self._lock:
+            return [row['score'] for row in itertools.islice(self._trust_scores.get(user_id, ()), limit)]
+
+    def rebuild_decayed_trust_scores(self) -> int:
+        """
+        Recompute the decayed trust scores from the scores still held in
+        memory (at most history_limit per user), returning the users written
+        """
+        with self._lock:
+            count = 0
+            for user_id, user in self._users.items():
+                score, weight, updated_at = None, 0.0, None
+                for row in reversed(self._trust_scores.get(user_id, ())):
+                    timestamp = datetime.fromisoformat(row['timestamp'])
+                    score, weight = fold_trust_scores(score, weight, updated_at, row['score'], 1, timestamp)
+                    updated_at = timestamp
+                user.update(
+                    decayed_trust_score=score, trust_score_weight=weight,
+                    trust_score_updated_at=updated_at.strftime('%Y-%m-%d %H:%M:%S') if updated_at else None
+                )
+                if updated_at:
+                    count += 1
+            return count
+
+    def get_trust_score_history(self, user_id: int, limit: int = 30) -> List[Dict[str, Any]]:
+        """Get trust score history"""
+        with self._lock:
+            return [
+                {'score': row['score'], 'timestamp': row['timestamp']}
+                for row in itertools.islice(self._trust_scores.get(user_id, ()), limit)
+            ]
+
+    # Location operations
+    def store_user_location(self, user_id: int, ip_address: str, location_data: Dict[str, Any]):
+        """Store user location data"""
+        timestamp = _now()
+        with self._lock:
+            locations = self._locations.setdefault(user_id, {})
+            if ip_address in locations:
+                location = locations[ip_address]
+                location.update({
+                    key: location_data[key]
+                    for key in ('latitude', 'longitude', 'city', 'country')
+                    if location_data.get(key) is not None
+                })
+                location['last_seen'] = timestamp
+                location['seen_count'] += 1
+            else:
+                locations[ip_address] = {
+                    'id': next(self._ids['user_locations']),
+                    'user_id': user_id,
+                    'ip_address': ip_address,
+                    'latitude': location_data.get('latitude'),
+                    'longitude': location_data.get('longitude'),
+                    'city': location_data.get('city'),
+                    'country': location_data.get('country'),
+                    'first_seen': timestamp,
+                    'last_seen': timestamp,
+                    'seen_count': 1
+                }
+
+            if location_data.get('latitude') is not None and location_data.get('longitude') is not None:
+                clusters = self._location_clusters.setdefault(user_id, [])
+                cluster, _ = update_clusters(clusters, location_data['latitude'], location_data['longitude'], timestamp)
+                if cluster['id'] is None:
+                    cluster.update({'id': next(self._ids['user_location_clusters']), 'user_id': user_id})
+            self.score_factors_cache.invalidate([user_id])
+
+    def get_user_locations(self, user_id: int, days: int = 30) -> List[Dict[str, Any]]:
+        """Get user's recent locations"""
+        return self._recent(self._locations, user_id, days)
+
+    def find_locations_near(self, user_id: Optional[int], latitude: float, longitude: float,
+                            radius_km: float) -> List[Dict[str, Any]]:
+        """
+        Stored locations within radius_km of a point, nearest first, each with
+        a distance_km. user_id None searches every user's locations.
+        """
+        with self._lock:
+            indexes = self._locations.values() if user_id is None else [self._locations.get(user_id, {})]
+            rows = [
+                dict(location)
+                for locations in indexes
+                for location in locations.values()
+                if location['latitude'] is not None and location['longitude'] is not None
+            ]
+        return within_radius(rows, latitude, longitude, radius_km)
+
+    def get_user_location_clusters(self, user_id: int, days: int = 30) -> List[Dict[str, Any]]:
+        """Get user's location clusters seen recently, latest first"""
+        since = _since(days=days)
+        with self._lock:
+            clusters = [dict(cluster) for cluster in self._location_clusters.get(user_id, ()) if cluster['last_seen'] >= since]
+        return sorted(clusters, key=lambda cluster: cluster['last_seen'], reverse=True)
+
+    def rebuild_location_index(self) -> int:
+        """No spatial index in memory; nothing to rebuild"""
+        return 0
+
+    def rebuild_location_clusters(self) -> int:
+        """Recompute the location clusters from the stored locations, returning the clusters written"""
+        with self._lock:
+            self._location_clusters = {}
+            for user_id, locations in self._locations.items():
+                clusters = self._location_clusters[user_id] = []
+                for location in sorted(locations.values(), key=lambda location: location['last_seen']):
+                    if location['latitude'] is None or location['longitude'] is None:
+                        continue
+                    cluster, _ = update_clusters(
+                        clusters, location['latitude'], location['longitude'],
+                        location['last_seen'], weight=location['seen_count']
+                    )
+                    if cluster['id'] is None:
+                        cluster.update({'id': next(self._ids['user_location_clusters']), 'user_id': user_id})
+            return sum(len(clusters) for clusters in self._location_clusters.values())
+
+    # Admin dashboard methods
+    def get_total_users(self) -> int:
+        """Get total number of users"""
+        with self._lock:
+            return len(self._users)
+
+    def get_total_transactions(self) -> int:
+        """Get total number of transactions"""
+        with self._lock:
+            return sum(len(history) for history in self._transactions.values())
+
+    def get_fraud_count(self) -> int:
+        """Get number of high-risk activities detected"""
+        with self._lock:
+            return sum(1 for activity in self._activity_log if activity['risk_level'] == 'high')
+
+    def get_average_trust_score(self) -> float:
+        """Get average trust score across all users"""
+        with self._lock:
+            scores = [user['trust_score'] for user in self._users.values() if user['trust_score'] is not None]
+        return round(sum(scores) / len(scores), 2) if scores else 0.0
+
+    def get_recent_alerts(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Get recent high-risk activities"""
+        with self._lock:
+            alerts = []
+            for activity in self._activity_log:
+                if len(alerts) >= limit:
+                    break
+                user = self._users.get(activity['user_id'])
+                if activity['risk_level'] in ('high', 'medium') and user:
+                    alerts.append(dict(activity, username=user['username'], context=json.loads(activity['context'])))
+            return alerts
+
+    def get_common_user_agents(self, limit: int = 1000) -> List[str]:
+        """Distinct user agents in the activity log, most frequent first"""
+        with self._lock:
+            counts = Counter(activity['user_agent'] for activity in self._activity_log if activity['user_agent'])
+        return [user_agent for user_agent, _ in counts.most_common(limit)]
+
+    def get_risk_distribution(self) -> Dict[str, int]:
+        """Get distribution of risk levels"""
+        since = _since(days=7)
+        distribution = {'low': 0, 'medium': 0, 'high': 0}
+        with self._lock:
+            for activity in self._activity_log:
+                if activity['timestamp'] >= since:
+                    distribution[activity['risk_level']] = distribution.get(activity['risk_level'], 0) + 1
+        return distribution
+
+    def get_hourly_activity_stats(self) -> List[Dict[str, Any]]:
+        """Get hourly activity statistics for the last 24 hours"""
+        since = _since(hours=24)
+        buckets: Dict[int, List[Dict[str, Any]]] = {}
+        with self._lock:
+            for activity in self._activity_log:
+                if activity['timestamp'] >= since:
+                    buckets.setdefault(int(activity['timestamp'][11:13]), []).append(activity)
+
+        stats = []
+        for hour in sorted(buckets):
+            activities = buckets[hour]
+            average = sum(activity['trust_score'] for activity in activities) / len(activities)
+            stats.append({
+                'hour': hour,
+                'total_activities': len(activities),
+                'high_risk': sum(1 for activity in activities if activity['risk_level'] == 'high'),
+                'avg_trust_score': round(average, 2) if average else 0
+            })
+        return stats
+
+    # User behavior analysis methods
+    def get_user_behavior_patterns(self, user_id: int) -> List[Dict[str, Any]]:
+        """Get user's behavioral patterns"""
+        with self._lock:
+            recent = list(itertools.islice(self._activities.get(user_id, ()), 50))
+
+        patterns = []
+        for activity in recent:
+            timestamp = datetime.fromisoformat(activity['timestamp'])
+            context = json.loads(activity['context'])
+            patterns.append({
+                'action_type': activity['action_type'],
+                'timestamp': activity['timestamp'],
+                'hour_of_day': timestamp.hour,
+                'day_of_week': timestamp.weekday(),
+                'amount': context.get('amount', 0),
+                'merchant': context.get('merchant', ''),
+                'transaction_type': context.get('transaction_type', '')
+            })
+        return patterns
+
+    def get_user_time_patterns(self, user_id: int) -> Dict[str, Any]:
+        """Get user's typical activity time patterns"""
+        with self._lock:
+            histogram = dict(self._activity_hours.get(user_id, ()))
+        return time_patterns_from_histogram(histogram)
+
+    def rebuild_activity_hours(self) -> int:
+        """
+        Recompute the activity hour histogram from the activities still held
+        in memory (at most history_limit per user), returning the buckets written
+        """
+        with self._lock:
+            self._activity_hours = {
+                user_id: Counter(
+                    hour_of_week(datetime.fromisoformat(activity['timestamp'])) for activity in history
+                )
+                for user_id, history in self._activities.items()
+            }
+            return sum(len(hours) for hours in self._activity_hours.values())
+
+    def get_user_behavior_profile(self, user_id: int) -> BehaviorProfile:
+        """Get user's behavior profile"""
+        with self._lock:
+            return self._behavior_profiles.get(user_id, BehaviorProfile()).copy()
+
+    def rebuild_behavior_profiles(self) -> int:
+        """
+        Recompute the behavior profiles from the activities still held in
+        memory (at most history_limit per user), returning the profiles written
+        """
+        with self._lock:
+            self._behavior_profiles = {}
+            for user_id, history in self._activities.items():
+                profile = self._behavior_profiles[user_id] = BehaviorProfile()
+                for activity in reversed(history):
+                    profile.add(activity['action_type'], json.loads(activity['context']))
+            return len(self._behavior_profiles)
+
+    def rebuild_velocity(self) -> int:
+        """Recompute the velocity counters from the transactions still held in memory"""
+        counters = VelocityCounters()
+        with self._lock:
+            for user_id, history in self._transactions.items():
+                for transaction in reversed(history):
+                    counters.add(user_id, transaction['timestamp'], transaction['amount'])
+            self._velocity = counters
+        return sum(1 for _ in counters.buckets())
+
+    def get_user_incidents(self, user_id: int) -> List[Dict[str, Any]]:
+        """Get user's security incidents"""
+        with self._lock:
+            return [dict(row) for row in self._incidents.get(user_id, ())]
+
+    def get_user_activity_score(self, user_id: int) -> float:
+        """Calculate user activity score based on engagement"""
+        since = _since(days=30)
+        with self._lock:
+            # Only the 30 most recent count towards the (max 30 point) score
+            recent = itertools.islice(self._activities.get(user_id, ()), 30)
+            return sum(1 for activity in recent if activity['timestamp'] >= since)
+
+    def get_score_factors(self, user_id: int) -> Dict[str, Any]:
+        """Get user's device, location and behavior trust, account age and verification status"""
+        return self.score_factors_cache.get_or_load(user_id, self._fetch_score_factors)
+
+    def get_score_factors_cache_stats(self) -> Dict[str, Any]:
+        """Score factor cache statistics"""
+        return self.score_factors_cache.stats()
+
+    def _fetch_score_factors(self, user_id: int) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'device_trust': self.get_user_device_trust(user_id),
+                'location_trust': self.get_user_location_trust(user_id),
+                'behavior_trust': self.get_user_behavior_trust(user_id),
+                'account_age_days': self.get_user_account_age(user_id),
+                'verification_status': self.get_user_verification_status(user_id)
+            }
+
+    def get_user_device_trust(self, user_id: int) -> float:
+        """Get user's device trust level"""
+        with self._lock:
+            # Every repeat sighting of a device adds 5 points to its base level
+            levels = [
+                min(100.0, device['trust_level'] + 5.0 * (device['seen_count'] - 1))
+                for device in self._devices.get(user_id, {}).values()
+            ]
+        return round(sum(levels) / len(levels), 2) if levels else 50.0
+
+    def get_user_location_trust(self, user_id: int) -> float:
+        """Get user's location trust level"""
+        with self._lock:
+            # An IP seen only once is not a known location yet
+            location_count = sum(
+                1 for location in self._locations.get(user_id, {}).values() if location['seen_count'] > 1
+            )
+
+        return location_trust(location_count)
+
+    def get_user_behavior_trust(self, user_id: int) -> float:
+        """Get user's behavioral trust level"""
+        since = _since(days=7)
+        with self._lock:
+            scores = [
+                activity['trust_score'] for activity in self._activities.get(user_id, ())
+                if activity['timestamp'] >= since
+            ]
+        return round(sum(scores) / len(scores), 2) if scores else 70.0
+
+    def get_user_account_age(self, user_id: int) -> int:
+        """Get user account age in days"""
+        user = self.get_user(user_id)
+        if not user:
+            return 0
+        return (datetime.utcnow() - datetime.fromisoformat(user['created_at'])).days
+
+    def get_user_verification_status(self, user_id: int) -> bool:
+        """Get user verification status"""
+        user = self.get_user(user_id)
+        return bool(user['verified']) if user else False
+
+    # Feature snapshots
+    def get_user_snapshot(self, user_id: int) -> UserFeatureSnapshot:
+        """Build everything the trust factors need for one user under the store lock"""
+        return UserFeatureSnapshot(user_id, **self.get_user_snapshot_sections(user_id, SNAPSHOT_SECTIONS))
+
+    def get_user_snapshot_sections(self, user_id: int, sections: Sequence[str]) -> Dict[str, Any]:
+        """Build some sections of a user's snapshot under the store lock"""
+        with self._lock:
+            loaders = {
+                'user': lambda: self.get_user(user_id),
+                'device_count': lambda: len(self.get_user_devices(user_id, days=30)),
+                'velocity': lambda: self._velocity.get(user_id),
+                'amount_stats': lambda: self.get_user_amount_stats(user_id),
+                'location_clusters': lambda: self.get_user_location_clusters(user_id, days=30),
+                'behavior_profile': lambda: self.get_user_behavior_profile(user_id),
+                'incident_count': lambda: len(self._incidents.get(user_id, ())),
+                'activity_score': lambda: self.get_user_activity_score(user_id),
+                'time_patterns': lambda: self.get_user_time_patterns(user_id)
+            }
+            return {section: loaders[section]() for section in sections}
+
+    def get_user_snapshots(self, user_ids: List[int]) -> Dict[int, UserFeatureSnapshot]:
+        """Build snapshots for many users under a single hold of the store lock"""
+        with self._lock:
+            return {user_id: self.get_user_snapshot(user_id) for user_id in set(user_ids)}
@@ -0,0 +1,402 @@
+"""
+TrustAI Schema Migrations - Versioned, ordered SQLite schema changes applied at startup
+"""
+
+import sqlite3
+import time
+from typing import Callable, List, Union
+import logging
+
+logger = logging.getLogger(__name__)
+
+# A migration step is either a SQL statement or a callable taking the connection
+Step = Union[str, Callable]
+
+
+class MigrationError(Exception):
+    """Raised when a migration cannot apply to the data in the database as it stands"""
+
+
+class Migration:
+    """
+    A single schema change, identified by a strictly increasing version.
+
+    Migrations only create structures. Tables derived from existing rows come
+    up empty and are filled by the maintenance.py command named in backfill,
+    run by the operator outside startup.
+    """
+
+    def __init__(self, version: int, description: str, steps: List[Step], backfill: str = None):
+        self.version = version
+        self.description = description
+        self.steps = steps
+        self.backfill = backfill
+
+    def apply(self, conn):
+        for step in self.steps:
+            if callable(step):
+                step(conn)
+            else:
+                conn.execute(step)
+
+
+def _add_column(table: str, column: str, definition: str) -> Callable:
+    """Step adding a column unless it already exists (SQLite has no ADD COLUMN IF NOT EXISTS)"""
+    def step(conn):
+        columns = [row[1] for row in conn.execute(f'PRAGMA table_info({table})')]
+        if column not in columns:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+    return step
+
+
+def _create_unique_index(name: str, table: str, key: str) -> Callable:
+    """Step building a unique (user_id, key) index, pointing at merge-duplicates if rows still repeat"""
+    def step(conn):
+        try:
+            conn.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS {name} ON {table} (user_id, {key})')
+        except sqlite3.IntegrityError as e:
+            raise MigrationError(
+                f"Cannot build {name}: {table} holds the same (user_id, {key}) more than once ({str(e)}). "
+                f"Merge the duplicates with 'python maintenance.py merge-duplicates' and start again."
+            ) from e
+    return step
+
+
+# Tables with one row per (user_id, key) since migration 7
+DUPLICATE_KEYS = (('device_fingerprints', 'fingerprint'), ('user_locations', 'ip_address'))
+
+
+def _merge_duplicates(table: str, key: str) -> List[str]:
+    """
+    Statements collapsing rows that share (user_id, key) into the oldest one,
+    keeping the widest first_seen/last_seen span and the summed seen_count
+    """
+    group = f'd.user_id = {table}.user_id AND d.{key} = {table}.{key}'
+    return [
+        f'''
+            UPDATE {table} SET
+                first_seen = (SELECT MIN(d.first_seen) FROM {table} d WHERE {group}),
+                last_seen = (SELECT MAX(d.last_seen) FROM {table} d WHERE {group}),
+                seen_count = (SELECT SUM(d.seen_count) FROM {table} d WHERE {group})
+            WHERE id IN (SELECT MIN(id) FROM {table} GROUP BY user_id, {key} HAVING COUNT(*) > 1)
+        ''',
+        f'''
+            DELETE FROM {table}
+            WHERE id NOT IN (SELECT MIN(id) FROM {table} GROUP BY user_id, {key})
+        ''',
+    ]
+
+
+def merge_duplicates(conn) -> int:
+    """
+    Collapse the device fingerprints and locations stored more than once for
+    a user (before migration 7 made them unique), returning the rows removed
+    """
+    removed = 0
+    for table, key in DUPLICATE_KEYS:
+        # Migration 7 adds the column too, but it is rolled back when the index build fails
+        _add_column(table, 'seen_count', 'INTEGER NOT NULL DEFAULT 1')(conn)
+        update, delete = _merge_duplicates(table, key)
+        conn.execute(update)
+        removed += conn.execute(delete).rowcount
+    return removed
+
+
+def rebuild_activity_hours(conn) -> int:
+    """Recompute user_activity_hours from the activities table, returning the rows written"""
+    conn.execute('DELETE FROM user_activity_hours')
+    cursor = conn.execute('''
+        INSERT INTO user_activity_hours (user_id, hour_of_week, activity_count)
+        SELECT user_id,
+               CAST(strftime('%w', timestamp) AS INTEGER) * 24 + CAST(strftime('%H', timestamp) AS INTEGER),
+               COUNT(*)
+        FROM activities
+        GROUP BY 1, 2
+    ''')
+    return cursor.rowcount
+
+
+def rebuild_location_index(conn) -> int:
+    """Recompute user_locations_rtree from the located rows of user_locations, returning the rows written"""
+    conn.execute('DELETE FROM user_locations_rtree')
+    cursor = conn.execute('''
+        INSERT INTO user_locations_rtree (id, min_lat, max_lat, min_lon, max_lon, user_id)
+        SELECT id, latitude, latitude, longitude, longitude, user_id
+        FROM user_locations
+        WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+    ''')
+    return cursor.rowcount
+
+
+# Every step must be idempotent (IF NOT EXISTS, guarded ALTERs) so a migration
+# interrupted before its version row was written can simply run again. Never
+# rewrite or reorder an entry once released; append new versions instead.
+# Steps must not scan existing rows beyond what an index build needs: they
+# run under the write lock at startup, so backfills go in maintenance.py.
+MIGRATIONS = [
+    Migration(1, 'Index activities by user, risk level and time', [
+        'CREATE INDEX IF NOT EXISTS idx_activities_user_timestamp ON activities (user_id, timestamp)',
+        'CREATE INDEX IF NOT EXISTS idx_activities_risk_timestamp ON activities (risk_level, timestamp)',
+        'CREATE INDEX IF NOT EXISTS idx_activities_timestamp ON activities (timestamp)',
+    ]),
+    Migration(2, 'Index transactions by user and time', [
+        'CREATE INDEX IF NOT EXISTS idx_transactions_user_timestamp ON transactions (user_id, timestamp)',
+    ]),
+    Migration(3, 'Index device fingerprints by user', [
+        'CREATE INDEX IF NOT EXISTS idx_device_fingerprints_user_last_seen ON device_fingerprints (user_id, last_seen)',
+        'CREATE INDEX IF NOT EXISTS idx_device_fingerprints_user_fingerprint ON device_fingerprints (user_id, fingerprint)',
+    ]),
+    Migration(4, 'Index user locations by user', [
+        'CREATE INDEX IF NOT EXISTS idx_user_locations_user_last_seen ON user_locations (user_id, last_seen)',
+        'CREATE INDEX IF NOT EXISTS idx_user_locations_user_ip ON user_locations (user_id, ip_address)',
+    ]),
+    Migration(5, 'Index trust score history by user and time', [
+        'CREATE INDEX IF NOT EXISTS idx_trust_scores_user_timestamp ON trust_scores (user_id, timestamp)',
+    ]),
+    Migration(6, 'Index incidents by user and time', [
+        'CREATE INDEX IF NOT EXISTS idx_incidents_user_timestamp ON incidents (user_id, timestamp)',
+    ]),
+    Migration(7, 'Unique device fingerprints and locations per user, with seen counts', [
+        _add_column('device_fingerprints', 'seen_count', 'INTEGER NOT NULL DEFAULT 1'),
+        _add_column('user_locations', 'seen_count', 'INTEGER NOT NULL DEFAULT 1'),
+        # The unique indexes replace the plain lookup indexes from migrations 3
+        # and 4. Duplicates stop the migration: merging them rewrites the
+        # tables, so it is left to maintenance.py merge-duplicates.
+        _create_unique_index('uq_device_fingerprints_user_fingerprint', 'device_fingerprints', 'fingerprint'),
+        _create_unique_index('uq_user_locations_user_ip', 'user_locations', 'ip_address'),
+        'DROP INDEX IF EXISTS idx_device_fingerprints_user_fingerprint',
+        'DROP INDEX IF EXISTS idx_user_locations_user_ip',
+    ]),
+    Migration(8, 'Per-user hour-of-week activity histogram', [
+        '''
+            CREATE TABLE IF NOT EXISTS user_activity_hours (
+                user_id INTEGER NOT NULL,
+                hour_of_week INTEGER NOT NULL,
+                activity_count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (user_id, hour_of_week)
+            ) WITHOUT ROWID
+        ''',
+        # Triggers keep the histogram exact for every write path (pooled,
+        # single-writer, bulk) without the callers knowing about it
+        '''
+            CREATE TRIGGER IF NOT EXISTS activities_hour_insert AFTER INSERT ON activities
+            BEGIN
+                INSERT INTO user_activity_hours (user_id, hour_of_week, activity_count)
+                VALUES (
+                    NEW.user_id,
+                    CAST(strftime('%w', NEW.timestamp) AS INTEGER) * 24 + CAST(strftime('%H', NEW.timestamp) AS INTEGER),
+                    1
+                )
+                ON CONFLICT (user_id, hour_of_week) DO UPDATE SET activity_count = activity_count + 1;
+            END
+        ''',
+        '''
+            CREATE TRIGGER IF NOT EXISTS activities_hour_delete AFTER DELETE ON activities
+            BEGIN
+                UPDATE user_activity_hours SET activity_count = activity_count - 1
+                WHERE user_id = OLD.user_id
+                  AND hour_of_week = CAST(strftime('%w', OLD.timestamp) AS INTEGER) * 24
+                                     + CAST(strftime('%H', OLD.timestamp) AS INTEGER);
+            END
+        ''',
+    ], backfill='rebuild-activity-hours'),
+    Migration(9, 'Sliding-window transaction velocity buckets', [
+        '''
+            CREATE TABLE IF NOT EXISTS transaction_velocity (
+                user_id INTEGER NOT NULL,
+                window_seconds INTEGER NOT NULL,
+                slot INTEGER NOT NULL,
+                bucket INTEGER NOT NULL,
+                transaction_count INTEGER NOT NULL,
+                amount_sum REAL NOT NULL,
+                PRIMARY KEY (user_id, window_seconds, slot)
+            ) WITHOUT ROWID
+        ''',
+    ], backfill='rebuild-velocity'),
+    Migration(10, 'Per-user location clusters', [
+        '''
+            CREATE TABLE IF NOT EXISTS user_location_clusters (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                latitude REAL NOT NULL,
+                longitude REAL NOT NULL,
+                radius_km REAL NOT NULL DEFAULT 0,
+                weight INTEGER NOT NULL DEFAULT 1,
+                last_seen TIMESTAMP NOT NULL,
+                FOREIGN KEY (user_id) REFERENCES users (id)
+            )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_user_location_clusters_user_last_seen ON user_location_clusters (user_id, last_seen)',
+    ], backfill='rebuild-location-clusters'),
+    Migration(11, 'R*Tree spatial index over user locations', [
+        # Points are stored as zero-size boxes; the R*Tree keeps 32-bit
+        # floats, rounded outwards, so a box query returns a superset to
+        # be refined by exact distance. user_id rides along unindexed.
+        '''
+            CREATE VIRTUAL TABLE IF NOT EXISTS user_locations_rtree USING rtree(
+                id, min_lat, max_lat, min_lon, max_lon, +user_id
+            )
+        ''',
+        '''
+            CREATE TRIGGER IF NOT EXISTS user_locations_rtree_insert AFTER INSERT ON user_locations
+            WHEN NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL
+            BEGIN
+                INSERT INTO user_locations_rtree (id, min_lat, max_lat, min_lon, max_lon, user_id)
+                VALUES (NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude, NEW.user_id);
+            END
+        ''',
+        '''
+            CREATE TRIGGER IF NOT EXISTS user_locations_rtree_update AFTER UPDATE OF latitude, longitude ON user_locations
+            WHEN NEW.latitude IS NOT OLD.latitude OR NEW.longitude IS NOT OLD.longitude
+            BEGIN
+                DELETE FROM user_locations_rtree WHERE id = OLD.id;
+                INSERT INTO user_locations_rtree (id, min_lat, max_lat, min_lon, max_lon, user_id)
+                SELECT NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude, NEW.user_id
+                WHERE NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL;
+            END
+        ''',
+        '''
+            CREATE TRIGGER IF NOT EXISTS user_locations_rtree_delete AFTER DELETE ON user_locations
+            BEGIN
+                DELETE FROM user_locations_rtree WHERE id = OLD.id;
+            END
+        ''',
+    ], backfill='rebuild-location-index'),
+    Migration(12, 'Per-user behavior profiles', [
+        '''
+            CREATE TABLE IF NOT EXISTS user_behavior_profiles (
+                user_id INTEGER PRIMARY KEY,
+                activity_count INTEGER NOT NULL DEFAULT 0,
+                amount_count INTEGER NOT NULL DEFAULT 0,
+                amount_mean REAL NOT NULL DEFAULT 0,
+                amount_max REAL NOT NULL DEFAULT 0,
+                FOREIGN KEY (user_id) REFERENCES users (id)
+            )
+        ''',
+        # feature is 'action' or 'merchant'
+        '''
+            CREATE TABLE IF NOT EXISTS user_behavior_counts (
+                user_id INTEGER NOT NULL,
+                feature TEXT NOT NULL,
+                value TEXT NOT NULL,
+                seen_count INTEGER NOT NULL,
+                PRIMARY KEY (user_id, feature, value)
+            ) WITHOUT ROWID
+        ''',
+    ], backfill='rebuild-behavior-profiles'),
+    Migration(13, 'Per-user transaction amount statistics', [
+        '''
+            CREATE TABLE IF NOT EXISTS user_amount_stats (
+                user_id INTEGER PRIMARY KEY,
+                amount_count INTEGER NOT NULL DEFAULT 0,
+                amount_mean REAL NOT NULL DEFAULT 0,
+                amount_m2 REAL NOT NULL DEFAULT 0,
+                FOREIGN KEY (user_id) REFERENCES users (id)
+            )
+        ''',
+        '''
+            CREATE TABLE IF NOT EXISTS user_amount_buckets (
+                user_id INTEGER NOT NULL,
+                bucket INTEGER NOT NULL,
+                amount_count INTEGER NOT NULL,
+                PRIMARY KEY (user_id, bucket)
+            ) WITHOUT ROWID
+        ''',
+    ], backfill='rebuild-amount-stats'),
+    Migration(14, 'Time-decayed trust score on users', [
+        _add_column('users', 'decayed_trust_score', 'REAL'),
+        _add_column('users', 'trust_score_weight', 'REAL NOT NULL DEFAULT 0'),
+        _add_column('users', 'trust_score_updated_at', 'TIMESTAMP'),
+    ], backfill='rebuild-decayed-trust-scores'),
+    Migration(15, 'Per-user device component index', [
+        # The distinguishing components of each known fingerprint
+        # (device_fingerprint.INDEXED_COMPONENTS), to find a user's similar
+        # devices without reading all of them
+        '''
+            CREATE TABLE IF NOT EXISTS device_fingerprint_components (
+                user_id INTEGER NOT NULL,
+                component TEXT NOT NULL,
+                value TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                PRIMARY KEY (user_id, component, value, fingerprint)
+            ) WITHOUT ROWID
+        ''',
+    ], backfill='rebuild-device-index'),
+]
+
+# Building an index on a large production table holds the write lock for a
+# while; other workers starting at the same time wait this long for it.
+MIGRATION_BUSY_TIMEOUT_MS = 10 * 60 * 1000
+
+
+def get_schema_version(conn) -> int:
+    """Get the highest applied migration version (0 for a fresh database)"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.commit()
+    row = conn.execute('SELECT MAX(version) FROM schema_version').fetchone()
+    return row[0] or 0
+
+
+def run_migrations(conn, migrations: List[Migration] = None) -> List[int]:
+    """
+    Apply pending migrations in version order and return the versions applied.
+
+    Each migration runs in its own IMMEDIATE transaction together with its
+    schema_version row, so concurrent workers serialize on the write lock and
+    a worker that loses the race sees the version already recorded and skips it.
+    """
+    migrations = sorted(migrations or MIGRATIONS, key=lambda m: m.version)
+    applied = []
+    backfills = []
+
+    if get_schema_version(conn) >= migrations[-1].version:
+        return applied
+
+    previous_timeout = conn.execute('PRAGMA busy_timeout').fetchone()[0]
+    conn.execute(f'PRAGMA busy_timeout = {MIGRATION_BUSY_TIMEOUT_MS}')
+    try:
+        for migration in migrations:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                current = conn.execute('SELECT MAX(version) FROM schema_version').fetchone()[0] or 0
+                if migration.version <= current:
+                    conn.rollback()
+                    continue
+
+                started = time.monotonic()
+                migration.apply(conn)
+                conn.execute(
+                    'INSERT INTO schema_version (version, description) VALUES (?, ?)',
+                    (migration.version, migration.description)
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+            applied.append(migration.version)
+            if migration.backfill:
+                backfills.append(migration.backfill)
+            logger.info(
+                f"Applied migration {migration.version} ({migration.description}) "
+                f"in {time.monotonic() - started:.2f}s"
+            )
+
+        if applied:
+            # Refresh planner statistics for the new indexes (bounded work)
+            conn.execute('PRAGMA optimize')
+        if backfills and conn.execute('SELECT EXISTS (SELECT 1 FROM users)').fetchone()[0]:
+            logger.warning(
+                "New derived tables start empty; backfill existing data with: "
+                + ', '.join(f"python maintenance.py {command}" for command in backfills)
+            )
+    finally:
+        conn.execute(f'PRAGMA busy_timeout = {previous_timeout}')
+
+    return applied
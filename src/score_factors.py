@@ -0,0 +1,136 @@
+"""
+TrustAI Score Factors - Per-user trust factor summary and its TTL cache
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Optional
+
+
+def location_trust(known_locations: int) -> float:
+    """Location trust level for a number of known (seen more than once) locations"""
+    # More known locations = higher trust (up to a point)
+    if known_locations == 0:
+        return 30.0
+    elif known_locations <= 3:
+        return 60.0 + (known_locations * 10)
+    else:
+        return 90.0
+
+
+def score_factors(device_trust: Optional[float], known_locations: int, behavior_trust: Optional[float],
+                  account_age_days: Optional[float], verified: Any) -> Dict[str, Any]:
+    """
+    get_score_factors payload from the raw aggregates (None where the user
+    has no rows), with the same defaults as the per-factor getters
+    """
+    return {
+        'device_trust': round(float(device_trust), 2) if device_trust else 50.0,
+        'location_trust': location_trust(known_locations or 0),
+        'behavior_trust': round(float(behavior_trust), 2) if behavior_trust else 70.0,
+        'account_age_days': int(account_age_days) if account_age_days else 0,
+        'verification_status': bool(verified)
+    }
+
+
+class ScoreFactorCache:
+    """
+    Per-user cache of score factor summaries.
+
+    Entries expire ttl_seconds after they were loaded and are dropped once a
+    write that feeds the summary has committed for the user. A load that
+    overlaps an invalidation of the same user is returned but not cached, so
+    a summary read before the write cannot outlive it. At most max_size users
+    are kept, the least recently loaded going first.
+
+    Write helpers call invalidate() as they go; the backend wraps the whole
+    transaction in deferred() so the entries are dropped only after the
+    commit, when a new load can no longer see the old rows.
+    """
+
+    def __init__(self, ttl_seconds: float = 30.0, max_size: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._entries: OrderedDict = OrderedDict()   # user_id -> (expires_at, factors)
+        self._loading: Dict[int, int] = {}           # user_id -> loads in flight
+        self._stale = set()                          # users invalidated while loading
+        self._lock = threading.Lock()
+        self._local = threading.local()              # .pending: users invalidated by this thread's open write
+        self._hits = 0
+        self._misses = 0
+        self._invalidations = 0
+
+    def get_or_load(self, user_id: int, loader: Callable[[int], Dict[str, Any]]) -> Dict[str, Any]:
+        """Cached factors of user_id, calling loader(user_id) on a miss"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > time.monotonic():
+                self._hits += 1
+                return dict(entry[1])
+            self._misses += 1
+            self._loading[user_id] = self._loading.get(user_id, 0) + 1
+
+        cacheable = False
+        try:
+            factors = loader(user_id)
+            cacheable = True
+        finally:
+            with self._lock:
+                self._loading[user_id] -= 1
+                if cacheable and user_id not in self._stale and self.ttl_seconds > 0:
+                    self._entries[user_id] = (time.monotonic() + self.ttl_seconds, factors)
+                    self._entries.move_to_end(user_id)
+                    while len(self._entries) > self.max_size:
+                        self._entries.popitem(last=False)
+                if not self._loading[user_id]:
+                    del self._loading[user_id]
+                    self._stale.discard(user_id)
+        return dict(factors)
+
+    @contextmanager
+    def deferred(self):
+        """
+        Collect this thread's invalidations instead of applying them, yielding
+        the set of user ids; nested uses share the outermost set
+        """
+        pending = getattr(self._local, 'pending', None)
+        if pending is not None:
+            yield pending
+            return
+        pending = self._local.pending = set()
+        try:
+            yield pending
+        finally:
+            self._local.pending = None
+
+    def invalidate(self, user_ids: Iterable[int]):
+        """Drop the cached factors of user_ids (or note them, inside deferred())"""
+        pending = getattr(self._local, 'pending', None)
+        if pending is not None:
+            pending.update(user_ids)
+            return
+        with self._lock:
+            for user_id in user_ids:
+                self._invalidations += 1
+                self._entries.pop(user_id, None)
+                if user_id in self._loading:
+                    self._stale.add(user_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._stale.update(self._loading)
+
+    def stats(self) -> Dict[str, Any]:
+        """Cache statistics"""
+        with self._lock:
+            return {
+                'cache_hits': self._hits,
+                'cache_misses': self._misses,
+                'invalidations': self._invalidations,
+                'cache_size': len(self._entries),
+                'cache_max_size': self.max_size,
+                'ttl_seconds': self.ttl_seconds
+            }
@@ -0,0 +1,78 @@
+"""
+TrustAI User Feature Snapshot - Point-in-time view of a user's scoring history
+"""
+
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Any, Optional
+
+from src.amount_stats import AmountStats
+from src.behavior_profile import BehaviorProfile
+from src.velocity import empty_velocity
+
+
+# Sections of a UserFeatureSnapshot, in constructor order
+SNAPSHOT_SECTIONS = (
+    'user',
+    'device_count',
+    'velocity',
+    'amount_stats',
+    'location_clusters',
+    'behavior_profile',
+    'incident_count',
+    'activity_score',
+    'time_patterns'
+)
+
+
+def hour_of_week(timestamp: datetime) -> int:
+    """Bucket (0-167) of the activity hour histogram; weeks start on Sunday like SQLite's %w"""
+    return (timestamp.isoweekday() % 7) * 24 + timestamp.hour
+
+
+def time_patterns_from_histogram(histogram: Dict[int, int]) -> Dict[str, Any]:
+    """Fold a user's hour-of-week activity counts into the time_patterns the factors read"""
+    by_hour = Counter()
+    for bucket, count in histogram.items():
+        by_hour[bucket % 24] += count
+    if not by_hour:
+        return {'typical_hours': []}
+
+    # Top 3 most active hours, ties going to the earlier hour
+    ranked = sorted(by_hour.items(), key=lambda item: (-item[1], item[0]))
+    return {
+        'typical_hours': [hour for hour, _ in ranked[:3]],
+        'activity_distribution': dict(ranked),
+        'weekly_distribution': dict(sorted(histogram.items()))
+    }
+
+
+class UserFeatureSnapshot:
+    """
+    Everything the trust factors read about one user, loaded together so
+    every factor sees the same consistent view of the user's history
+    """
+
+    def __init__(self, user_id: int,
+                 user: Optional[Dict[str, Any]] = None,
+                 device_count: int = 0,
+                 velocity: Dict[int, Dict[str, float]] = None,
+                 amount_stats: AmountStats = None,
+                 location_clusters: List[Dict[str, Any]] = None,
+                 behavior_profile: BehaviorProfile = None,
+                 incident_count: int = 0,
+                 activity_score: float = 0,
+                 time_patterns: Dict[str, Any] = None):
+        self.user_id = user_id
+        self.user = user                                  # users row, None if unknown
+        self.device_count = device_count                  # device_fingerprints seen in the last 30 days
+        self.velocity = velocity or empty_velocity()      # {window_seconds: {'count', 'amount'}}
+        self.amount_stats = amount_stats or AmountStats()  # all transaction amounts so far
+        self.location_clusters = location_clusters or []  # user_location_clusters, last 30 days, latest first
+        self.behavior_profile = behavior_profile or BehaviorProfile()  # user_behavior_profiles
+        self.incident_count = incident_count
+        self.activity_score = activity_score
+        self.time_patterns = time_patterns or {'typical_hours': []}
+
+    def __repr__(self):
+        return f"<UserFeatureSnapshot user_id={self.user_id}>"
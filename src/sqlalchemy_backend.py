@@ -0,0 +1,1573 @@
+"""
+TrustAI SQLAlchemy Storage Backend - PostgreSQL (or any SQLAlchemy URL) behind the Database API
+"""
+
+import itertools
+import json
+from contextlib import contextmanager
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Any, Optional, Sequence, Tuple
+import logging
+
+from sqlalchemy import (
+    MetaData, Table, Column, Index, ForeignKey, Integer, Float, Text, Boolean, DateTime,
+    bindparam, cast, create_engine, delete, select, insert, update, func, case, extract, false, literal, union
+)
+from sqlalchemy.dialects import postgresql, sqlite
+
+from src.amount_stats import AmountStats, add_amount
+from src.behavior_profile import BehaviorProfile, merchant_changes, profile_activities
+from src.device_fingerprint import index_keys
+from src.geo import bounding_box, within_radius
+from src.location_clusters import update_clusters
+from src.score_factors import ScoreFactorCache, location_trust, score_factors
+from src.snapshot import SNAPSHOT_SECTIONS, UserFeatureSnapshot, hour_of_week, time_patterns_from_histogram
+from src.sqlalchemy_migrations import run_migrations
+from src.trust_decay import fold_trust_scores
+from src.unit_of_work import UnitOfWork
+from src.velocity import empty_velocity, window_starts
+
+logger = logging.getLogger(__name__)
+
+metadata = MetaData()
+
+# Mirrors the SQLite schema in Database.init_db plus the indexes added by
+# src/migrations.py. Timestamps are naive UTC set from Python so every
+# backend agrees regardless of the server's time zone.
+users = Table(
+    'users', metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('username', Text, unique=True, nullable=False),
+    Column('email', Text, unique=True, nullable=False),
+    Column('password_hash', Text, nullable=False),
+    Column('role', Text, default='user'),
+    Column('verified', Boolean, default=False, server_default=false()),
+    Column('created_at', DateTime, default=datetime.utcnow),
+    Column('last_login', DateTime),
+    Column('trust_score', Float, default=70.0),
+    # Time-decayed average of every score (see src/trust_decay.py)
+    Column('decayed_trust_score', Float),
+    Column('trust_score_weight', Float, nullable=False, default=0.0),
+    Column('trust_score_updated_at', DateTime),
+)
+
+activities = Table(
+    'activities', metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('user_id', Integer, ForeignKey('users.id'), nullable=False),
+    Column('action_type', Text, nullable=False),
+    Column('trust_score', Float, nullable=False),
+    Column('risk_level', Text, nullable=False),
+    Column('decision', Text, nullable=False),
+    Column('context', Text),  # JSON
+    Column('ip_address', Text),
+    Column('user_agent', Text),
+    Column('timestamp', DateTime, default=datetime.utcnow),
+    Index('idx_activities_user_timestamp', 'user_id', 'timestamp'),
+    Index('idx_activities_risk_timestamp', 'risk_level', 'timestamp'),
+    Index('idx_activities_timestamp', 'timestamp'),
+)
+
+transactions = Table(
+    'transactions', metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('user_id', Integer, ForeignKey('users.id'), nullable=False),
+    Column('amount', Float, nullable=False),
+    Column('merchant', Text, nullable=False),
+    Column('transaction_type', Text, nullable=False),
+    Column('trust_score', Float, nullable=False),
+    Column('risk_level', Text, nullable=False),
+    Column('status', Text, default='pending'),
+    Column('timestamp', DateTime, default=datetime.utcnow),
+    Index('idx_transactions_user_timestamp', 'user_id', 'timestamp'),
+)
+
+device_fingerprints = Table(
+    'device_fingerprints', metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('user_id', Integer, ForeignKey('users.id'), nullable=False),
+    Column('fingerprint', Text, nullable=False),
+    Column('first_seen', DateTime, default=datetime.utcnow),
+    Column('last_seen', DateTime, default=datetime.utcnow),
+    Column('trust_level', Float, default=50.0),
+    Column('seen_count', Integer, nullable=False, default=1, server_default='1'),
+    Index('idx_device_fingerprints_user_last_seen', 'user_id', 'last_seen'),
+    Index('uq_device_fingerprints_user_fingerprint', 'user_id', 'fingerprint', unique=True),
+)
+
+# Distinguishing components of each known fingerprint (see src/device_fingerprint.py)
+device_fingerprint_components = Table(
+    'device_fingerprint_components', metadata,
+    Column('user_id', Integer, primary_key=True),
+    Column('component', Text, primary_key=True),
+    Column('value', Text, primary_key=True),
+    Column('fingerprint', Text, primary_key=True),
+)
+
+user_locations = Table(
+    'user_locations', metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('user_id', Integer, ForeignKey('users.id'), nullable=False),
+    Column('ip_address', Text, nullable=False),
+    Column('latitude', Float),
+    Column('longitude', Float),
+    Column('city', Text),
+    Column('country', Text),
+    Column('first_seen', DateTime, default=datetime.utcnow),
+    Column('last_seen', DateTime, default=datetime.utcnow),
+    Column('seen_count', Integer, nullable=False, default=1, server_default='1'),
+    Index('idx_user_locations_user_last_seen', 'user_id', 'last_seen'),
+    Index('uq_user_locations_user_ip', 'user_id', 'ip_address', unique=True),
+)
+
+trust_scores = Table(
+    'trust_scores', metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('user_id', Integer, ForeignKey('users.id'), nullable=False),
+    Column('score', Float, nullable=False),
+    Column('factors', Text),  # JSON
+    Column('timestamp', DateTime, default=datetime.utcnow),
+    Index('idx_trust_scores_user_timestamp', 'user_id', 'timestamp'),
+)
+
+incidents = Table(
+    'incidents', metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('user_id', Integer, ForeignKey('users.id'), nullable=False),
+    Column('incident_type', Text, nullable=False),
+    Column('severity', Text, nullable=False),
+    Column('description', Text),
+    Column('resolved', Boolean, default=False, server_default=false()),
+    Column('timestamp', DateTime, default=datetime.utcnow),
+    Index('idx_incidents_user_timestamp', 'user_id', 'timestamp'),
+)
+
+# Activity counts per user and hour of the week (0 = Sunday 00:00), kept up
+# to date as activities are logged
+user_activity_hours = Table(
+    'user_activity_hours', metadata,
+    Column('user_id', Integer, primary_key=True),
+    Column('hour_of_week', Integer, primary_key=True),
+    Column('activity_count', Integer, nullable=False, default=0),
+)
+
+# A handful of location clusters per user, updated as locations are stored
+user_location_clusters = Table(
+    'user_location_clusters', metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('user_id', Integer, ForeignKey('users.id'), nullable=False),
+    Column('latitude', Float, nullable=False),
+    Column('longitude', Float, nullable=False),
+    Column('radius_km', Float, nullable=False, default=0.0),
+    Column('weight', Integer, nullable=False, default=1),
+    Column('last_seen', DateTime, nullable=False),
+    Index('idx_user_location_clusters_user_last_seen', 'user_id', 'last_seen'),
+)
+
+# Per-user behavior profile (see src/behavior_profile.py): one summary row
+# plus the action type and merchant counts, updated as activities are logged
+user_behavior_profiles = Table(
+    'user_behavior_profiles', metadata,
+    Column('user_id', Integer, ForeignKey('users.id'), primary_key=True),
+    Column('activity_count', Integer, nullable=False, default=0),
+    Column('amount_count', Integer, nullable=False, default=0),
+    Column('amount_mean', Float, nullable=False, default=0.0),
+    Column('amount_max', Float, nullable=False, default=0.0),
+)
+
+user_behavior_counts = Table(
+    'user_behavior_counts', metadata,
+    Column('user_id', Integer, primary_key=True),
+    Column('feature', Text, primary_key=True),
+    Column('value', Text, primary_key=True),
+    Column('seen_count', Integer, nullable=False),
+)
+
+# Running transaction amount statistics (see src/amount_stats.py)
+user_amount_stats = Table(
+    'user_amount_stats', metadata,
+    Column('user_id', Integer, ForeignKey('users.id'), primary_key=True),
+    Column('amount_count', Integer, nullable=False, default=0),
+    Column('amount_mean', Float, nullable=False, default=0.0),
+    Column('amount_m2', Float, nullable=False, default=0.0),
+)
+
+user_amount_buckets = Table(
+    'user_amount_buckets', metadata,
+    Column('user_id', Integer, primary_key=True),
+    Column('bucket', Integer, primary_key=True),
+    Column('amount_count', Integer, nullable=False),
+)
+
+
+def _format_value(value: Any) -> Any:
+    # Match the 'YYYY-MM-DD HH:MM:SS' strings SQLite hands back
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    return value
+
+
+def _as_datetime(value: Any) -> datetime:
+    # Bulk rows keep the time the event happened; everything else is now
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return value or datetime.utcnow()
+
+
+def _dialect_insert(conn):
+    # insert() with on_conflict_do_update, for the dialects that have it
+    return {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}.get(conn.dialect.name)
+
+
+def _row_dict(row) -> Dict[str, Any]:
+    return {key: _format_value(value) for key, value in row._mapping.items()}
+
+
+class SQLAlchemyDatabase:
+    """
+    Database operations for TrustAI on a pooled SQLAlchemy engine.
+
+    Exposes the same methods as the SQLite Database class so TrustEngine,
+    AuthManager and the routes work unchanged against PostgreSQL.
+    """
+
+    # Stay well below driver bound-parameter limits for IN (...) lists
+    BATCH_CHUNK_SIZE = 500
+
+    # Write methods apply_writes can group into one transaction
+    GROUPED_WRITES = {
+        'log_activity': '_insert_activity',
+        'log_transaction': '_insert_transaction',
+        'store_trust_score': '_insert_trust_score',
+        'store_device_fingerprint': '_upsert_device_fingerprint',
+        'store_user_location': '_upsert_user_location',
+        'apply_writes': '_apply_grouped_writes'
+    }
+
+    # Grouped writes that have a multi-row (executemany) helper
+    BULK_WRITES = {
+        'log_activity': '_insert_activities',
+        'log_transaction': '_insert_transactions',
+        'store_trust_score': '_insert_trust_scores'
+    }
+
+    # Rows per executemany when streaming bulk inserts
+    BULK_CHUNK_SIZE = 1000
+
+    def __init__(self, database_url: str, pool_size: int = 5, pool_timeout: float = 30.0,
+                 score_factors_cache: ScoreFactorCache = None):
+        self.database_url = database_url
+        engine_options = {'pool_pre_ping': True}
+        if not database_url.startswith('sqlite'):
+            engine_options.update({
+                'pool_size': pool_size,
+                'max_overflow': 0,
+                'pool_timeout': pool_timeout
+            })
+        self.engine = create_engine(database_url, **engine_options)
+        # get_score_factors summaries, dropped when the user logs an activity
+        self.score_factors_cache = score_factors_cache or ScoreFactorCache()
+        self.init_db()
+
+    def init_db(self):
+        """Create or upgrade the schema through the versioned migrations"""
+        try:
+            # A failure stops startup rather than serving on a partial schema
+            applied = run_migrations(self.engine, metadata)
+            if applied:
+                logger.info(f"Applied schema migrations: {applied}")
+            logger.info("Database initialized successfully")
+        except Exception as e:
+            logger.error(f"Database initialization error: {str(e)}")
+            raise
+
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """Get connection pool usage statistics"""
+        pool = self.engine.pool
+        stats = {'status': pool.status()}
+        for name in ('size', 'checkedin', 'checkedout', 'overflow'):
+            if hasattr(pool, name):
+                stats[name] = getattr(pool, name)()
+        return stats
+
+    def close(self):
+        """Close all pooled connections"""
+        self.engine.dispose()
+
+    @contextmanager
+    def _begin(self):
+        """
+        engine.begin() that drops the cached score factors of the users it
+        wrote once it has committed (write helpers call invalidate as they go)
+        """
+        with self.score_factors_cache.deferred() as written:
+            with self.engine.begin() as conn:
+                yield conn
+        self.score_factors_cache.invalidate(written)
+
+    def apply_writes(self, writes: List[Tuple[str, tuple]]):
+        """Apply (method name, args) writes in one transaction with a single commit"""
+        with self._begin() as conn:
+            self._apply_grouped_writes(conn, writes)
+
+    def _apply_grouped_writes(self, conn, writes: List[Tuple[str, tuple]]):
+        # Consecutive writes of the same kind go through one executemany
+        for method, group in itertools.groupby(writes, key=lambda write: write[0]):
+            if method in self.BULK_WRITES:
+                getattr(self, self.BULK_WRITES[method])(conn, (args for _, args in group))
+            else:
+                for _, args in group:
+                    getattr(self, self.GROUPED_WRITES[method])(conn, *args)
+
+    def unit_of_work(self) -> UnitOfWork:
+        """Collect the writes for one decision and commit them in one transaction"""
+        return UnitOfWork(self)
+
+    # User operations
+    def create_user(self, username: str, email: str, password_hash: str, role: str = 'user') -> int:
+        """Create a new user"""
+        try:
+            with self._begin() as conn:
+                result = conn.execute(insert(users).values(
+                    username=username, email=email, password_hash=password_hash, role=role
+                ))
+                # A lookup of the id before it existed may have cached defaults
+                self.score_factors_cache.invalidate(result.inserted_primary_key)
+                return result.inserted_primary_key[0]
+        except Exception as e:
+            logger.error(f"User creation error: {str(e)}")
+            return None
+
+    def get_user(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Get user by ID"""
+        with self.engine.connect() as conn:
+            return self._fetch_user(conn, user_id)
+
+    def _fetch_user(self, conn, user_id: int) -> Optional[Dict[str, Any]]:
+        row = conn.execute(select(users).where(users.c.id == user_id)).first()
+        return _row_dict(row) if row else None
+
+    def get_user_by_username(self, username: str) -> Optional[Dict[str, Any]]:
+        """Get user by username"""
+        with self.engine.connect() as conn:
+            row = conn.execute(select(users).where(users.c.username == username)).first()
+            return _row_dict(row) if row else None
+
+    def get_user_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+        """Get user by email"""
+        with self.engine.connect() as conn:
+            row = conn.execute(select(users).where(users.c.email == email)).first()
+            return _row_dict(row) if row else None
+
+    def update_last_login(self, user_id: int):
+        """Update user's last login timestamp"""
+        with self.engine.begin() as conn:
+            conn.execute(update(users).where(users.c.id == user_id).values(last_login=datetime.utcnow()))
+
+    def update_user_password(self, user_id: int, password_hash: str):
+        """Replace a user's password hash"""
+        with self.engine.begin() as conn:
+            conn.execute(update(users).where(users.c.id == user_id).values(password_hash=password_hash))
+
+    def set_user_verified(self, user_id: int):
+        """Mark a user's email as verified"""
+        with self._begin() as conn:
+            conn.execute(update(users).where(users.c.id == user_id).values(verified=True))
+            self.score_factors_cache.invalidate([user_id])
+
+    # Activity logging
+    def log_activity(self, user_id: int, action_type: str, trust_result: Dict[str, Any], context: Dict[str, Any]):
+        """Log user activity"""
+        try:
+            with self._begin() as conn:
+                self._insert_activity(conn, user_id, action_type, trust_result, context)
+        except Exception as e:
+            logger.error(f"Activity logging error: {str(e)}")
+
+    def log_activities_bulk(self, records: Iterable[Tuple[int, str, Dict[str, Any], Dict[str, Any]]]) -> int:
+        """Log many (user_id, action_type, trust_result, context) activities in one transaction"""
+        with self._begin() as conn:
+            return self._insert_activities(conn, records)
+
+    def _insert_activity(self, conn, user_id: int, action_type: str, trust_result: Dict[str, Any], context: Dict[str, Any]):
+        self._insert_activities(conn, [(user_id, action_type, trust_result, context)])
+
+    def _insert_activities(self, conn, records: Iterable[Tuple[int, str, Dict[str, Any], Dict[str, Any]]]) -> int:
+        hours = Counter()
+        profiles = {}
+        rows = (
+            {
+                'user_id': user_id,
+                'action_type': action_type,
+                'trust_score': trust_result['score'],
+                'risk_level': trust_result['risk_level'],
+                'decision': trust_result['decision'],
+                'context': json.dumps(context, default=str),
+                'ip_address': context.get('ip_address'),
+                'user_agent': context.get('user_agent'),
+                'timestamp': _as_datetime(context.get('timestamp'))
+            }
+            for user_id, action_type, trust_result, context in profile_activities(records, profiles)
+        )
+        count = self._insert_many(conn, insert(activities), self._count_hours(rows, hours))
+        self._increment_activity_hours(conn, hours)
+        self._save_behavior_profiles(conn, profiles)
+        self.score_factors_cache.invalidate(profiles)
+        return count
+
+    def _count_hours(self, rows: Iterable[Dict[str, Any]], hours: Counter):
+        for row in rows:
+            hours[row['user_id'], hour_of_week(row['timestamp'])] += 1
+            yield row
+
+    def _increment_activity_hours(self, conn, hours: Counter):
+        if not hours:
+            return
+        rows = [
+            {'user_id': user_id, 'hour_of_week': bucket, 'activity_count': count}
+            for (user_id, bucket), count in hours.items()
+        ]
+        dialect_insert = _dialect_insert(conn)
+        if dialect_insert:
+            statement = dialect_insert(user_activity_hours)
+            conn.execute(statement.on_conflict_do_update(
+                index_elements=['user_id', 'hour_of_week'],
+                set_={'activity_count': user_activity_hours.c.activity_count + statement.excluded.activity_count}
+            ), rows)
+            return
+
+        # Other dialects: update first, insert the buckets nothing matched
+        for row in rows:
+            result = conn.execute(
+                update(user_activity_hours)
+                .where(
+                    user_activity_hours.c.user_id == row['user_id'],
+                    user_activity_hours.c.hour_of_week == row['hour_of_week']
+                )
+                .values(activity_count=user_activity_hours.c.activity_count + row['activity_count'])
+            )
+            if result.rowcount == 0:
+                conn.execute(insert(user_activity_hours).values(**row))
+
+    def rebuild_activity_hours(self) -> int:
+        """Recompute the per-user activity hour histogram from activities"""
+        bucket = cast(
+            extract('dow', activities.c.timestamp) * 24 + extract('hour', activities.c.timestamp), Integer
+        )
+        with self.engine.begin() as conn:
+            conn.execute(delete(user_activity_hours))
+            result = conn.execute(
+                insert(user_activity_hours).from_select(
+                    ['user_id', 'hour_of_week', 'activity_count'],
+                    select(activities.c.user_id, bucket, func.count())
+                    .group_by(activities.c.user_id, bucket)
+                )
+            )
+            return result.rowcount
+
+    def _load_behavior_profiles(self, conn, user_ids: List[int]) -> Dict[int, BehaviorProfile]:
+        profiles = {user_id: BehaviorProfile() for user_id in user_ids}
+        for row in conn.execute(select(user_behavior_profiles).where(user_behavior_profiles.c.user_id.in_(user_ids))):
+            profile = profiles[row.user_id]
+            profile.activity_count = row.activity_count
+            profile.amount_count = row.amount_count
+            profile.amount_mean = row.amount_mean
+            profile.amount_max = row.amount_max
+        for row in conn.execute(select(user_behavior_counts).where(user_behavior_counts.c.user_id.in_(user_ids))):
+            profile = profiles[row.user_id]
+            counts = profile.action_counts if row.feature == 'action' else profile.merchant_counts
+            counts[row.value] = row.seen_count
+        return profiles
+
+    def _save_behavior_profiles(self, conn, deltas: Dict[int, BehaviorProfile]):
+        # Deltas are merged into the stored rows (see PROFILE_UPSERT_SQL in
+        # src/behavior_profile.py); the summary row goes first so its row
+        # lock serializes writers of the same user
+        if not deltas:
+            return
+        self._merge_profile_summaries(conn, deltas)
+        self._merge_behavior_counts(conn, [
+            {'user_id': user_id, 'feature': 'action', 'value': action, 'seen_count': count}
+            for user_id, delta in deltas.items()
+            for action, count in delta.action_counts.items()
+        ], increment=True)
+
+        # Merchant slots can evict each other: work out their new counts from
+        # the stored slots (at most MERCHANT_SLOTS rows per user)
+        merchant_deltas = {user_id: delta.merchant_counts for user_id, delta in deltas.items() if delta.merchant_counts}
+        stored = {user_id: {} for user_id in merchant_deltas}
+        user_ids = list(merchant_deltas)
+        for start in range(0, len(user_ids), self.BATCH_CHUNK_SIZE):
+            for row in conn.execute(
+                select(user_behavior_counts)
+                .where(user_behavior_counts.c.feature == 'merchant',
+                       user_behavior_counts.c.user_id.in_(user_ids[start:start + self.BATCH_CHUNK_SIZE]))
+            ):
+                stored[row.user_id][row.value] = row.seen_count
+        changed_rows = []
+        for user_id, merchant_counts in merchant_deltas.items():
+            changed, evicted = merchant_changes(stored[user_id], merchant_counts)
+            if evicted:
+                conn.execute(delete(user_behavior_counts).where(
+                    user_behavior_counts.c.user_id == user_id,
+                    user_behavior_counts.c.feature == 'merchant',
+                    user_behavior_counts.c.value.in_(evicted)
+                ))
+            changed_rows.extend(
+                {'user_id': user_id, 'feature': 'merchant', 'value': merchant, 'seen_count': count}
+                for merchant, count in changed.items()
+            )
+        self._merge_behavior_counts(conn, changed_rows, increment=False)
+
+    def _merge_profile_summaries(self, conn, deltas: Dict[int, BehaviorProfile]):
+        rows = [
+            {
+                'user_id': user_id,
+                'activity_count': delta.activity_count,
+                'amount_count': delta.amount_count,
+                'amount_mean': delta.amount_mean,
+                'amount_max': delta.amount_max
+            }
+            for user_id, delta in deltas.items()
+        ]
+        c = user_behavior_profiles.c
+        dialect_insert = _dialect_insert(conn)
+        if dialect_insert:
+            statement = dialect_insert(user_behavior_profiles)
+            new = statement.excluded
+            conn.execute(statement.on_conflict_do_update(
+                index_elements=['user_id'],
+                set_={
+                    'activity_count': c.activity_count + new.activity_count,
+                    'amount_count': c.amount_count + new.amount_count,
+                    'amount_mean': case(
+                        (new.amount_count == 0, c.amount_mean),
+                        else_=c.amount_mean + (new.amount_mean - c.amount_mean)
+                              * new.amount_count / (c.amount_count + new.amount_count)
+                    ),
+                    'amount_max': case(
+                        (new.amount_count == 0, c.amount_max),
+                        (c.amount_count == 0, new.amount_max),
+                        (new.amount_max > c.amount_max, new.amount_max),
+                        else_=c.amount_max
+                    )
+                }
+            ), rows)
+            return
+
+        # Other dialects: merge in Python under a row lock, insert the
+        # summaries nothing matched
+        user_ids = list(deltas)
+        profiles = {}
+        for start in range(0, len(user_ids), self.BATCH_CHUNK_SIZE):
+            for row in conn.execute(
+                select(user_behavior_profiles)
+                .where(c.user_id.in_(user_ids[start:start + self.BATCH_CHUNK_SIZE]))
+                .with_for_update()
+            ):
+                profiles[row.user_id] = BehaviorProfile(row.activity_count, amount_count=row.amount_count,
+                                                        amount_mean=row.amount_mean, amount_max=row.amount_max)
+        for row in rows:
+            profile = profiles.get(row['user_id'])
+            if profile is None:
+                conn.execute(insert(user_behavior_profiles).values(**row))
+                continue
+            profile.merge(BehaviorProfile(row['activity_count'], amount_count=row['amount_count'],
+                                          amount_mean=row['amount_mean'], amount_max=row['amount_max']))
+            conn.execute(update(user_behavior_profiles).where(c.user_id == row['user_id']).values(
+                activity_count=profile.activity_count,
+                amount_count=profile.amount_count,
+                amount_mean=profile.amount_mean,
+                amount_max=profile.amount_max
+            ))
+
+    def _merge_behavior_counts(self, conn, rows: List[Dict[str, Any]], increment: bool):
+        # Add seen_count to the stored count, or replace it
+        if not rows:
+            return
+        c = user_behavior_counts.c
+        dialect_insert = _dialect_insert(conn)
+        if dialect_insert:
+            statement = dialect_insert(user_behavior_counts)
+            seen_count = c.seen_count + statement.excluded.seen_count if increment else statement.excluded.seen_count
+            conn.execute(statement.on_conflict_do_update(
+                index_elements=['user_id', 'feature', 'value'],
+                set_={'seen_count': seen_count}
+            ), rows)
+            return
+
+        # Other dialects: update first, insert the counts nothing matched
+        for row in rows:
+            result = conn.execute(
+                update(user_behavior_counts)
+                .where(c.user_id == row['user_id'], c.feature == row['feature'], c.value == row['value'])
+                .values(seen_count=c.seen_count + row['seen_count'] if increment else row['seen_count'])
+            )
+            if result.rowcount == 0:
+                conn.execute(insert(user_behavior_counts).values(**row))
+
+    def _insert_behavior_profiles(self, conn, profiles: Dict[int, BehaviorProfile]):
+        if not profiles:
+            return
+
+        conn.execute(insert(user_behavior_profiles), [
+            {
+                'user_id': user_id,
+                'activity_count': profile.activity_count,
+                'amount_count': profile.amount_count,
+                'amount_mean': profile.amount_mean,
+                'amount_max': profile.amount_max
+            }
+            for user_id, profile in profiles.items()
+        ])
+        counts = [
+            {'user_id': user_id, 'feature': feature, 'value': value, 'seen_count': count}
+            for user_id, profile in profiles.items()
+            for feature, values in (('action', profile.action_counts), ('merchant', profile.merchant_counts))
+            for value, count in values.items()
+        ]
+        if counts:
+            conn.execute(insert(user_behavior_counts), counts)
+
+    def get_user_behavior_profile(self, user_id: int) -> BehaviorProfile:
+        """Get user's behavior profile"""
+        with self.engine.connect() as conn:
+            return self._load_behavior_profiles(conn, [user_id])[user_id]
+
+    def rebuild_behavior_profiles(self) -> int:
+        """Recompute the per-user behavior profiles from activities"""
+        with self.engine.begin() as conn:
+            profiles = {}
+            rows = conn.execute(
+                select(activities.c.user_id, activities.c.action_type, activities.c.context)
+                .order_by(activities.c.user_id, activities.c.timestamp)
+            )
+            for row in rows:
+                profile = profiles.get(row.user_id)
+                if profile is None:
+                    profile = profiles[row.user_id] = BehaviorProfile()
+                profile.add(row.action_type, json.loads(row.context) if row.context else {})
+
+            conn.execute(delete(user_behavior_counts))
+            conn.execute(delete(user_behavior_profiles))
+            self._insert_behavior_profiles(conn, profiles)
+            return len(profiles)
+
+    def get_user_activities(self, user_id: int, limit: int = 10) -> List[Dict[str, Any]]:
+        """Get recent user activities"""
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                select(activities)
+                .where(activities.c.user_id == user_id)
+                .order_by(activities.c.timestamp.desc())
+                .limit(limit)
+            )
+            result = []
+            for row in rows:
+                activity = _row_dict(row)
+                if activity['context']:
+                    activity['context'] = json.loads(activity['context'])
+                result.append(activity)
+            return result
+
+    # Transaction operations
+    def log_transaction(self, user_id: int, amount: float, merchant: str,
+                        transaction_type: str, trust_score: float, risk_level: str,
+                        timestamp: datetime = None) -> int:
+        """Log a transaction"""
+        try:
+            with self._begin() as conn:
+                return self._insert_transaction(
+                    conn, user_id, amount, merchant, transaction_type, trust_score, risk_level, timestamp
+                )
+        except Exception as e:
+            logger.error(f"Transaction logging error: {str(e)}")
+            return None
+
+    def log_transactions_bulk(self, records: Iterable[tuple]) -> int:
+        """Log many log_transaction argument tuples (optionally ending in a timestamp) in one transaction"""
+        with self._begin() as conn:
+            return self._insert_transactions(conn, records)
+
+    def _insert_transaction(self, conn, user_id: int, amount: float, merchant: str,
+                            transaction_type: str, trust_score: float, risk_level: str,
+                            timestamp: datetime = None) -> int:
+        result = conn.execute(insert(transactions).values(
+            user_id=user_id, amount=amount, merchant=merchant,
+            transaction_type=transaction_type, trust_score=trust_score, risk_level=risk_level,
+            timestamp=_as_datetime(timestamp)
+        ))
+        amounts = {}
+        add_amount(amounts, user_id, amount)
+        self._merge_amount_stats(conn, amounts)
+        self.score_factors_cache.invalidate([user_id])
+        return result.inserted_primary_key[0]
+
+    def _insert_transactions(self, conn, records: Iterable[tuple]) -> int:
+        # records rather than transactions: that name is the table
+        rows = (
+            {
+                'user_id': record[0],
+                'amount': record[1],
+                'merchant': record[2],
+                'transaction_type': record[3],
+                'trust_score': record[4],
+                'risk_level': record[5],
+                'timestamp': _as_datetime(record[6] if len(record) > 6 else None)
+            }
+            for record in records
+        )
+        amounts = {}
+        count = self._insert_many(conn, insert(transactions), self._count_amounts(rows, amounts))
+        self._merge_amount_stats(conn, amounts)
+        self.score_factors_cache.invalidate(amounts)
+        return count
+
+    def _count_amounts(self, rows: Iterable[Dict[str, Any]], amounts: Dict[int, AmountStats]):
+        for row in rows:
+            add_amount(amounts, row['user_id'], row['amount'])
+            yield row
+
+    def _merge_amount_stats(self, conn, amounts: Dict[int, AmountStats]):
+        # Welford summaries merge exactly, so each user's delta is folded
+        # into the stored row by the UPDATE itself
+        stats_rows = [
+            {'user_id': user_id, 'amount_count': stats.count, 'amount_mean': stats.mean, 'amount_m2': stats.m2}
+            for user_id, stats in amounts.items() if stats.count
+        ]
+        bucket_rows = [
+            {'user_id': user_id, 'bucket': bucket, 'amount_count': count}
+            for user_id, stats in amounts.items()
+            for bucket, count in stats.buckets.items()
+        ]
+        if not stats_rows:
+            return
+
+        c = user_amount_stats.c
+        dialect_insert = _dialect_insert(conn)
+        if dialect_insert:
+            statement = dialect_insert(user_amount_stats)
+            new = statement.excluded
+            total = c.amount_count + new.amount_count
+            conn.execute(statement.on_conflict_do_update(
+                index_elements=['user_id'],
+                set_={
+                    'amount_count': total,
+                    'amount_mean': c.amount_mean + (new.amount_mean - c.amount_mean) * new.amount_count / total,
+                    'amount_m2': c.amount_m2 + new.amount_m2 + (new.amount_mean - c.amount_mean)
+                                 * (new.amount_mean - c.amount_mean) * c.amount_count * new.amount_count / total
+                }
+            ), stats_rows)
+            statement = dialect_insert(user_amount_buckets)
+            conn.execute(statement.on_conflict_do_update(
+                index_elements=['user_id', 'bucket'],
+                set_={'amount_count': user_amount_buckets.c.amount_count + statement.excluded.amount_count}
+            ), bucket_rows)
+            return
+
+        # Other dialects: merge in Python under a row lock, update the
+        # buckets first and insert the ones nothing matched
+        stored = self._fetch_amount_stats(conn, list(amounts), lock=True)
+        for row in stats_rows:
+            merged = stored[row['user_id']]
+            existed = merged.count > 0
+            merged.merge(AmountStats(row['amount_count'], row['amount_mean'], row['amount_m2']))
+            values = {'amount_count': merged.count, 'amount_mean': merged.mean, 'amount_m2': merged.m2}
+            if existed:
+                conn.execute(update(user_amount_stats).where(c.user_id == row['user_id']).values(**values))
+            else:
+                conn.execute(insert(user_amount_stats).values(user_id=row['user_id'], **values))
+        for row in bucket_rows:
+            result = conn.execute(
+                update(user_amount_buckets)
+                .where(user_amount_buckets.c.user_id == row['user_id'], user_amount_buckets.c.bucket == row['bucket'])
+                .values(amount_count=user_amount_buckets.c.amount_count + row['amount_count'])
+            )
+            if result.rowcount == 0:
+                conn.execute(insert(user_amount_buckets).values(**row))
+
+    def _fetch_amount_stats(self, conn, user_ids: List[int], lock: bool = False) -> Dict[int, AmountStats]:
+        stats = {user_id: AmountStats() for user_id in user_ids}
+        query = select(user_amount_stats).where(user_amount_stats.c.user_id.in_(user_ids))
+        if lock:
+            query = query.with_for_update()
+        for row in conn.execute(query):
+            stats[row.user_id] = AmountStats(row.amount_count, row.amount_mean, row.amount_m2)
+        for row in conn.execute(select(user_amount_buckets).where(user_amount_buckets.c.user_id.in_(user_ids))):
+            stats[row.user_id].buckets[row.bucket] = row.amount_count
+        return stats
+
+    def get_user_amount_stats(self, user_id: int) -> AmountStats:
+        """Get user's running transaction amount statistics"""
+        with self.engine.connect() as conn:
+            return self._fetch_amount_stats(conn, [user_id])[user_id]
+
+    def rebuild_amount_stats(self) -> int:
+        """Recompute the per-user amount statistics in one streaming pass over transactions"""
+        with self.engine.begin() as conn:
+            conn.execute(delete(user_amount_stats))
+            conn.execute(delete(user_amount_buckets))
+            rows = conn.execute(
+                select(transactions.c.user_id, transactions.c.amount)
+                .order_by(transactions.c.user_id)
+                .execution_options(yield_per=self.BULK_CHUNK_SIZE)
+            )
+            users = 0
+            for user_id, user_rows in itertools.groupby(rows, key=lambda row: row.user_id):
+                stats = AmountStats()
+                for row in user_rows:
+                    stats.add(row.amount or 0.0)
+                conn.execute(insert(user_amount_stats).values(
+                    user_id=user_id, amount_count=stats.count, amount_mean=stats.mean, amount_m2=stats.m2
+                ))
+                conn.execute(insert(user_amount_buckets), [
+                    {'user_id': user_id, 'bucket': bucket, 'amount_count': count}
+                    for bucket, count in stats.buckets.items()
+                ])
+                users += 1
+            return users
+
+    def _fetch_velocity(self, conn, user_ids: List[int]) -> Dict[int, Dict[int, Dict[str, float]]]:
+        # One aggregate over the last day of transactions, which the
+        # (user_id, timestamp) index bounds however long the history is;
+        # every process sees the same numbers
+        starts = window_starts()
+        columns = []
+        for start in starts.values():
+            recent = transactions.c.timestamp >= start
+            columns.append(func.sum(case((recent, 1), else_=0)))
+            columns.append(func.sum(case((recent, transactions.c.amount), else_=0)))
+        rows = conn.execute(
+            select(transactions.c.user_id, *columns)
+            .where(transactions.c.user_id.in_(user_ids), transactions.c.timestamp >= min(starts.values()))
+            .group_by(transactions.c.user_id)
+        )
+
+        velocities = {user_id: empty_velocity() for user_id in user_ids}
+        for user_id, *totals in rows:
+            for i, window in enumerate(starts):
+                velocities[user_id][window] = {'count': int(totals[2 * i]), 'amount': round(float(totals[2 * i + 1]), 2)}
+        return velocities
+
+    def rebuild_velocity(self) -> int:
+        """Velocity is aggregated from transactions on read; nothing to rebuild"""
+        return 0
+
+    def get_user_transactions(self, user_id: int, since: datetime = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """Get user transactions"""
+        with self.engine.connect() as conn:
+            return self._fetch_transactions(conn, user_id, since, limit)
+
+    def _fetch_transactions(self, conn, user_id: int, since: datetime = None, limit: int = 100) -> List[Dict[str, Any]]:
+        query = select(transactions).where(transactions.c.user_id == user_id)
+        if since:
+            query = query.where(transactions.c.timestamp >= since)
+        query = query.order_by(transactions.c.timestamp.desc()).limit(limit)
+        return [_row_dict(row) for row in conn.execute(query)]
+
+    # Device fingerprint operations
+    def store_device_fingerprint(self, user_id: int, fingerprint: str):
+        """Store or update device fingerprint"""
+        try:
+            with self._begin() as conn:
+                self._upsert_device_fingerprint(conn, user_id, fingerprint)
+        except Exception as e:
+            logger.error(f"Device fingerprint storage error: {str(e)}")
+
+    def _upsert_device_fingerprint(self, conn, user_id: int, fingerprint: str):
+        self._upsert(
+            conn, device_fingerprints, ('user_id', 'fingerprint'),
+            {'user_id': user_id, 'fingerprint': fingerprint},
+            {}
+        )
+        self._index_device_components(conn, [
+            {'user_id': user_id, 'component': name, 'value': value, 'fingerprint': fingerprint}
+            for name, value in index_keys(fingerprint)
+        ])
+        self.score_factors_cache.invalidate([user_id])
+
+    def _index_device_components(self, conn, rows: List[Dict[str, Any]]):
+        if not rows:
+            return
+        dialect_insert = _dialect_insert(conn)
+        if dialect_insert:
+            conn.execute(dialect_insert(device_fingerprint_components).on_conflict_do_nothing(), rows)
+            return
+
+        # Other dialects: insert the rows not indexed yet
+        for row in rows:
+            exists = conn.execute(
+                select(device_fingerprint_components.c.user_id)
+                .where(*(device_fingerprint_components.c[name] == value for name, value in row.items()))
+            ).first()
+            if exists is None:
+                conn.execute(insert(device_fingerprint_components).values(**row))
+
+    def _upsert(self, conn, table: Table, key: Tuple[str, ...], values: Dict[str, Any], refresh: Dict[str, Any]):
+        """
+        Insert a (user_id, key) row or, if it exists, bump last_seen and
+        seen_count and copy over the non-null refresh values, in a single
+        INSERT ... ON CONFLICT DO UPDATE statement on PostgreSQL and SQLite.
+        """
+        now = datetime.utcnow()
+        dialect_insert = _dialect_insert(conn)
+        if dialect_insert:
+            statement = dialect_insert(table)
+            updates = {
+                name: func.coalesce(getattr(statement.excluded, name), table.c[name])
+                for name in refresh
+            }
+            updates.update(last_seen=now, seen_count=table.c.seen_count + 1)
+            conn.execute(
+                statement.values(**values, **refresh, first_seen=now, last_seen=now, seen_count=1)
+                .on_conflict_do_update(index_elements=list(key), set_=updates)
+            )
+            return
+
+        # Other dialects: update first, insert when nothing matched
+        match = [table.c[name] == values[name] for name in key]
+        updates = {name: value for name, value in refresh.items() if value is not None}
+        result = conn.execute(
+            update(table).where(*match).values(**updates, last_seen=now, seen_count=table.c.seen_count + 1)
+        )
+        if result.rowcount == 0:
+            conn.execute(insert(table).values(**values, **refresh))
+
+    def get_user_devices(self, user_id: int, days: int = 30) -> List[Dict[str, Any]]:
+        """Get user's recent devices"""
+        with self.engine.connect() as conn:
+            return self._fetch_devices(conn, user_id, days)
+
+    def _fetch_devices(self, conn, user_id: int, days: int = 30) -> List[Dict[str, Any]]:
+        since = datetime.utcnow() - timedelta(days=days)
+        rows = conn.execute(
+            select(device_fingerprints)
+            .where(device_fingerprints.c.user_id == user_id, device_fingerprints.c.last_seen >= since)
+            .order_by(device_fingerprints.c.last_seen.desc())
+        )
+        return [_row_dict(row) for row in rows]
+
+    def _fetch_device_count(self, conn, user_id: int, days: int = 30) -> int:
+        since = datetime.utcnow() - timedelta(days=days)
+        return conn.execute(
+            select(func.count()).select_from(device_fingerprints)
+            .where(device_fingerprints.c.user_id == user_id, device_fingerprints.c.last_seen >= since)
+        ).scalar()
+
+    def find_similar_devices(self, user_id: int, fingerprint: str, days: int = 30) -> List[str]:
+        """
+        Fingerprints of the user's devices seen in the last `days` that are
+        this one or share an indexed component with it (the only ones that
+        can be similar to it), looked up through the device component index
+        """
+        return self.find_similar_devices_bulk([(user_id, fingerprint)], days)[0]
+
+    def find_similar_devices_bulk(self, probes: List[Tuple[int, str]], days: int = 30) -> List[List[str]]:
+        """find_similar_devices for many (user_id, fingerprint) pairs in a single read transaction"""
+        with self.engine.connect() as conn, self._read_transaction(conn):
+            return [self._fetch_similar_devices(conn, user_id, fingerprint, days) for user_id, fingerprint in probes]
+
+    def _fetch_similar_devices(self, conn, user_id: int, fingerprint: str, days: int) -> List[str]:
+        since = datetime.utcnow() - timedelta(days=days)
+        components = device_fingerprint_components.c
+        candidates = union(
+            select(literal(fingerprint, Text)),
+            *(
+                select(components.fingerprint)
+                .where(components.user_id == user_id, components.component == name, components.value == value)
+                for name, value in index_keys(fingerprint)
+            )
+        )
+        rows = conn.execute(
+            select(device_fingerprints.c.fingerprint)
+            .where(
+                device_fingerprints.c.user_id == user_id,
+                device_fingerprints.c.fingerprint.in_(candidates),
+                device_fingerprints.c.last_seen >= since
+            )
+        )
+        return [row.fingerprint for row in rows]
+
+    def rebuild_device_index(self) -> int:
+        """Recompute the device component index from device_fingerprints"""
+        with self.engine.begin() as conn:
+            conn.execute(delete(device_fingerprint_components))
+            rows = [
+                {'user_id': row.user_id, 'component': name, 'value': value, 'fingerprint': row.fingerprint}
+                for row in conn.execute(select(device_fingerprints.c.user_id, device_fingerprints.c.fingerprint))
+                for name, value in index_keys(row.fingerprint)
+            ]
+            if rows:
+                conn.execute(insert(device_fingerprint_components), rows)
+            return len(rows)
+
+    # Trust score operations
+    def store_trust_score(self, user_id: int, result: Dict[str, Any]):
+        """Store trust score result"""
+        try:
+            with self._begin() as conn:
+                self._insert_trust_score(conn, user_id, result)
+        except Exception as e:
+            logger.error(f"Trust score storage error: {str(e)}")
+
+    def store_trust_scores_bulk(self, scores: Iterable[Tuple[int, Dict[str, Any]]]) -> int:
+        """Store many (user_id, result) trust scores in one transaction"""
+        with self._begin() as conn:
+            return self._insert_trust_scores(conn, scores)
+
+    def _insert_trust_score(self, conn, user_id: int, result: Dict[str, Any]):
+        self._insert_trust_scores(conn, [(user_id, result)])
+
+    def _insert_trust_scores(self, conn, scores: Iterable[Tuple[int, Dict[str, Any]]]) -> int:
+        # user_id -> [latest score, sum of scores, number of scores]
+        totals = {}
+
+        def rows():
+            for user_id, result in scores:
+                user_totals = totals.setdefault(user_id, [0.0, 0.0, 0])
+                user_totals[0] = result['score']
+                user_totals[1] += result['score']
+                user_totals[2] += 1
+                yield {
+                    'user_id': user_id,
+                    'score': result['score'],
+                    'factors': json.dumps(result.get('risk_factors', {})),
+                    'timestamp': datetime.utcnow()
+                }
+
+        count = self._insert_many(conn, insert(trust_scores), rows())
+
+        # Update users' current and decayed trust scores, once per user,
+        # under row locks so concurrent writers fold in turn
+        now = datetime.utcnow()
+        user_ids = list(totals)
+        updates = []
+        for start in range(0, len(user_ids), self.BATCH_CHUNK_SIZE):
+            for row in conn.execute(
+                select(users.c.id, users.c.decayed_trust_score, users.c.trust_score_weight, users.c.trust_score_updated_at)
+                .where(users.c.id.in_(user_ids[start:start + self.BATCH_CHUNK_SIZE]))
+                .with_for_update()
+            ):
+                latest, score_sum, score_count = totals[row.id]
+                score, weight = fold_trust_scores(
+                    row.decayed_trust_score, row.trust_score_weight, row.trust_score_updated_at,
+                    score_sum, score_count, now
+                )
+                updates.append({'user_id': row.id, 'latest': latest, 'score': score, 'weight': weight})
+        if updates:
+            conn.execute(
+                update(users).where(users.c.id == bindparam('user_id')).values(
+                    trust_score=bindparam('latest'),
+                    decayed_trust_score=bindparam('score'),
+                    trust_score_weight=bindparam('weight'),
+                    trust_score_updated_at=now
+                ),
+                updates
+            )
+        self.score_factors_cache.invalidate(totals)
+        return count
+
+    def rebuild_decayed_trust_scores(self) -> int:
+        """Recompute every user's decayed trust score from trust_scores in one pass"""
+        with self.engine.begin() as conn:
+            conn.execute(update(users).values(
+                decayed_trust_score=None, trust_score_weight=0.0, trust_score_updated_at=None
+            ))
+            rows = conn.execute(
+                select(trust_scores.c.user_id, trust_scores.c.score, trust_scores.c.timestamp)
+                .order_by(trust_scores.c.user_id, trust_scores.c.timestamp)
+                .execution_options(yield_per=self.BULK_CHUNK_SIZE)
+            )
+            count = 0
+            for user_id, user_rows in itertools.groupby(rows, key=lambda row: row.user_id):
+                score, weight, updated_at = None, 0.0, None
+                for row in user_rows:
+                    score, weight = fold_trust_scores(score, weight, updated_at, row.score, 1, row.timestamp)
+                    updated_at = row.timestamp
+                conn.execute(update(users).where(users.c.id == user_id).values(
+                    decayed_trust_score=score, trust_score_weight=weight, trust_score_updated_at=updated_at
+                ))
+                count += 1
+            return count
+
+    def _insert_many(self, conn, statement, rows: Iterable[Dict[str, Any]]) -> int:
+        # executemany needs a list; stream the rows through in bounded chunks
+        count = 0
+        rows = iter(rows)
+        while True:
+            chunk = list(itertools.islice(rows, self.BULK_CHUNK_SIZE))
+            if not chunk:
+                return count
+            conn.execute(statement, chunk)
+            count += len(chunk)
+
+    def get_recent_trust_scores(self, user_id: int, limit: int = 5) -> List[float]:
+        """Get recent trust scores for a user"""
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                select(trust_scores.c.score)
+                .where(trust_scores.c.user_id == user_id)
+                .order_by(trust_scores.c.timestamp.desc())
+                .limit(limit)
+            )
+            return [row[0] for row in rows]
+
+    def get_trust_score_history(self, user_id: int, limit: int = 30) -> List[Dict[str, Any]]:
+        """Get trust score history"""
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                select(trust_scores.c.score, trust_scores.c.timestamp)
+                .where(trust_scores.c.user_id == user_id)
+                .order_by(trust_scores.c.timestamp.desc())
+                .limit(limit)
+            )
+            return [{'score': row[0], 'timestamp': _format_value(row[1])} for row in rows]
+
+    # Location operations
+    def store_user_location(self, user_id: int, ip_address: str, location_data: Dict[str, Any]):
+        """Store user location data"""
+        try:
+            with self._begin() as conn:
+                self._upsert_user_location(conn, user_id, ip_address, location_data)
+        except Exception as e:
+            logger.error(f"Location storage error: {str(e)}")
+
+    def _upsert_user_location(self, conn, user_id: int, ip_address: str, location_data: Dict[str, Any]):
+        self._upsert(
+            conn, user_locations, ('user_id', 'ip_address'),
+            {'user_id': user_id, 'ip_address': ip_address},
+            {
+                'latitude': location_data.get('latitude'),
+                'longitude': location_data.get('longitude'),
+                'city': location_data.get('city'),
+                'country': location_data.get('country')
+            }
+        )
+        if location_data.get('latitude') is not None and location_data.get('longitude') is not None:
+            self._record_location_cluster(
+                conn, user_id, location_data['latitude'], location_data['longitude'], datetime.utcnow()
+            )
+        self.score_factors_cache.invalidate([user_id])
+
+    def _record_location_cluster(self, conn, user_id: int, latitude: float, longitude: float, seen_at: datetime):
+        clusters = [
+            dict(row._mapping)
+            for row in conn.execute(select(user_location_clusters).where(user_location_clusters.c.user_id == user_id))
+        ]
+        cluster, evicted = update_clusters(clusters, latitude, longitude, seen_at)
+        if evicted is not None:
+            conn.execute(delete(user_location_clusters).where(user_location_clusters.c.id == evicted['id']))
+        values = {name: cluster[name] for name in ('latitude', 'longitude', 'radius_km', 'weight', 'last_seen')}
+        if cluster['id'] is None:
+            conn.execute(insert(user_location_clusters).values(user_id=user_id, **values))
+        else:
+            conn.execute(
+                update(user_location_clusters).where(user_location_clusters.c.id == cluster['id']).values(**values)
+            )
+
+    def get_user_locations(self, user_id: int, days: int = 30) -> List[Dict[str, Any]]:
+        """Get user's recent locations"""
+        with self.engine.connect() as conn:
+            return self._fetch_locations(conn, user_id, days)
+
+    def _fetch_locations(self, conn, user_id: int, days: int = 30) -> List[Dict[str, Any]]:
+        since = datetime.utcnow() - timedelta(days=days)
+        rows = conn.execute(
+            select(user_locations)
+            .where(user_locations.c.user_id == user_id, user_locations.c.last_seen >= since)
+            .order_by(user_locations.c.last_seen.desc())
+        )
+        return [_row_dict(row) for row in rows]
+
+    def find_locations_near(self, user_id: Optional[int], latitude: float, longitude: float,
+                            radius_km: float) -> List[Dict[str, Any]]:
+        """
+        Stored locations within radius_km of a point, nearest first, each with
+        a distance_km. user_id None searches every user's locations.
+        """
+        # A plain bounding-box filter (no spatial index here), refined by exact distance
+        min_lat, max_lat, min_lon, max_lon = bounding_box(latitude, longitude, radius_km)
+        query = select(user_locations).where(
+            user_locations.c.latitude.between(min_lat, max_lat),
+            user_locations.c.longitude.between(min_lon, max_lon)
+        )
+        if user_id is not None:
+            query = query.where(user_locations.c.user_id == user_id)
+        with self.engine.connect() as conn:
+            rows = [_row_dict(row) for row in conn.execute(query)]
+        return within_radius(rows, latitude, longitude, radius_km)
+
+    def get_user_location_clusters(self, user_id: int, days: int = 30) -> List[Dict[str, Any]]:
+        """Get user's location clusters seen recently, latest first"""
+        with self.engine.connect() as conn:
+            return self._fetch_location_clusters(conn, [user_id], days)[user_id]
+
+    def _fetch_location_clusters(self, conn, user_ids: List[int], days: int = 30) -> Dict[int, List[Dict[str, Any]]]:
+        since = datetime.utcnow() - timedelta(days=days)
+        clusters = {user_id: [] for user_id in user_ids}
+        for row in conn.execute(
+            select(user_location_clusters)
+            .where(user_location_clusters.c.user_id.in_(user_ids), user_location_clusters.c.last_seen >= since)
+            .order_by(user_location_clusters.c.user_id, user_location_clusters.c.last_seen.desc())
+        ):
+            clusters[row.user_id].append(_row_dict(row))
+        return clusters
+
+    def rebuild_location_index(self) -> int:
+        """No spatial index here (find_locations_near filters a bounding box); nothing to rebuild"""
+        return 0
+
+    def rebuild_location_clusters(self) -> int:
+        """Recompute the per-user location clusters from user_locations"""
+        with self.engine.begin() as conn:
+            rows = []
+            located = conn.execute(
+                select(user_locations)
+                .where(user_locations.c.latitude.is_not(None), user_locations.c.longitude.is_not(None))
+                .order_by(user_locations.c.user_id, user_locations.c.last_seen)
+            )
+            for user_id, locations in itertools.groupby(located, key=lambda row: row.user_id):
+                clusters = []
+                for location in locations:
+                    update_clusters(
+                        clusters, location.latitude, location.longitude,
+                        location.last_seen, weight=location.seen_count
+                    )
+                rows.extend(
+                    {'user_id': user_id, **{key: value for key, value in cluster.items() if key != 'id'}}
+                    for cluster in clusters
+                )
+
+            conn.execute(delete(user_location_clusters))
+            if rows:
+                conn.execute(insert(user_location_clusters), rows)
+            return len(rows)
+
+    # Admin dashboard methods
+    def get_total_users(self) -> int:
+        """Get total number of users"""
+        with self.engine.connect() as conn:
+            return conn.execute(select(func.count()).select_from(users)).scalar()
+
+    def get_total_transactions(self) -> int:
+        """Get total number of transactions"""
+        with self.engine.connect() as conn:
+            return conn.execute(select(func.count()).select_from(transactions)).scalar()
+
+    def get_fraud_count(self) -> int:
+        """Get number of high-risk activities detected"""
+        with self.engine.connect() as conn:
+            return conn.execute(
+                select(func.count()).select_from(activities).where(activities.c.risk_level == 'high')
+            ).scalar()
+
+    def get_average_trust_score(self) -> float:
+        """Get average trust score across all users"""
+        with self.engine.connect() as conn:
+            result = conn.execute(select(func.avg(users.c.trust_score))).scalar()
+            return round(float(result), 2) if result else 0.0
+
+    def get_recent_alerts(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Get recent high-risk activities"""
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                select(activities, users.c.username)
+                .join(users, activities.c.user_id == users.c.id)
+                .where(activities.c.risk_level.in_(['high', 'medium']))
+                .order_by(activities.c.timestamp.desc())
+                .limit(limit)
+            )
+            alerts = []
+            for row in rows:
+                alert = _row_dict(row)
+                if alert['context']:
+                    alert['context'] = json.loads(alert['context'])
+                alerts.append(alert)
+            return alerts
+
+    def get_common_user_agents(self, limit: int = 1000) -> List[str]:
+        """Distinct user agents in activities, most frequent first"""
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                select(activities.c.user_agent)
+                .where(activities.c.user_agent.is_not(None), activities.c.user_agent != '')
+                .group_by(activities.c.user_agent)
+                .order_by(func.count().desc())
+                .limit(limit)
+            )
+            return [row[0] for row in rows]
+
+    def get_risk_distribution(self) -> Dict[str, int]:
+        """Get distribution of risk levels"""
+        since = datetime.utcnow() - timedelta(days=7)
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                select(activities.c.risk_level, func.count())
+                .where(activities.c.timestamp >= since)
+                .group_by(activities.c.risk_level)
+            )
+            distribution = {'low': 0, 'medium': 0, 'high': 0}
+            for row in rows:
+                distribution[row[0]] = row[1]
+            return distribution
+
+    def get_hourly_activity_stats(self) -> List[Dict[str, Any]]:
+        """Get hourly activity statistics for the last 24 hours"""
+        since = datetime.utcnow() - timedelta(hours=24)
+        hour = extract('hour', activities.c.timestamp)
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                select(
+                    hour,
+                    func.count(),
+                    func.sum(case((activities.c.risk_level == 'high', 1), else_=0)),
+                    func.avg(activities.c.trust_score)
+                )
+                .where(activities.c.timestamp >= since)
+                .group_by(hour)
+                .order_by(hour)
+            )
+            return [{
+                'hour': int(row[0]),
+                'total_activities': row[1],
+                'high_risk': int(row[2] or 0),
+                'avg_trust_score': round(float(row[3]), 2) if row[3] else 0
+            } for row in rows]
+
+    # User behavior analysis methods
+    def get_user_behavior_patterns(self, user_id: int) -> List[Dict[str, Any]]:
+        """Get user's behavioral patterns"""
+        with self.engine.connect() as conn:
+            return self._fetch_behavior_patterns(conn, user_id)
+
+    def _fetch_behavior_patterns(self, conn, user_id: int) -> List[Dict[str, Any]]:
+        rows = conn.execute(
+            select(activities.c.action_type, activities.c.context, activities.c.timestamp)
+            .where(activities.c.user_id == user_id)
+            .order_by(activities.c.timestamp.desc())
+            .limit(50)
+        )
+        patterns = []
+        for action_type, context, timestamp in rows:
+            pattern = {
+                'action_type': action_type,
+                'timestamp': _format_value(timestamp)
+            }
+            if context:
+                context = json.loads(context)
+                pattern.update({
+                    'hour_of_day': timestamp.hour,
+                    'day_of_week': timestamp.weekday(),
+                    'amount': context.get('amount', 0),
+                    'merchant': context.get('merchant', ''),
+                    'transaction_type': context.get('transaction_type', '')
+                })
+            patterns.append(pattern)
+        return patterns
+
+    def get_user_time_patterns(self, user_id: int) -> Dict[str, Any]:
+        """Get user's typical activity time patterns"""
+        with self.engine.connect() as conn:
+            return self._fetch_time_patterns(conn, user_id)
+
+    def _fetch_time_patterns(self, conn, user_id: int) -> Dict[str, Any]:
+        rows = conn.execute(
+            select(user_activity_hours.c.hour_of_week, user_activity_hours.c.activity_count)
+            .where(user_activity_hours.c.user_id == user_id, user_activity_hours.c.activity_count > 0)
+        )
+        return time_patterns_from_histogram(dict(rows.all()))
+
+    def get_user_incidents(self, user_id: int) -> List[Dict[str, Any]]:
+        """Get user's security incidents"""
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                select(incidents).where(incidents.c.user_id == user_id).order_by(incidents.c.timestamp.desc())
+            )
+            return [_row_dict(row) for row in rows]
+
+    def _fetch_incident_count(self, conn, user_id: int) -> int:
+        return conn.execute(
+            select(func.count()).select_from(incidents).where(incidents.c.user_id == user_id)
+        ).scalar()
+
+    def get_user_activity_score(self, user_id: int) -> float:
+        """Calculate user activity score based on engagement"""
+        with self.engine.connect() as conn:
+            return self._fetch_activity_score(conn, user_id)
+
+    def _fetch_activity_score(self, conn, user_id: int) -> float:
+        since = datetime.utcnow() - timedelta(days=30)
+        activity_count = conn.execute(
+            select(func.count()).select_from(activities)
+            .where(activities.c.user_id == user_id, activities.c.timestamp >= since)
+        ).scalar()
+        return min(30, activity_count)
+
+    def get_score_factors(self, user_id: int) -> Dict[str, Any]:
+        """Get user's device, location and behavior trust, account age and verification status"""
+        return self.score_factors_cache.get_or_load(user_id, self._fetch_score_factors)
+
+    def get_score_factors_cache_stats(self) -> Dict[str, Any]:
+        """Score factor cache statistics"""
+        return self.score_factors_cache.stats()
+
+    def _fetch_score_factors(self, user_id: int) -> Dict[str, Any]:
+        # The five factor getters as correlated scalar subqueries of one statement
+        level = device_fingerprints.c.trust_level + 5.0 * (device_fingerprints.c.seen_count - 1)
+        device_trust = (
+            select(func.avg(case((level > 100.0, 100.0), else_=level)))
+            .where(device_fingerprints.c.user_id == users.c.id)
+            .scalar_subquery()
+        )
+        known_locations = (
+            select(func.count()).select_from(user_locations)
+            .where(user_locations.c.user_id == users.c.id, user_locations.c.seen_count > 1)
+            .scalar_subquery()
+        )
+        now = datetime.utcnow()
+        behavior_trust = (
+            select(func.avg(activities.c.trust_score))
+            .where(activities.c.user_id == users.c.id, activities.c.timestamp >= now - timedelta(days=7))
+            .scalar_subquery()
+        )
+        with self.engine.connect() as conn:
+            row = conn.execute(
+                select(device_trust, known_locations, behavior_trust, users.c.created_at, users.c.verified)
+                .where(users.c.id == user_id)
+            ).first()
+        if row is None:
+            return score_factors(None, 0, None, None, False)
+        created_at = row[3]
+        return score_factors(row[0], row[1], row[2], (now - created_at).days if created_at else None, row[4])
+
+    def get_user_device_trust(self, user_id: int) -> float:
+        """Get user's device trust level"""
+        with self.engine.connect() as conn:
+            # Every repeat sighting of a device adds 5 points to its base level
+            level = device_fingerprints.c.trust_level + 5.0 * (device_fingerprints.c.seen_count - 1)
+            result = conn.execute(
+                select(func.avg(case((level > 100.0, 100.0), else_=level)))
+                .where(device_fingerprints.c.user_id == user_id)
+            ).scalar()
+            return round(float(result), 2) if result else 50.0
+
+    def get_user_location_trust(self, user_id: int) -> float:
+        """Get user's location trust level"""
+        with self.engine.connect() as conn:
+            # An IP seen only once is not a known location yet
+            location_count = conn.execute(
+                select(func.count()).select_from(user_locations)
+                .where(user_locations.c.user_id == user_id, user_locations.c.seen_count > 1)
+            ).scalar()
+
+        return location_trust(location_count)
+
+    def get_user_behavior_trust(self, user_id: int) -> float:
+        """Get user's behavioral trust level"""
+        since = datetime.utcnow() - timedelta(days=7)
+        with self.engine.connect() as conn:
+            result = conn.execute(
+                select(func.avg(activities.c.trust_score))
+                .where(activities.c.user_id == user_id, activities.c.timestamp >= since)
+            ).scalar()
+            return round(float(result), 2) if result else 70.0
+
+    def get_user_account_age(self, user_id: int) -> int:
+        """Get user account age in days"""
+        with self.engine.connect() as conn:
+            created_at = conn.execute(select(users.c.created_at).where(users.c.id == user_id)).scalar()
+        return (datetime.utcnow() - created_at).days if created_at else 0
+
+    def get_user_verification_status(self, user_id: int) -> bool:
+        """Get user verification status"""
+        with self.engine.connect() as conn:
+            result = conn.execute(select(users.c.verified).where(users.c.id == user_id)).scalar()
+            return bool(result)
+
+    # Feature snapshots
+    def _read_transaction(self, conn):
+        # A repeatable-read snapshot so every query sees the same history
+        if self.engine.dialect.name == 'postgresql':
+            conn = conn.execution_options(isolation_level='REPEATABLE READ')
+        return conn.begin()
+
+    def get_user_snapshot(self, user_id: int) -> UserFeatureSnapshot:
+        """Load everything the trust factors need for one user in a single read transaction"""
+        return UserFeatureSnapshot(user_id, **self.get_user_snapshot_sections(user_id, SNAPSHOT_SECTIONS))
+
+    def get_user_snapshot_sections(self, user_id: int, sections: Sequence[str]) -> Dict[str, Any]:
+        """Load some sections of a user's snapshot in one read transaction on its own connection"""
+        with self.engine.connect() as conn, self._read_transaction(conn):
+            loaders = {
+                'user': lambda: self._fetch_user(conn, user_id),
+                'device_count': lambda: self._fetch_device_count(conn, user_id, days=30),
+                'velocity': lambda: self._fetch_velocity(conn, [user_id])[user_id],
+                'amount_stats': lambda: self._fetch_amount_stats(conn, [user_id])[user_id],
+                'location_clusters': lambda: self._fetch_location_clusters(conn, [user_id], days=30)[user_id],
+                'behavior_profile': lambda: self._load_behavior_profiles(conn, [user_id])[user_id],
+                'incident_count': lambda: self._fetch_incident_count(conn, user_id),
+                'activity_score': lambda: self._fetch_activity_score(conn, user_id),
+                'time_patterns': lambda: self._fetch_time_patterns(conn, user_id)
+            }
+            return {section: loaders[section]() for section in sections}
+
+    def get_user_snapshots(self, user_ids: List[int]) -> Dict[int, UserFeatureSnapshot]:
+        """Load snapshots for many users with set-based queries in a single read transaction"""
+        user_ids = sorted(set(user_ids))
+        snapshots = {user_id: UserFeatureSnapshot(user_id) for user_id in user_ids}
+
+        with self.engine.connect() as conn, self._read_transaction(conn):
+            for start in range(0, len(user_ids), self.BATCH_CHUNK_SIZE):
+                chunk = user_ids[start:start + self.BATCH_CHUNK_SIZE]
+                self._load_snapshot_chunk(conn, chunk, snapshots)
+        return snapshots
+
+    def _load_snapshot_chunk(self, conn, user_ids: List[int], snapshots: Dict[int, UserFeatureSnapshot]):
+        """Run the set-based snapshot queries for one chunk of user IDs"""
+        since = datetime.utcnow() - timedelta(days=30)
+
+        for row in conn.execute(select(users).where(users.c.id.in_(user_ids))):
+            snapshots[row.id].user = _row_dict(row)
+
+        for user_id, count in conn.execute(
+            select(device_fingerprints.c.user_id, func.count())
+            .where(device_fingerprints.c.user_id.in_(user_ids), device_fingerprints.c.last_seen >= since)
+            .group_by(device_fingerprints.c.user_id)
+        ):
+            snapshots[user_id].device_count = count
+
+        for user_id, velocity in self._fetch_velocity(conn, user_ids).items():
+            snapshots[user_id].velocity = velocity
+
+        for user_id, amount_stats in self._fetch_amount_stats(conn, user_ids).items():
+            snapshots[user_id].amount_stats = amount_stats
+
+        for user_id, clusters in self._fetch_location_clusters(conn, user_ids, days=30).items():
+            snapshots[user_id].location_clusters = clusters
+
+        for user_id, profile in self._load_behavior_profiles(conn, user_ids).items():
+            snapshots[user_id].behavior_profile = profile
+
+        for user_id, count in conn.execute(
+            select(incidents.c.user_id, func.count())
+            .where(incidents.c.user_id.in_(user_ids))
+            .group_by(incidents.c.user_id)
+        ):
+            snapshots[user_id].incident_count = count
+
+        for user_id, count in conn.execute(
+            select(activities.c.user_id, func.count())
+            .where(activities.c.user_id.in_(user_ids), activities.c.timestamp >= since)
+            .group_by(activities.c.user_id)
+        ):
+            snapshots[user_id].activity_score = min(30, count)
+
+        histograms = {}
+        for user_id, bucket, count in conn.execute(
+            select(user_activity_hours)
+            .where(user_activity_hours.c.user_id.in_(user_ids), user_activity_hours.c.activity_count > 0)
+        ):
+            histograms.setdefault(user_id, {})[bucket] = count
+        for user_id, histogram in histograms.items():
+            snapshots[user_id].time_patterns = time_patterns_from_histogram(histogram)
@@ -0,0 +1,182 @@
+"""
+TrustAI SQLAlchemy Schema Migrations - Versioned schema changes for SQLAlchemyDatabase (PostgreSQL and others)
+"""
+
+import time
+from datetime import datetime
+from typing import Callable, List
+import logging
+
+from sqlalchemy import MetaData, Table, Column, Integer, Text, DateTime, func, inspect, insert, select, text
+
+from src.migrations import Migration, _merge_duplicates
+
+logger = logging.getLogger(__name__)
+
+# Same layout as the SQLite backend's schema_version table
+_version_metadata = MetaData()
+schema_version = Table(
+    'schema_version', _version_metadata,
+    Column('version', Integer, primary_key=True, autoincrement=False),
+    Column('description', Text, nullable=False),
+    Column('applied_at', DateTime, default=datetime.utcnow),
+)
+
+# Key of the PostgreSQL advisory lock that serializes workers migrating at once
+MIGRATION_LOCK_KEY = 0x7472757374  # 'trust'
+
+
+# Steps take (connection, metadata) and look tables up in the backend's
+# metadata by name, so the table definitions stay in one place
+def _create_table(name: str) -> Callable:
+    """Step creating a table (with its indexes) as currently defined, unless it exists"""
+    def step(conn, metadata: MetaData):
+        metadata.tables[name].create(conn, checkfirst=True)
+    return step
+
+
+def _add_column(table: str, column: str) -> Callable:
+    """Step adding a column as currently defined, unless it exists"""
+    def step(conn, metadata: MetaData):
+        if column in {info['name'] for info in inspect(conn).get_columns(table)}:
+            return
+        definition = metadata.tables[table].c[column]
+        parts = [column, definition.type.compile(dialect=conn.dialect)]
+        if definition.server_default is not None:
+            parts.append(f'DEFAULT {definition.server_default.arg}')
+        elif definition.default is not None and definition.default.is_scalar:
+            parts.append(f'DEFAULT {definition.default.arg!r}')
+        if not definition.nullable:
+            parts.append('NOT NULL')
+        conn.execute(text(f'ALTER TABLE {table} ADD COLUMN {" ".join(parts)}'))
+    return step
+
+
+def _create_index(table: str, name: str) -> Callable:
+    """Step creating one of a table's indexes as currently defined, unless it exists"""
+    def step(conn, metadata: MetaData):
+        index = next(index for index in metadata.tables[table].indexes if index.name == name)
+        index.create(conn, checkfirst=True)
+    return step
+
+
+def _drop_index(table: str, name: str) -> Callable:
+    """Step dropping an index that is no longer defined, if it exists"""
+    def step(conn, metadata: MetaData):
+        if name in {index['name'] for index in inspect(conn).get_indexes(table)}:
+            conn.execute(text(f'DROP INDEX {name}'))
+    return step
+
+
+def _sql(statement: str) -> Callable:
+    """Step running a plain SQL statement"""
+    def step(conn, metadata: MetaData):
+        conn.execute(text(statement))
+    return step
+
+
+# Every step must be idempotent so a database created by metadata.create_all
+# before these migrations existed (version 0, with some of the tables) is
+# brought up to date. Never rewrite or reorder an entry once released;
+# append new versions instead. As with SQLite, derived tables come up empty
+# and are filled by the maintenance.py command named in backfill.
+SA_MIGRATIONS = [
+    Migration(1, 'Core tables', [
+        _create_table('users'),
+        _create_table('activities'),
+        _create_table('transactions'),
+        _create_table('device_fingerprints'),
+        _create_table('user_locations'),
+        _create_table('trust_scores'),
+        _create_table('incidents'),
+    ]),
+    Migration(2, 'Unique device fingerprints and locations per user, with seen counts', [
+        _add_column('device_fingerprints', 'seen_count'),
+        _add_column('user_locations', 'seen_count'),
+        *(_sql(statement) for statement in _merge_duplicates('device_fingerprints', 'fingerprint')),
+        *(_sql(statement) for statement in _merge_duplicates('user_locations', 'ip_address')),
+        # The unique indexes replace the plain lookup indexes of the first schema
+        _create_index('device_fingerprints', 'uq_device_fingerprints_user_fingerprint'),
+        _create_index('user_locations', 'uq_user_locations_user_ip'),
+        _drop_index('device_fingerprints', 'idx_device_fingerprints_user_fingerprint'),
+        _drop_index('user_locations', 'idx_user_locations_user_ip'),
+    ]),
+    Migration(3, 'Per-user hour-of-week activity histogram', [
+        _create_table('user_activity_hours'),
+    ], backfill='rebuild-activity-hours'),
+    Migration(4, 'Per-user location clusters', [
+        _create_table('user_location_clusters'),
+    ], backfill='rebuild-location-clusters'),
+    Migration(5, 'Per-user behavior profiles', [
+        _create_table('user_behavior_profiles'),
+        _create_table('user_behavior_counts'),
+    ], backfill='rebuild-behavior-profiles'),
+    Migration(6, 'Per-user transaction amount statistics', [
+        _create_table('user_amount_stats'),
+        _create_table('user_amount_buckets'),
+    ], backfill='rebuild-amount-stats'),
+    Migration(7, 'Time-decayed trust score on users', [
+        _add_column('users', 'decayed_trust_score'),
+        _add_column('users', 'trust_score_weight'),
+        _add_column('users', 'trust_score_updated_at'),
+    ], backfill='rebuild-decayed-trust-scores'),
+    Migration(8, 'Per-user device component index', [
+        _create_table('device_fingerprint_components'),
+    ], backfill='rebuild-device-index'),
+]
+
+
+def get_schema_version(engine) -> int:
+    """Get the highest applied migration version (0 for a fresh or pre-migration database)"""
+    with engine.begin() as conn:
+        _version_metadata.create_all(conn)
+        return conn.execute(select(func.max(schema_version.c.version))).scalar() or 0
+
+
+def run_migrations(engine, metadata: MetaData, migrations: List[Migration] = None) -> List[int]:
+    """
+    Apply pending migrations in version order and return the versions applied.
+
+    Each migration runs in its own transaction together with its
+    schema_version row (DDL is transactional on PostgreSQL). On PostgreSQL
+    an advisory lock serializes concurrent workers, and a worker that waited
+    sees the version already recorded and skips it.
+    """
+    migrations = sorted(migrations or SA_MIGRATIONS, key=lambda m: m.version)
+    applied = []
+    backfills = []
+
+    if get_schema_version(engine) >= migrations[-1].version:
+        return applied
+
+    for migration in migrations:
+        with engine.begin() as conn:
+            if conn.dialect.name == 'postgresql':
+                conn.execute(select(func.pg_advisory_xact_lock(MIGRATION_LOCK_KEY)))
+            current = conn.execute(select(func.max(schema_version.c.version))).scalar() or 0
+            if migration.version <= current:
+                continue
+
+            started = time.monotonic()
+            for step in migration.steps:
+                step(conn, metadata)
+            conn.execute(insert(schema_version).values(version=migration.version, description=migration.description))
+
+        applied.append(migration.version)
+        if migration.backfill:
+            backfills.append(migration.backfill)
+        logger.info(
+            f"Applied migration {migration.version} ({migration.description}) "
+            f"in {time.monotonic() - started:.2f}s"
+        )
+
+    if backfills:
+        with engine.connect() as conn:
+            has_users = conn.execute(select(metadata.tables['users'].c.id).limit(1)).first() is not None
+        if has_users:
+            logger.warning(
+                "New derived tables start empty; backfill existing data with: "
+                + ', '.join(f"python maintenance.py {command}" for command in backfills)
+            )
+
+    return applied
@@ -0,0 +1,155 @@
+"""
+TrustAI SQLite Writer - One thread owns the only write connection and batches commands
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Any, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Sentinel telling the writer thread to exit once everything before it is written
+_STOP = object()
+
+
+class SQLiteWriter:
+    """
+    Serializes every write to a SQLite database through a single thread.
+
+    submit(fn, *args) queues fn(conn, *args) and returns a Future. The thread
+    takes every command already waiting (up to batch_size), runs each inside
+    its own SAVEPOINT of one IMMEDIATE transaction and commits once, so
+    request threads never contend for the write lock and commands that
+    arrive together share a commit. A failing command is rolled back to its
+    savepoint and its Future gets the exception; the rest still commit.
+    """
+
+    def __init__(self, db_path: str, setup: Callable[[sqlite3.Connection], None] = None,
+                 batch_size: int = 500, **connect_kwargs):
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+
+        self.db_path = db_path
+        self.setup = setup
+        self.batch_size = batch_size
+        self.connect_kwargs = connect_kwargs  # extra sqlite3.connect() arguments
+        self._lock = threading.Lock()
+        self._start()
+
+    def _start(self):
+        self._pid = os.getpid()
+        self._queue = queue.Queue()
+        self._closed = False
+        self._stats = {
+            'commands': 0,
+            'failed_commands': 0,
+            'batches': 0,
+            'failed_batches': 0,
+            'last_batch_ms': 0.0,
+            'max_batch_ms': 0.0
+        }
+        self._thread = threading.Thread(target=self._run, name='trustai-sqlite-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, fn: Callable, *args) -> Future:
+        """Queue fn(conn, *args) for the writer thread"""
+        with self._lock:
+            # The writer thread does not survive a fork; give the child its own
+            if self._pid != os.getpid():
+                self._start()
+            if self._closed:
+                raise RuntimeError("SQLite writer is closed")
+            future = Future()
+            self._queue.put((fn, args, future))
+        return future
+
+    def close(self):
+        """Commit everything still queued and stop the writer thread"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(_STOP)
+        self._thread.join()
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of writer counters"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update({
+            'depth': self._queue.qsize(),
+            'batch_size': self.batch_size,
+            'running': self._thread.is_alive()
+        })
+        return stats
+
+    def _run(self):
+        conn = sqlite3.connect(self.db_path, **self.connect_kwargs)
+        try:
+            if self.setup:
+                self.setup(conn)
+        except Exception as e:
+            logger.error(f"SQLite writer setup error: {str(e)}")
+
+        stopping = False
+        while not stopping:
+            batch: List[Tuple[Callable, tuple, Future]] = []
+            item = self._queue.get()
+            while item is not _STOP:
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            stopping = item is _STOP
+
+            if batch:
+                self._write(conn, batch)
+
+        conn.close()
+
+    def _write(self, conn: sqlite3.Connection, batch: List[Tuple[Callable, tuple, Future]]):
+        started = time.monotonic()
+        outcomes = []
+        failed = 0
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            for fn, args, future in batch:
+                conn.execute('SAVEPOINT command')
+                try:
+                    outcomes.append((future, fn(conn, *args), None))
+                except Exception as e:
+                    conn.execute('ROLLBACK TO command')
+                    outcomes.append((future, None, e))
+                    failed += 1
+                conn.execute('RELEASE command')
+            conn.commit()
+        except Exception as e:
+            # Nothing in this batch was committed
+            logger.error(f"SQLite writer batch of {len(batch)} commands failed: {str(e)}")
+            if conn.in_transaction:
+                conn.rollback()
+            outcomes = [(future, None, e) for _, _, future in batch]
+            failed = len(batch)
+
+        for future, result, error in outcomes:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+        elapsed_ms = (time.monotonic() - started) * 1000
+        with self._lock:
+            self._stats['commands'] += len(batch)
+            self._stats['failed_commands'] += failed
+            self._stats['batches'] += 1
+            self._stats['failed_batches'] += failed == len(batch)
+            self._stats['last_batch_ms'] = round(elapsed_ms, 3)
+            self._stats['max_batch_ms'] = round(max(self._stats['max_batch_ms'], elapsed_ms), 3)
@@ -0,0 +1,54 @@
+"""
+TrustAI Storage Protocol - The storage surface TrustEngine and AuthManager depend on
+"""
+
+from typing import Dict, List, Any, Optional, Protocol, Sequence, Tuple, runtime_checkable
+
+from src.snapshot import UserFeatureSnapshot
+
+
+@runtime_checkable
+class TrustStore(Protocol):
+    """
+    Methods TrustEngine and AuthManager call on their storage backend.
+
+    Implemented by Database (sqlite3), SQLAlchemyDatabase and
+    InMemoryDatabase; any of them can be passed to either component.
+    """
+
+    # Users
+    def create_user(self, username: str, email: str, password_hash: str, role: str = 'user') -> Optional[int]: ...
+
+    def get_user(self, user_id: int) -> Optional[Dict[str, Any]]: ...
+
+    def get_user_by_username(self, username: str) -> Optional[Dict[str, Any]]: ...
+
+    def get_user_by_email(self, email: str) -> Optional[Dict[str, Any]]: ...
+
+    def update_last_login(self, user_id: int): ...
+
+    def update_user_password(self, user_id: int, password_hash: str): ...
+
+    def set_user_verified(self, user_id: int): ...
+
+    # Scoring history
+    def get_user_snapshot(self, user_id: int) -> UserFeatureSnapshot: ...
+
+    def get_user_snapshot_sections(self, user_id: int, sections: Sequence[str]) -> Dict[str, Any]: ...
+
+    def get_user_snapshots(self, user_ids: List[int]) -> Dict[int, UserFeatureSnapshot]: ...
+
+    def get_score_factors(self, user_id: int) -> Dict[str, Any]: ...
+
+    def find_similar_devices(self, user_id: int, fingerprint: str, days: int = 30) -> List[str]: ...
+
+    def find_similar_devices_bulk(self, probes: List[Tuple[int, str]], days: int = 30) -> List[List[str]]: ...
+
+    # Scoring side effects
+    def log_activity(self, user_id: int, action_type: str, trust_result: Dict[str, Any], context: Dict[str, Any]): ...
+
+    def store_trust_score(self, user_id: int, result: Dict[str, Any]): ...
+
+    def store_device_fingerprint(self, user_id: int, fingerprint: str): ...
+
+    def store_user_location(self, user_id: int, ip_address: str, location_data: Dict[str, Any]): ...
@@ -0,0 +1,62 @@
+"""
+TrustAI Decayed Trust Scores - Exponentially time-decayed average of a user's trust scores
+"""
+
+from datetime import datetime
+from itertools import groupby
+from typing import Any, Optional, Tuple
+
+# Score of a user who has never been scored
+DEFAULT_TRUST_SCORE = 70.0
+
+# A score counts half as much as a new one after this long
+TRUST_SCORE_HALF_LIFE_HOURS = 24.0
+
+
+def _as_datetime(value: Any) -> Optional[datetime]:
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return value
+
+
+def fold_trust_scores(score: Optional[float], weight: float, updated_at: Any,
+                      score_sum: float, score_count: int, now: datetime) -> Tuple[float, float]:
+    """
+    Fold score_count new scores (summing to score_sum), all given at now, into
+    a user's decayed score and weight last updated at updated_at.
+
+    The decayed score is sum(score * decay) / sum(decay) over every score so
+    far, with decay halving every TRUST_SCORE_HALF_LIFE_HOURS; keeping both
+    the score and the weight makes each update O(1). Returns (score, weight).
+    """
+    if score is None or not weight:
+        return score_sum / score_count, float(score_count)
+
+    elapsed_hours = max(0.0, (now - _as_datetime(updated_at)).total_seconds() / 3600) if updated_at else 0.0
+    decay = 0.5 ** (elapsed_hours / TRUST_SCORE_HALF_LIFE_HOURS)
+    decayed_weight = weight * decay
+    total_weight = decayed_weight + score_count
+    return (score * decayed_weight + score_sum) / total_weight, total_weight
+
+
+# SQLite persistence in users.decayed_trust_score, trust_score_weight and
+# trust_score_updated_at (migration 14)
+def rebuild_decayed_trust_scores(conn) -> int:
+    """Recompute every user's decayed trust score from trust_scores in one pass, returning the users written"""
+    conn.execute('''
+        UPDATE users SET decayed_trust_score = NULL, trust_score_weight = 0, trust_score_updated_at = NULL
+    ''')
+    cursor = conn.execute('SELECT user_id, score, timestamp FROM trust_scores ORDER BY user_id, timestamp')
+    users = 0
+    for user_id, rows in groupby(cursor, key=lambda row: row[0]):
+        score, weight, updated_at = None, 0.0, None
+        for _, value, timestamp in rows:
+            timestamp = _as_datetime(timestamp)
+            score, weight = fold_trust_scores(score, weight, updated_at, value, 1, timestamp)
+            updated_at = timestamp
+        conn.execute('''
+            UPDATE users SET decayed_trust_score = ?, trust_score_weight = ?, trust_score_updated_at = ?
+            WHERE id = ?
+        ''', (score, weight, updated_at.strftime('%Y-%m-%d %H:%M:%S'), user_id))
+        users += 1
+    return users
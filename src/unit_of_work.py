@@ -0,0 +1,63 @@
+"""
+TrustAI Unit of Work - Collects the writes for one decision and commits them together
+"""
+
+from datetime import datetime
+from typing import Dict, List, Any, Tuple
+
+
+class UnitOfWork:
+    """
+    Stands in for the database's write methods and records each call instead
+    of running it. commit() hands the whole list to target.apply_writes, so
+    every row for a decision lands in one transaction (one commit, one fsync)
+    or not at all. target is any storage backend or a WriteBehindQueue.
+
+    Used as a context manager it commits on a clean exit and discards the
+    writes if the block raises. Writes are not visible to reads made inside
+    the unit of work.
+    """
+
+    def __init__(self, target):
+        self.target = target
+        self.writes: List[Tuple[str, tuple]] = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+        return False
+
+    # Recorded write methods, same signatures as Database
+    def log_activity(self, user_id: int, action_type: str, trust_result: Dict[str, Any], context: Dict[str, Any]):
+        self.writes.append(('log_activity', (user_id, action_type, trust_result, context)))
+
+    def log_transaction(self, user_id: int, amount: float, merchant: str,
+                        transaction_type: str, trust_score: float, risk_level: str, timestamp: datetime = None):
+        self.writes.append((
+            'log_transaction',
+            (user_id, amount, merchant, transaction_type, trust_score, risk_level, timestamp)
+        ))
+
+    def store_trust_score(self, user_id: int, result: Dict[str, Any]):
+        self.writes.append(('store_trust_score', (user_id, result)))
+
+    def store_device_fingerprint(self, user_id: int, fingerprint: str):
+        self.writes.append(('store_device_fingerprint', (user_id, fingerprint)))
+
+    def store_user_location(self, user_id: int, ip_address: str, location_data: Dict[str, Any]):
+        self.writes.append(('store_user_location', (user_id, ip_address, location_data)))
+
+    def commit(self):
+        """Apply every recorded write in one transaction"""
+        writes, self.writes = self.writes, []
+        if writes:
+            self.target.apply_writes(writes)
+
+    def rollback(self):
+        """Forget the recorded writes"""
+        self.writes = []
@@ -0,0 +1,75 @@
+"""
+TrustAI User Agent Parsing - Shared, LRU-cached user-agent parsing
+"""
+
+import logging
+from functools import lru_cache
+from typing import Any, Dict, Iterable
+
+from user_agents import parse as parse_user_agent
+
+logger = logging.getLogger(__name__)
+
+
+def _device_type(user_agent) -> str:
+    if user_agent.is_bot:
+        return 'bot'
+    if user_agent.is_tablet:
+        return 'tablet'
+    if user_agent.is_mobile:
+        return 'mobile'
+    if user_agent.is_pc:
+        return 'pc'
+    return 'other'
+
+
+class UserAgentParser:
+    """
+    Parses user-agent strings into browser, OS and device components.
+
+    Parsing is regex-heavy, while production traffic repeats a small set of
+    distinct strings, so results sit in a bounded LRU cache keyed by the raw
+    string. warm_up() preloads it, e.g. from the user agents already seen in
+    activities.
+    """
+
+    def __init__(self, cache_size: int = 5000):
+        self._cached_parse = lru_cache(maxsize=cache_size)(self._parse)
+
+    def parse(self, user_agent: str) -> Dict[str, str]:
+        """
+        {'browser', 'browser_version', 'os', 'os_version', 'device_type',
+        'device_model'} for user_agent. The dict is shared through the cache
+        and must not be modified.
+        """
+        return self._cached_parse(user_agent or '')
+
+    def _parse(self, user_agent: str) -> Dict[str, str]:
+        parsed = parse_user_agent(user_agent)
+        return {
+            'browser': parsed.browser.family,
+            'browser_version': str(parsed.browser.version[0]) if parsed.browser.version else '',
+            'os': parsed.os.family,
+            'os_version': str(parsed.os.version[0]) if parsed.os.version else '',
+            'device_type': _device_type(parsed),
+            'device_model': parsed.device.family
+        }
+
+    def warm_up(self, user_agents: Iterable[str]) -> int:
+        """Parse user_agents into the cache ahead of traffic, returning how many were loaded"""
+        loaded = 0
+        for user_agent in user_agents:
+            self.parse(user_agent)
+            loaded += 1
+        logger.info(f"Warmed user agent cache with {loaded} user agents")
+        return loaded
+
+    def stats(self) -> Dict[str, Any]:
+        """Cache statistics"""
+        info = self._cached_parse.cache_info()
+        return {
+            'cache_hits': info.hits,
+            'cache_misses': info.misses,
+            'cache_size': info.currsize,
+            'cache_max_size': info.maxsize
+        }
@@ -166,6 +166,37 @@ def load_config() -> Dict[str, Any]:
     """Load configuration from environment variables"""
     return {
         'database_url': os.getenv('DATABASE_URL', 'sqlite:///trustai.db'),
+        'database_pool': {
+            'size': int(os.getenv('DB_POOL_SIZE', '5')),
+            'timeout': float(os.getenv('DB_POOL_TIMEOUT', '30')),  # seconds to wait for a connection
+        },
+        'database_profile': os.getenv('DB_PROFILE', 'balanced'),  # durable, balanced or bulk-load
+        'database_single_writer': os.getenv('DB_SINGLE_WRITER', 'false').lower() == 'true',
+        'velocity_store': os.getenv('VELOCITY_STORE', 'sqlite'),  # sqlite (shared) or memory (per process)
+        'write_behind': {
+            'enabled': os.getenv('WRITE_BEHIND', 'false').lower() == 'true',
+            'batch_size': int(os.getenv('WRITE_BEHIND_BATCH_SIZE', '200')),
+            'max_depth': int(os.getenv('WRITE_BEHIND_MAX_DEPTH', '10000')),  # callers block beyond this
+            'max_delay_ms': float(os.getenv('WRITE_BEHIND_MAX_DELAY_MS', '0')),  # wait for a fuller batch
+        },
+        'geoip': {
+            'database': os.getenv('GEOIP_DATABASE', 'data/GeoLite2-City.mmdb'),  # MaxMind City .mmdb
+            'cache_size': int(os.getenv('GEOIP_CACHE_SIZE', '10000')),  # IPs kept in the lookup cache
+        },
+        'user_agent_cache': {
+            'size': int(os.getenv('UA_CACHE_SIZE', '5000')),  # distinct user agents kept parsed
+            'warm_up': os.getenv('UA_CACHE_WARM_UP', 'false').lower() == 'true',  # preload from activities at startup
+        },
+        'score_factors_cache': {
+            'ttl_seconds': float(os.getenv('SCORE_FACTORS_CACHE_TTL', '30')),  # 0 disables caching
+            'size': int(os.getenv('SCORE_FACTORS_CACHE_SIZE', '10000')),  # users kept cached
+        },
+        'factor_pool': {
+            'enabled': os.getenv('FACTOR_POOL', 'false').lower() == 'true',  # load risk factor inputs concurrently
+            'size': int(os.getenv('FACTOR_POOL_SIZE', '8')),  # worker threads shared by all requests
+            'deadline_ms': float(os.getenv('FACTOR_DEADLINE_MS', '50')),  # per factor, for its inputs to load before its default is used
+            'deadlines_ms': os.getenv('FACTOR_DEADLINES_MS', ''),  # per-factor overrides, e.g. geolocation_risk=100
+        },
         'jwt_secret': os.getenv('JWT_SECRET_KEY', 'your-secret-key-change-in-production'),
         'redis_url': os.getenv('REDIS_URL', 'redis://localhost:6379'),
         'email_service': {
@@ -0,0 +1,218 @@
+"""
+TrustAI Transaction Velocity - Sliding-window transaction counts and amount sums per user
+"""
+
+import calendar
+import copy
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Windows (seconds) tracked for every user: 1 minute, 5 minutes, 1 hour, 24 hours
+VELOCITY_WINDOWS = (60, 300, 3600, 86400)
+
+# Each window is a ring of this many buckets, so counts are exact to 1/60
+# of the window (1 s, 5 s, 1 min and 24 min respectively)
+BUCKETS_PER_WINDOW = 60
+
+
+def epoch_seconds(timestamp: Any = None) -> int:
+    """Naive-UTC datetime or 'YYYY-MM-DD HH:MM:SS' string to Unix seconds; None means now"""
+    if timestamp is None:
+        timestamp = datetime.utcnow()
+    elif isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp)
+    return calendar.timegm(timestamp.timetuple())
+
+
+def empty_velocity() -> Dict[int, Dict[str, float]]:
+    """Velocity of a user with no recent transactions"""
+    return {window: {'count': 0, 'amount': 0.0} for window in VELOCITY_WINDOWS}
+
+
+def window_starts(now: Any = None) -> Dict[int, datetime]:
+    """
+    Start of every window as of now, aligned to its buckets the way the rings
+    see it, for backends that aggregate raw transactions instead
+    """
+    seconds = epoch_seconds(now)
+    starts = {}
+    for window in VELOCITY_WINDOWS:
+        width = window // BUCKETS_PER_WINDOW
+        start = (seconds // width - BUCKETS_PER_WINDOW + 1) * width
+        starts[window] = datetime(1970, 1, 1) + timedelta(seconds=start)
+    return starts
+
+
+class _Ring:
+    """Counts and amount sums of one window, one slot per bucket"""
+
+    __slots__ = ('width', 'head', 'counts', 'amounts', 'count', 'amount')
+
+    def __init__(self, window: int):
+        self.width = window // BUCKETS_PER_WINDOW
+        self.head = None                      # newest bucket seen
+        self.counts = [0] * BUCKETS_PER_WINDOW
+        self.amounts = [0.0] * BUCKETS_PER_WINDOW
+        self.count = 0                        # totals over the live buckets
+        self.amount = 0.0
+
+    def _advance(self, bucket: int):
+        # Clear the slots of buckets that fell out of the window
+        if self.head is None:
+            self.head = bucket
+            return
+        if bucket <= self.head:
+            return
+        for expired in range(max(self.head + 1, bucket - BUCKETS_PER_WINDOW + 1), bucket + 1):
+            slot = expired % BUCKETS_PER_WINDOW
+            self.count -= self.counts[slot]
+            self.amount -= self.amounts[slot]
+            self.counts[slot] = 0
+            self.amounts[slot] = 0.0
+        self.head = bucket
+
+    def add(self, seconds: int, amount: float):
+        bucket = seconds // self.width
+        self._advance(bucket)
+        if bucket <= self.head - BUCKETS_PER_WINDOW:
+            return  # already outside the window
+        slot = bucket % BUCKETS_PER_WINDOW
+        self.counts[slot] += 1
+        self.amounts[slot] += amount
+        self.count += 1
+        self.amount += amount
+
+    def totals(self, seconds: int) -> Tuple[int, float]:
+        self._advance(seconds // self.width)
+        return self.count, self.amount
+
+    def buckets(self) -> Iterator[Tuple[int, int, int, float]]:
+        """(slot, bucket, count, amount) for every non-empty live bucket"""
+        if self.head is None:
+            return
+        for bucket in range(self.head - BUCKETS_PER_WINDOW + 1, self.head + 1):
+            slot = bucket % BUCKETS_PER_WINDOW
+            if self.counts[slot]:
+                yield slot, bucket, self.counts[slot], self.amounts[slot]
+
+
+class VelocityCounters:
+    """
+    In-process sliding-window counters: for every user, the number and total
+    amount of transactions in each of VELOCITY_WINDOWS.
+
+    add() and get() touch a fixed number of buckets no matter how long the
+    user's history is. Time is expected to move forward; an event older than
+    a window is ignored for that window, and get() answers for the newest
+    bucket seen when asked about an earlier time.
+    """
+
+    def __init__(self):
+        self._users: Dict[int, List[_Ring]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, user_id: int, timestamp: Any, amount: float):
+        """Count one transaction; timestamp None means now"""
+        seconds = epoch_seconds(timestamp)
+        with self._lock:
+            rings = self._users.get(user_id)
+            if rings is None:
+                rings = self._users[user_id] = [_Ring(window) for window in VELOCITY_WINDOWS]
+            for ring in rings:
+                ring.add(seconds, amount or 0.0)
+
+    def get(self, user_id: int, now: Any = None) -> Dict[int, Dict[str, float]]:
+        """{window_seconds: {'count', 'amount'}} as of now"""
+        seconds = epoch_seconds(now)
+        velocity = empty_velocity()
+        with self._lock:
+            for window, ring in zip(VELOCITY_WINDOWS, self._users.get(user_id, ())):
+                count, amount = ring.totals(seconds)
+                velocity[window] = {'count': count, 'amount': round(amount, 2)}
+        return velocity
+
+    def save_user(self, user_id: int) -> Optional[List[_Ring]]:
+        """Copy of user_id's rings (None if it has none), for restore_user()"""
+        with self._lock:
+            return copy.deepcopy(self._users.get(user_id))
+
+    def restore_user(self, user_id: int, rings: Optional[List[_Ring]]):
+        """Put back rings saved by save_user()"""
+        with self._lock:
+            if rings is None:
+                self._users.pop(user_id, None)
+            else:
+                self._users[user_id] = rings
+
+    def buckets(self) -> Iterator[Tuple[int, int, int, int, int, float]]:
+        """(user_id, window_seconds, slot, bucket, count, amount) rows for persisting"""
+        with self._lock:
+            rows = [
+                (user_id, window, *bucket)
+                for user_id, rings in self._users.items()
+                for window, ring in zip(VELOCITY_WINDOWS, rings)
+                for bucket in ring.buckets()
+            ]
+        return iter(rows)
+
+
+# SQLite-persisted mode: the same rings stored in transaction_velocity
+# (migration 9), one row per (user, window, slot). A slot holding an older
+# bucket is overwritten, the same bucket is added to, a newer one is kept.
+VELOCITY_UPSERT_SQL = '''
+    INSERT INTO transaction_velocity
+    (user_id, window_seconds, slot, bucket, transaction_count, amount_sum)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT (user_id, window_seconds, slot) DO UPDATE SET
+        transaction_count = CASE WHEN bucket = excluded.bucket
+                                 THEN transaction_count + excluded.transaction_count
+                                 ELSE excluded.transaction_count END,
+        amount_sum = CASE WHEN bucket = excluded.bucket
+                          THEN amount_sum + excluded.amount_sum
+                          ELSE excluded.amount_sum END,
+        bucket = excluded.bucket
+    WHERE excluded.bucket >= bucket
+'''
+
+
+def save_velocity(conn, counters: VelocityCounters):
+    """Merge the buckets of counters into transaction_velocity"""
+    conn.executemany(VELOCITY_UPSERT_SQL, counters.buckets())
+
+
+def load_velocity(conn, user_ids: List[int], now: Any = None) -> Dict[int, Dict[int, Dict[str, float]]]:
+    """Read the live window totals of user_ids from transaction_velocity (at most 240 rows per user)"""
+    placeholders = ','.join('?' * len(user_ids))
+    cursor = conn.execute(f'''
+        SELECT user_id, window_seconds, SUM(transaction_count), SUM(amount_sum)
+        FROM transaction_velocity
+        WHERE user_id IN ({placeholders})
+          AND bucket > ? / (window_seconds / ?) - ?
+        GROUP BY user_id, window_seconds
+    ''', (*user_ids, epoch_seconds(now), BUCKETS_PER_WINDOW, BUCKETS_PER_WINDOW))
+
+    velocities = {user_id: empty_velocity() for user_id in user_ids}
+    for user_id, window, count, amount in cursor:
+        if window in velocities[user_id]:
+            velocities[user_id][window] = {'count': count, 'amount': round(amount, 2)}
+    return velocities
+
+
+def recent_transactions(conn) -> Iterable[Tuple[int, str, float]]:
+    """(user_id, timestamp, amount) of every transaction inside the longest window"""
+    since = (datetime.utcnow() - timedelta(seconds=max(VELOCITY_WINDOWS))).strftime('%Y-%m-%d %H:%M:%S')
+    return conn.execute('''
+        SELECT user_id, timestamp, amount FROM transactions
+        WHERE timestamp >= ?
+        ORDER BY timestamp
+    ''', (since,))
+
+
+def rebuild_velocity(conn) -> int:
+    """Recompute transaction_velocity from the transactions table, returning the buckets written"""
+    counters = VelocityCounters()
+    for user_id, timestamp, amount in recent_transactions(conn):
+        counters.add(user_id, timestamp, amount)
+    conn.execute('DELETE FROM transaction_velocity')
+    return conn.executemany(VELOCITY_UPSERT_SQL, counters.buckets()).rowcount
@@ -0,0 +1,184 @@
+"""
+TrustAI Write-Behind Queue - Group-committed scoring side effects off the request path
+"""
+
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Any, Tuple
+import logging
+
+from src.unit_of_work import UnitOfWork
+
+logger = logging.getLogger(__name__)
+
+# Sentinel telling the writer thread to exit once everything before it is written
+_STOP = object()
+
+
+class WriteBehindQueue:
+    """
+    Accepts the scoring write calls (log_activity, store_trust_score, ...)
+    and unit-of-work groups, returns immediately and lets a background
+    thread persist them.
+
+    The writer takes everything queued (up to batch_size) and hands it to the
+    backend's apply_writes, so a burst of decisions costs one commit and one
+    fsync instead of two per decision. With max_delay_ms set, it also waits
+    that long after the first write of a batch for more to arrive, trading
+    latency for fewer commits under a steady trickle. When the queue holds
+    max_depth writes, callers block until the writer catches up. Writes are
+    visible to readers only after they are flushed, so history lags
+    decisions by one batch.
+    """
+
+    def __init__(self, database, batch_size: int = 200, max_depth: int = 10000, max_delay_ms: float = 0.0):
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+
+        self.db = database
+        self.batch_size = batch_size
+        self.max_delay_ms = max_delay_ms
+        self._queue = queue.Queue(maxsize=max_depth)
+        self._closed = False
+        # Makes the closed check and the put one step, so no write can be
+        # queued behind _STOP where nothing would drain it
+        self._submit_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'enqueued': 0,
+            'written': 0,
+            'batches': 0,
+            'failed_batches': 0,
+            'last_flush_ms': 0.0,
+            'max_flush_ms': 0.0,
+            'total_flush_ms': 0.0
+        }
+        self._thread = threading.Thread(target=self._run, name='trustai-write-behind', daemon=True)
+        self._thread.start()
+
+    # Queued write methods, same signatures as Database
+    def log_activity(self, user_id: int, action_type: str, trust_result: Dict[str, Any], context: Dict[str, Any]):
+        """Queue an activity log entry"""
+        self._submit('log_activity', (user_id, action_type, trust_result, context))
+
+    def log_transaction(self, user_id: int, amount: float, merchant: str,
+                        transaction_type: str, trust_score: float, risk_level: str, timestamp: datetime = None):
+        """Queue a transactions row"""
+        self._submit(
+            'log_transaction',
+            (user_id, amount, merchant, transaction_type, trust_score, risk_level, timestamp)
+        )
+
+    def store_trust_score(self, user_id: int, result: Dict[str, Any]):
+        """Queue a trust score (and the users.trust_score update)"""
+        self._submit('store_trust_score', (user_id, result))
+
+    def store_device_fingerprint(self, user_id: int, fingerprint: str):
+        """Queue a device fingerprint upsert"""
+        self._submit('store_device_fingerprint', (user_id, fingerprint))
+
+    def store_user_location(self, user_id: int, ip_address: str, location_data: Dict[str, Any]):
+        """Queue a user location upsert"""
+        self._submit('store_user_location', (user_id, ip_address, location_data))
+
+    def apply_writes(self, writes: List[Tuple[str, tuple]]):
+        """Queue a group of writes that must be committed together"""
+        self._submit('apply_writes', (writes,))
+
+    def unit_of_work(self) -> UnitOfWork:
+        """Collect the writes for one decision and queue them as one group"""
+        return UnitOfWork(self)
+
+    def _submit(self, method: str, args: tuple):
+        with self._submit_lock:
+            closed = self._closed
+            if not closed:
+                # Blocks while the queue is full; the writer keeps draining it
+                self._queue.put((method, args))
+        if closed:
+            # Shutting down: nothing will drain the queue any more
+            getattr(self.db, method)(*args)
+            return
+
+        with self._stats_lock:
+            self._stats['enqueued'] += 1
+
+    def flush(self):
+        """Block until every write queued so far has been committed"""
+        self._queue.join()
+
+    def close(self):
+        """Write everything still queued and stop the writer thread"""
+        with self._submit_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(_STOP)
+        self._thread.join()
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth, throughput and flush latency counters"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        total_flush_ms = stats.pop('total_flush_ms')
+        batches = stats['batches']
+        stats.update({
+            'depth': self._queue.qsize(),
+            'batch_size': self.batch_size,
+            'max_delay_ms': self.max_delay_ms,
+            'avg_batch_size': round(stats['written'] / batches, 2) if batches else 0.0,
+            'avg_flush_ms': round(total_flush_ms / batches, 3) if batches else 0.0,
+            'running': self._thread.is_alive()
+        })
+        return stats
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch: List[Tuple[str, tuple]] = []
+            item = self._queue.get()
+            # Group commit: take whatever else arrives until the batch is full
+            # or max_delay_ms after its first write
+            deadline = time.monotonic() + self.max_delay_ms / 1000
+            while item is not _STOP:
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    remaining = deadline - time.monotonic()
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            stopping = item is _STOP
+
+            if batch:
+                self._write(batch)
+            for _ in range(len(batch) + stopping):
+                self._queue.task_done()
+
+    def _write(self, batch: List[Tuple[str, tuple]]):
+        started = time.monotonic()
+        failed = False
+        try:
+            self.db.apply_writes(batch)
+        except Exception as e:
+            # One bad row must not lose the batch: retry each write on its own,
+            # the Database methods log and skip individual failures
+            logger.warning(f"Group commit of {len(batch)} writes failed, writing individually: {str(e)}")
+            failed = True
+            for method, args in batch:
+                try:
+                    getattr(self.db, method)(*args)
+                except Exception as e:
+                    logger.error(f"Write-behind {method} error: {str(e)}")
+
+        elapsed_ms = (time.monotonic() - started) * 1000
+        with self._stats_lock:
+            self._stats['written'] += len(batch)
+            self._stats['batches'] += 1
+            self._stats['failed_batches'] += failed
+            self._stats['last_flush_ms'] = round(elapsed_ms, 3)
+            self._stats['max_flush_ms'] = round(max(self._stats['max_flush_ms'], elapsed_ms), 3)
+            self._stats['total_flush_ms'] += elapsed_ms
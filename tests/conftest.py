@@ -0,0 +1,41 @@
+"""
+Shared fixtures: every storage backend behind the TrustStore API
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.database import Database
+from src.memory_backend import InMemoryDatabase
+from src.sqlalchemy_backend import SQLAlchemyDatabase, metadata
+from src.sqlalchemy_migrations import schema_version
+
+# Set to a throwaway PostgreSQL database (its tables are dropped after each
+# test) to run the store tests against PostgreSQL as well
+POSTGRES_URL = os.getenv('TRUSTAI_TEST_POSTGRES_URL')
+
+BACKENDS = ['sqlite', 'sqlalchemy', 'memory'] + (['postgresql'] if POSTGRES_URL else [])
+
+
+def make_store(backend: str, tmp_path):
+    if backend == 'sqlite':
+        return Database(str(tmp_path / 'trustai.db'))
+    if backend == 'sqlalchemy':
+        return SQLAlchemyDatabase(f"sqlite:///{tmp_path / 'trustai_sa.db'}")
+    if backend == 'postgresql':
+        return SQLAlchemyDatabase(POSTGRES_URL)
+    return InMemoryDatabase()
+
+
+@pytest.fixture(params=BACKENDS)
+def store(request, tmp_path):
+    store = make_store(request.param, tmp_path)
+    yield store
+    if request.param == 'postgresql':
+        metadata.drop_all(store.engine)
+        schema_version.drop(store.engine, checkfirst=True)
+    store.close()
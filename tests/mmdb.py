@@ -0,0 +1,105 @@
+"""
+Minimal MaxMind DB (.mmdb) writer for IPv4 test fixtures
+
+Implements just enough of the MaxMind DB format 2.0 spec to write a small
+City-style database: a 24-bit record search tree, maps, strings, doubles,
+unsigned integers and arrays.
+"""
+
+import ipaddress
+import struct
+import time
+from typing import Any, Dict, Iterable, Tuple
+
+METADATA_MARKER = b'\xab\xcd\xefMaxMind.com'
+
+# Data section type numbers
+_STRING, _DOUBLE, _UINT16, _UINT32, _MAP = 2, 3, 5, 6, 7
+_UINT64, _ARRAY = 9, 11
+
+
+class _Uint:
+    """An unsigned integer of a given type; the C reader checks metadata integer types"""
+
+    def __init__(self, value: int, type_: int):
+        self.value, self.type = value, type_
+
+
+def _control(type_: int, size: int) -> bytes:
+    if size < 29:
+        head, extra = size, b''
+    elif size < 285:
+        head, extra = 29, bytes([size - 29])
+    else:
+        head, extra = 30, (size - 285).to_bytes(2, 'big')
+    if type_ > 7:
+        return bytes([head]) + bytes([type_ - 7]) + extra
+    return bytes([(type_ << 5) | head]) + extra
+
+
+def _encode(value: Any) -> bytes:
+    if isinstance(value, dict):
+        return _control(_MAP, len(value)) + b''.join(_encode(str(k)) + _encode(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return _control(_ARRAY, len(value)) + b''.join(_encode(item) for item in value)
+    if isinstance(value, str):
+        data = value.encode('utf-8')
+        return _control(_STRING, len(data)) + data
+    if isinstance(value, float):
+        return _control(_DOUBLE, 8) + struct.pack('>d', value)
+    if isinstance(value, int):
+        value = _Uint(value, _UINT32 if value < 2 ** 32 else _UINT64)
+    if isinstance(value, _Uint):
+        data = value.value.to_bytes((value.value.bit_length() + 7) // 8, 'big')
+        return _control(value.type, len(data)) + data
+    raise TypeError(f"Cannot encode {type(value).__name__}")
+
+
+def write_mmdb(path, networks: Iterable[Tuple[str, Dict[str, Any]]], database_type: str = 'GeoLite2-City'):
+    """Write an IPv4 database mapping each network ('8.8.8.0/24') to its record"""
+    # Binary trie over the network bits; a leaf is the record's data offset
+    root = [None, None]
+    data = b''
+    for network, record in networks:
+        network = ipaddress.IPv4Network(network)
+        bits = format(int(network.network_address), '032b')[:network.prefixlen]
+        offset, data = len(data), data + _encode(record)
+        node = root
+        for bit in bits[:-1]:
+            if not isinstance(node[int(bit)], list):
+                node[int(bit)] = [None, None]
+            node = node[int(bit)]
+        node[int(bits[-1])] = offset
+
+    # Number the nodes breadth first, the root being node 0
+    nodes, queue = [], [root]
+    while queue:
+        node = queue.pop(0)
+        nodes.append(node)
+        queue.extend(child for child in node if isinstance(child, list))
+    ids = {id(node): number for number, node in enumerate(nodes)}
+    node_count = len(nodes)
+
+    def record(child) -> bytes:
+        if child is None:
+            value = node_count                       # no data
+        elif isinstance(child, list):
+            value = ids[id(child)]
+        else:
+            value = node_count + 16 + child          # pointer into the data section
+        return value.to_bytes(3, 'big')
+
+    tree = b''.join(record(left) + record(right) for left, right in nodes)
+    metadata = {
+        'node_count': _Uint(node_count, _UINT32),
+        'record_size': _Uint(24, _UINT16),
+        'ip_version': _Uint(4, _UINT16),
+        'database_type': database_type,
+        'languages': ['en'],
+        'binary_format_major_version': _Uint(2, _UINT16),
+        'binary_format_minor_version': _Uint(0, _UINT16),
+        'build_epoch': _Uint(int(time.time()), _UINT64),
+        'description': {'en': 'TrustAI test fixture'},
+    }
+    with open(path, 'wb') as f:
+        f.write(tree + b'\x00' * 16 + data + METADATA_MARKER + _encode(metadata))
@@ -0,0 +1,88 @@
+"""
+Running transaction amount statistics and their quantile sketch
+"""
+
+import math
+
+import numpy as np
+import pytest
+
+from src.amount_stats import AmountStats, add_amount, amount_bucket, bucket_amount
+
+AMOUNTS = [12.5, 40.0, 7.25, 300.0, 55.0, 18.0, 18.0, 1250.0, 0.5, 99.99]
+
+
+def stats_of(amounts) -> AmountStats:
+    stats = AmountStats()
+    for amount in amounts:
+        stats.add(amount)
+    return stats
+
+
+def test_mean_and_variance():
+    stats = stats_of(AMOUNTS)
+
+    assert stats.count == len(AMOUNTS)
+    assert stats.mean == pytest.approx(np.mean(AMOUNTS))
+    assert stats.variance == pytest.approx(np.var(AMOUNTS, ddof=1))
+    assert stats.std == pytest.approx(np.std(AMOUNTS, ddof=1))
+
+
+def test_merge_equals_sequential_adds():
+    merged = stats_of(AMOUNTS[:4])
+    merged.merge(stats_of(AMOUNTS[4:]))
+    merged.merge(AmountStats())
+    sequential = stats_of(AMOUNTS)
+
+    assert merged.count == sequential.count
+    assert merged.mean == pytest.approx(sequential.mean)
+    assert merged.m2 == pytest.approx(sequential.m2)
+    assert merged.buckets == sequential.buckets
+
+
+def test_copy_is_independent():
+    stats = stats_of(AMOUNTS)
+    copy = stats.copy()
+    copy.add(10.0)
+
+    assert (stats.count, copy.count) == (len(AMOUNTS), len(AMOUNTS) + 1)
+    assert sum(stats.buckets.values()) == len(AMOUNTS)
+
+
+def test_z_score():
+    assert AmountStats().z_score(100.0) == 0.0
+
+    flat = stats_of([20.0, 20.0])
+    assert flat.z_score(20.0) == 0.0
+    assert flat.z_score(25.0) == math.inf
+    assert flat.z_score(15.0) == -math.inf
+
+    stats = stats_of(AMOUNTS)
+    assert stats.z_score(500.0) == pytest.approx((500.0 - np.mean(AMOUNTS)) / np.std(AMOUNTS, ddof=1))
+
+
+def test_buckets_are_within_growth_factor():
+    for amount in (1.0, 7.25, 99.99, 12345.0):
+        assert bucket_amount(amount_bucket(amount)) == pytest.approx(amount, rel=0.25)
+    assert amount_bucket(0.5) == 0
+
+
+def test_quantile_and_rank_are_approximate():
+    amounts = [float(amount) for amount in range(1, 1001)]
+    stats = stats_of(amounts)
+
+    for q in (0.5, 0.95, 0.99):
+        assert stats.quantile(q) == pytest.approx(np.quantile(amounts, q), rel=0.25)
+    assert stats.rank(500.0) == pytest.approx(0.5, abs=0.1)
+    assert stats.rank(0.1) < 0.01
+    assert stats.rank(5000.0) == 1.0
+    assert AmountStats().quantile(0.5) == AmountStats().rank(10.0) == 0.0
+
+
+def test_add_amount_groups_by_user():
+    stats = {}
+    for user_id, amount in ((1, 10.0), (2, 5.0), (1, 30.0)):
+        add_amount(stats, user_id, amount)
+
+    assert (stats[1].count, stats[1].mean) == (2, 20.0)
+    assert (stats[2].count, stats[2].mean) == (1, 5.0)
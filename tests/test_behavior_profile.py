@@ -0,0 +1,73 @@
+"""
+Incremental per-user behavior profiles
+"""
+
+import pytest
+
+from src.behavior_profile import MERCHANT_SLOTS, BehaviorProfile, merchant_changes, profile_activities
+
+ACTIVITIES = [
+    ('transaction', {'merchant': 'Amazon', 'amount': 20.0}),
+    ('transaction', {'merchant': 'Etsy', 'amount': 60.0}),
+    ('transaction', {'merchant': 'Amazon', 'amount': 10.0}),
+    ('login', {}),
+]
+
+
+def profile_of(activities) -> BehaviorProfile:
+    profile = BehaviorProfile()
+    for action_type, context in activities:
+        profile.add(action_type, context)
+    return profile
+
+
+def test_add():
+    profile = profile_of(ACTIVITIES)
+
+    assert profile.activity_count == 4
+    assert profile.action_counts == {'transaction': 3, 'login': 1}
+    assert profile.merchant_counts == {'Amazon': 2, 'Etsy': 1}
+    assert (profile.amount_count, profile.amount_max) == (3, 60.0)
+    assert profile.amount_mean == pytest.approx(30.0)
+
+
+def test_merge_equals_sequential_adds():
+    merged = profile_of(ACTIVITIES[:2])
+    merged.merge(profile_of(ACTIVITIES[2:]))
+    merged.merge(BehaviorProfile())
+
+    sequential = profile_of(ACTIVITIES)
+    assert merged.amount_mean == pytest.approx(sequential.amount_mean)
+    merged.amount_mean = sequential.amount_mean
+    assert vars(merged) == vars(sequential)
+
+
+def test_merchant_slots_evict_the_least_seen():
+    profile = BehaviorProfile()
+    for slot in range(MERCHANT_SLOTS):
+        for _ in range(slot + 1):
+            profile.add('transaction', {'merchant': f'm{slot:02d}'})
+    profile.add('transaction', {'merchant': 'newcomer'})
+
+    assert len(profile.merchant_counts) == MERCHANT_SLOTS
+    assert 'm00' not in profile.merchant_counts
+    # The newcomer inherits the evicted count (space-saving), so counts never undercount
+    assert profile.merchant_counts['newcomer'] == 2
+
+
+def test_profile_activities_streams_through():
+    activities = [(user_id, action_type, {}, context) for user_id, (action_type, context) in zip((1, 2, 1, 1), ACTIVITIES)]
+    profiles = {}
+
+    assert list(profile_activities(activities, profiles)) == activities
+    assert profiles[1].activity_count == 3
+    assert profiles[2].merchant_counts == {'Etsy': 1}
+
+
+def test_merchant_changes():
+    assert merchant_changes({'Amazon': 2}, {'Amazon': 1, 'Etsy': 1}) == ({'Amazon': 3, 'Etsy': 1}, [])
+
+    full = {f'm{slot:02d}': slot + 1 for slot in range(MERCHANT_SLOTS)}
+    changed, evicted = merchant_changes(full, {'newcomer': 3, 'm15': 1})
+    assert changed == {'newcomer': 4, 'm15': 17}
+    assert evicted == ['m00']
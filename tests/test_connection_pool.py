@@ -0,0 +1,85 @@
+"""
+Bounded SQLite connection pool
+"""
+
+import threading
+
+import pytest
+
+from src.connection_pool import ConnectionPool, PoolTimeoutError
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool(str(tmp_path / 'pool.db'), max_size=2, timeout=0.05)
+    conn = pool.acquire()
+    conn.execute('CREATE TABLE items (value INTEGER)')
+    conn.commit()
+    conn.close()
+    yield pool
+    pool.close_all()
+
+
+def test_close_returns_connection_to_pool(pool):
+    conn = pool.acquire()
+    conn.close()
+
+    assert pool.acquire() is conn
+    conn.execute('SELECT 1')   # still open
+    stats = pool.stats()
+    assert (stats['created'], stats['reused'], stats['idle'], stats['in_use']) == (1, 2, 0, 1)
+
+
+def test_double_close_is_harmless(pool):
+    conn = pool.acquire()
+    conn.close()
+    conn.close()
+
+    assert pool.stats()['idle'] == 1
+
+
+def test_size_limit(pool):
+    first, second = pool.acquire(), pool.acquire()
+    assert first is not second
+
+    with pytest.raises(PoolTimeoutError):
+        pool.acquire()
+    assert pool.stats()['size'] == 2
+    assert pool.stats()['timeouts'] == 1
+
+    # A waiting borrower gets the connection as soon as it is released
+    threading.Timer(0.01, second.close).start()
+    assert pool.acquire(timeout=5) is second
+    first.close()
+
+
+def test_release_rolls_back_open_transaction(pool):
+    conn = pool.acquire()
+    conn.execute('INSERT INTO items VALUES (1)')
+    assert conn.in_transaction
+    conn.close()
+
+    reused = pool.acquire()
+    assert reused is conn
+    assert not reused.in_transaction
+    assert reused.execute('SELECT COUNT(*) FROM items').fetchone()[0] == 0
+    reused.close()
+
+
+def test_setup_hooks_run_on_new_connections(pool):
+    pool.add_setup_hook(lambda conn: conn.execute('PRAGMA user_version = 7'))
+    pool.recycle_idle()
+
+    conn = pool.acquire()
+    assert conn.execute('PRAGMA user_version').fetchone()[0] == 7
+    conn.close()
+
+
+def test_closed_pool_closes_released_connections(pool):
+    conn = pool.acquire()
+    pool.close_all()
+
+    with pytest.raises(PoolTimeoutError):
+        pool.acquire()
+    conn.close()
+    assert pool.stats()['size'] == 0
@@ -0,0 +1,67 @@
+"""
+Shared factor input pool with per-factor deadlines
+"""
+
+import threading
+
+import pytest
+
+from src.factor_pool import FactorPool, parse_deadlines
+
+
+@pytest.fixture
+def pool():
+    pool = FactorPool(max_workers=4, default_deadline_ms=1000.0, deadlines_ms={'fast': 20.0})
+    yield pool
+    pool.close()
+
+
+def test_parse_deadlines():
+    assert parse_deadlines('device=20, geo = 80.5,,bad') == {'device': 20.0, 'geo': 80.5}
+    assert parse_deadlines('') == {}
+
+
+def test_deadlines(pool):
+    assert (pool.deadline_ms('fast'), pool.deadline_ms('other')) == (20.0, 1000.0)
+
+
+def test_gather(pool):
+    loads = {'user': lambda: {'id': 1}, 'devices': lambda: 2}
+    loaded, timed_out = pool.gather(loads, {'device': ['user', 'devices'], 'account': ['user', 'unknown']})
+
+    assert loaded == {'user': {'id': 1}, 'devices': 2}
+    assert timed_out == []
+
+
+def test_missed_deadline_only_affects_its_factor(pool):
+    release = threading.Event()
+
+    def slow():
+        release.wait(0.2)
+        return 'slow'
+
+    # 'fast' gives up on the shared load after 20 ms; 'slow_factor' waits its full second for it
+    loaded, timed_out = pool.gather({'shared': slow, 'other': lambda: 1},
+                                    {'fast': ['other', 'shared'], 'slow_factor': ['shared']})
+
+    assert timed_out == ['fast']
+    assert loaded == {'other': 1, 'shared': 'slow'}
+    assert pool.stats()['timeouts'] == {'fast': 1}
+
+
+def test_load_errors_propagate(pool):
+    def broken():
+        raise ValueError('no connection')
+
+    with pytest.raises(ValueError, match='no connection'):
+        pool.gather({'broken': broken}, {'device': ['broken']})
+
+
+def test_stats(pool):
+    pool.gather({'user': lambda: 1}, {'device': ['user']})
+    pool.gather({'user': lambda: 1}, {'device': ['user']})
+
+    assert pool.stats() == {
+        'max_workers': 4, 'evaluations': 2, 'timeouts': {},
+        'default_deadline_ms': 1000.0, 'deadlines_ms': {'fast': 20.0}
+    }
@@ -0,0 +1,104 @@
+"""
+GeoIPLocator against a small generated City database
+"""
+
+import pytest
+
+from src.geoip import GeoIPLocator
+
+from mmdb import write_mmdb
+
+MOUNTAIN_VIEW = {
+    'city': {'names': {'en': 'Mountain View'}},
+    'country': {'iso_code': 'US', 'names': {'en': 'United States'}},
+    'location': {'latitude': 37.386, 'longitude': -122.0838},
+}
+LONDON = {
+    'city': {'names': {'en': 'London'}},
+    'country': {'iso_code': 'GB', 'names': {'en': 'United Kingdom'}},
+    'location': {'latitude': 51.5142, 'longitude': -0.0931},
+}
+# Country-level record: no coordinates to score against
+NO_LOCATION = {'country': {'iso_code': 'FR', 'names': {'en': 'France'}}}
+
+
+@pytest.fixture
+def city_db(tmp_path):
+    path = tmp_path / 'GeoLite2-City.mmdb'
+    write_mmdb(path, [
+        ('8.8.8.0/24', MOUNTAIN_VIEW),
+        ('81.2.69.0/24', LONDON),
+        ('90.0.0.0/8', NO_LOCATION),
+    ])
+    return str(path)
+
+
+@pytest.fixture
+def locator(city_db):
+    locator = GeoIPLocator(city_db, cache_size=2)
+    yield locator
+    locator.close()
+
+
+def test_lookup(locator):
+    assert locator.enabled
+    assert locator.lookup('8.8.8.8') == {
+        'latitude': 37.386, 'longitude': -122.0838, 'city': 'Mountain View', 'country': 'US'
+    }
+    assert locator.lookup('81.2.69.160')['city'] == 'London'
+
+
+@pytest.mark.parametrize('ip_address', ['10.0.0.1', '192.168.1.20', '127.0.0.1', '1.1.1.1', '90.1.2.3', 'not-an-ip', '2001:db8::1'])
+def test_unknown_addresses(locator, ip_address):
+    # Private, unlisted, located without coordinates, invalid, or IPv6 in an IPv4 database
+    assert locator.lookup(ip_address) is None
+
+
+def test_cache_stats(locator):
+    locator.lookup('8.8.8.8')
+    locator.lookup('8.8.8.8')
+    locator.lookup('10.0.0.1')
+    locator.lookup('10.0.0.1')
+
+    stats = locator.stats()
+    assert (stats['cache_hits'], stats['cache_misses'], stats['cache_size']) == (2, 2, 2)
+
+    # Bounded: the least recently used address is evicted
+    locator.lookup('81.2.69.1')
+    locator.lookup('8.8.8.8')
+    stats = locator.stats()
+    assert (stats['cache_misses'], stats['cache_size'], stats['cache_max_size']) == (4, 2, 2)
+
+
+def test_cached_results_are_shared(locator):
+    assert locator.lookup('8.8.8.8') is locator.lookup('8.8.8.8')
+
+
+def test_missing_database(tmp_path):
+    locator = GeoIPLocator(str(tmp_path / 'missing.mmdb'))
+
+    assert not locator.enabled
+    assert locator.lookup('8.8.8.8') is None
+    assert locator.stats()['enabled'] is False
+
+
+def test_no_database_configured():
+    assert GeoIPLocator().lookup('8.8.8.8') is None
+
+
+def test_rejects_non_city_database(tmp_path):
+    path = tmp_path / 'GeoLite2-ASN.mmdb'
+    write_mmdb(path, [('8.8.8.0/24', {'autonomous_system_number': 15169})], database_type='GeoLite2-ASN')
+
+    locator = GeoIPLocator(str(path))
+    assert not locator.enabled
+    assert locator.lookup('8.8.8.8') is None
+
+
+def test_close(locator):
+    locator.lookup('8.8.8.8')
+    locator.close()
+
+    assert not locator.enabled
+    assert locator.stats()['cache_size'] == 0
+    assert locator.lookup('8.8.8.8') is None
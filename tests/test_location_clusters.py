@@ -0,0 +1,58 @@
+"""
+Incremental per-user location clustering
+"""
+
+import pytest
+
+from src.geo import haversine_km
+from src.location_clusters import CLUSTER_RADIUS_KM, MAX_CLUSTERS_PER_USER, update_clusters
+
+BERLIN = (52.5200, 13.4050)
+POTSDAM = (52.3906, 13.0645)     # about 27 km from Berlin
+SPANDAU = (52.5350, 13.2000)     # about 14 km from Berlin
+
+
+def test_first_point_starts_a_cluster():
+    clusters = []
+    cluster, evicted = update_clusters(clusters, *BERLIN, '2026-10-14 09:00:00')
+
+    assert clusters == [cluster]
+    assert evicted is None
+    assert cluster == {'id': None, 'latitude': BERLIN[0], 'longitude': BERLIN[1],
+                       'radius_km': 0.0, 'weight': 1, 'last_seen': '2026-10-14 09:00:00'}
+
+
+def test_nearby_point_joins():
+    clusters = []
+    update_clusters(clusters, *BERLIN, '2026-10-14 09:00:00', weight=3)
+    cluster, evicted = update_clusters(clusters, *SPANDAU, '2026-10-14 10:00:00')
+
+    assert len(clusters) == 1 and evicted is None
+    assert cluster['weight'] == 4
+    assert cluster['last_seen'] == '2026-10-14 10:00:00'
+    # Weighted centroid, with a radius that still covers both points
+    assert cluster['latitude'] == pytest.approx(BERLIN[0] + (SPANDAU[0] - BERLIN[0]) / 4)
+    for point in (BERLIN, SPANDAU):
+        assert float(haversine_km(cluster['latitude'], cluster['longitude'], *point)) <= cluster['radius_km'] + 1e-6
+    assert cluster['radius_km'] <= CLUSTER_RADIUS_KM
+
+
+def test_distant_point_starts_a_new_cluster():
+    clusters = []
+    update_clusters(clusters, *BERLIN, '2026-10-14 09:00:00')
+    cluster, _ = update_clusters(clusters, *POTSDAM, '2026-10-14 10:00:00')
+
+    assert len(clusters) == 2
+    assert (cluster['latitude'], cluster['weight']) == (POTSDAM[0], 1)
+
+
+def test_evicts_the_lightest_oldest_cluster():
+    clusters = []
+    for n in range(MAX_CLUSTERS_PER_USER):
+        update_clusters(clusters, 10.0 * n, 0.0, f'2026-10-{10 + n} 00:00:00', weight=1 if n in (2, 5) else 5)
+
+    cluster, evicted = update_clusters(clusters, -45.0, 0.0, '2026-10-30 00:00:00')
+
+    assert len(clusters) == MAX_CLUSTERS_PER_USER
+    assert evicted['latitude'] == 20.0
+    assert cluster in clusters and evicted not in clusters
@@ -0,0 +1,164 @@
+"""
+SQLite schema migrations: upgrading existing databases and running each version once
+"""
+
+import sqlite3
+
+import pytest
+
+import maintenance
+from src import database
+from src.database import Database
+from src.migrations import MIGRATIONS, Migration, MigrationError, get_schema_version, run_migrations
+
+LATEST = MIGRATIONS[-1].version
+
+
+def baseline_schema(path: str, monkeypatch, copies: int = 3):
+    """
+    A database as the baseline release left it (the core tables, no indexes
+    or schema_version) holding copies rows of one device and one location
+    """
+    with monkeypatch.context() as patch:
+        patch.setattr(database, 'run_migrations', lambda conn: [])
+        Database(path).close()
+
+    conn = sqlite3.connect(path)
+    conn.execute("INSERT INTO users (username, email, password_hash) VALUES ('alice', 'alice@example.com', 'hash')")
+    for seen in ('2026-01-01 00:00:00', '2026-01-03 00:00:00', '2026-01-02 00:00:00')[:copies]:
+        conn.execute(
+            "INSERT INTO device_fingerprints (user_id, fingerprint, first_seen, last_seen) VALUES (1, 'fp', ?, ?)",
+            (seen, seen)
+        )
+        conn.execute(
+            "INSERT INTO user_locations (user_id, ip_address, first_seen, last_seen) VALUES (1, '203.0.113.7', ?, ?)",
+            (seen, seen)
+        )
+    conn.commit()
+    conn.close()
+
+
+def describe(path: str):
+    """Tables, indexes and triggers with their columns, to compare two schemas"""
+    conn = sqlite3.connect(path)
+    try:
+        objects = conn.execute(
+            "SELECT type, name, tbl_name FROM sqlite_master WHERE name NOT LIKE 'sqlite_%' ORDER BY name"
+        ).fetchall()
+        columns = {
+            name: conn.execute(f'PRAGMA table_info({name})').fetchall()
+            for kind, name, _ in objects if kind == 'table'
+        }
+        return objects, columns
+    finally:
+        conn.close()
+
+
+def versions(db: Database):
+    conn = db.get_connection()
+    try:
+        return [row[0] for row in conn.execute('SELECT version FROM schema_version ORDER BY version')]
+    finally:
+        conn.close()
+
+
+def test_fresh_database_is_at_latest_version(tmp_path):
+    db = Database(str(tmp_path / 'fresh.db'))
+
+    assert versions(db) == list(range(1, LATEST + 1))
+    db.close()
+
+
+def test_duplicates_stop_the_upgrade(tmp_path, monkeypatch):
+    path = str(tmp_path / 'old.db')
+    baseline_schema(path, monkeypatch)
+
+    with pytest.raises(MigrationError, match="python maintenance.py merge-duplicates"):
+        Database(path)
+
+    # Migrations before the unique indexes stay applied; the failed one left nothing behind
+    conn = sqlite3.connect(path)
+    try:
+        assert get_schema_version(conn) == 6
+        columns = [row[1] for row in conn.execute('PRAGMA table_info(device_fingerprints)')]
+        assert 'seen_count' not in columns
+        assert conn.execute('SELECT COUNT(*) FROM device_fingerprints').fetchone()[0] == 3
+    finally:
+        conn.close()
+
+
+def test_upgrades_baseline_schema_after_merging_duplicates(tmp_path, monkeypatch):
+    path = str(tmp_path / 'old.db')
+    baseline_schema(path, monkeypatch)
+    with pytest.raises(MigrationError):
+        Database(path)
+
+    maintenance.merge_duplicates(path)
+    maintenance.merge_duplicates(path)   # nothing left to merge
+    db = Database(path)
+    Database(str(tmp_path / 'fresh.db')).close()
+    assert versions(db) == list(range(1, LATEST + 1))
+    assert describe(path) == describe(str(tmp_path / 'fresh.db'))
+
+    # Duplicates were merged into the oldest row
+    [device] = db.get_user_devices(1, days=100000)
+    assert device['seen_count'] == 3
+    assert (device['first_seen'], device['last_seen']) == ('2026-01-01 00:00:00', '2026-01-03 00:00:00')
+    [location] = db.get_user_locations(1, days=100000)
+    assert location['seen_count'] == 3
+
+    # The upserts hit the unique indexes
+    db.store_device_fingerprint(1, 'fp')
+    assert db.get_user_devices(1, days=100000)[0]['seen_count'] == 4
+    db.close()
+
+
+def test_migrations_run_once(tmp_path):
+    db = Database(str(tmp_path / 'trustai.db'))
+    conn = db.get_connection()
+    try:
+        assert run_migrations(conn) == []
+        assert get_schema_version(conn) == LATEST
+    finally:
+        conn.close()
+
+    db.close()
+    db = Database(str(tmp_path / 'trustai.db'))
+    assert versions(db) == list(range(1, LATEST + 1))
+    db.close()
+
+
+def test_backfills_are_announced(tmp_path, monkeypatch, caplog):
+    path = str(tmp_path / 'old.db')
+    baseline_schema(path, monkeypatch, copies=1)
+
+    Database(path).close()
+    assert 'python maintenance.py rebuild-activity-hours' in caplog.text
+    assert 'rebuild-device-index' in caplog.text
+
+
+def test_failed_migration_rolls_back(tmp_path):
+    db = Database(str(tmp_path / 'trustai.db'))
+
+    def fail(conn):
+        raise RuntimeError('boom')
+
+    broken = Migration(LATEST + 1, 'Broken', ['CREATE TABLE half_done (id INTEGER)', fail])
+    conn = db.get_connection()
+    try:
+        with pytest.raises(RuntimeError, match='boom'):
+            run_migrations(conn, MIGRATIONS + [broken])
+        assert get_schema_version(conn) == LATEST
+        assert conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE name = 'half_done'").fetchone()[0] == 0
+    finally:
+        conn.close()
+    db.close()
+
+
+def test_init_errors_propagate(tmp_path, monkeypatch):
+    def fail(conn):
+        raise RuntimeError('boom')
+
+    monkeypatch.setattr(database, 'run_migrations', fail)
+    with pytest.raises(RuntimeError, match='boom'):
+        Database(str(tmp_path / 'trustai.db'))
@@ -0,0 +1,132 @@
+"""
+Score factor summaries and their TTL cache
+"""
+
+import threading
+
+from src.database import Database
+from src.score_factors import ScoreFactorCache, location_trust, score_factors
+
+
+def counting_loader(calls):
+    def load(user_id):
+        calls.append(user_id)
+        return {'user_id': user_id, 'load': len(calls)}
+    return load
+
+
+def test_location_trust():
+    assert [location_trust(n) for n in (0, 1, 3, 4, 20)] == [30.0, 70.0, 90.0, 90.0, 90.0]
+
+
+def test_score_factor_defaults():
+    assert score_factors(None, 0, None, None, 0) == {
+        'device_trust': 50.0, 'location_trust': 30.0, 'behavior_trust': 70.0,
+        'account_age_days': 0, 'verification_status': False
+    }
+    factors = score_factors(61.234, 2, 88.888, 12.9, 1)
+    assert (factors['device_trust'], factors['location_trust'], factors['behavior_trust']) == (61.23, 80.0, 88.89)
+    assert (factors['account_age_days'], factors['verification_status']) == (12, True)
+
+
+def test_hits_and_misses():
+    cache, calls = ScoreFactorCache(ttl_seconds=60), []
+    load = counting_loader(calls)
+
+    assert cache.get_or_load(1, load) == cache.get_or_load(1, load) == {'user_id': 1, 'load': 1}
+    cache.get_or_load(2, load)
+
+    stats = cache.stats()
+    assert (stats['cache_hits'], stats['cache_misses'], stats['cache_size']) == (1, 2, 2)
+    assert calls == [1, 2]
+
+
+def test_returns_copies():
+    cache = ScoreFactorCache(ttl_seconds=60)
+    cache.get_or_load(1, counting_loader([]))['load'] = 99
+
+    assert cache.get_or_load(1, counting_loader([]))['load'] == 1
+
+
+def test_zero_ttl_disables_caching():
+    cache, calls = ScoreFactorCache(ttl_seconds=0), []
+    cache.get_or_load(1, counting_loader(calls))
+    cache.get_or_load(1, counting_loader(calls))
+
+    assert calls == [1, 1]
+    assert cache.stats()['cache_size'] == 0
+
+
+def test_invalidate():
+    cache, calls = ScoreFactorCache(ttl_seconds=60), []
+    load = counting_loader(calls)
+    cache.get_or_load(1, load)
+    cache.invalidate([1])
+
+    assert cache.get_or_load(1, load)['load'] == 2
+    assert cache.stats()['invalidations'] == 1
+
+
+def test_load_overlapping_an_invalidation_is_not_cached():
+    cache, calls = ScoreFactorCache(ttl_seconds=60), []
+    loading, invalidated = threading.Event(), threading.Event()
+
+    def slow_load(user_id):
+        loading.set()
+        invalidated.wait(5)
+        return counting_loader(calls)(user_id)
+
+    reader = threading.Thread(target=cache.get_or_load, args=(1, slow_load))
+    reader.start()
+    loading.wait(5)
+    cache.invalidate([1])
+    invalidated.set()
+    reader.join(5)
+
+    assert cache.stats()['cache_size'] == 0
+    assert cache.get_or_load(1, counting_loader(calls))['load'] == 2
+
+
+def test_deferred_invalidates_only_when_applied():
+    cache = ScoreFactorCache(ttl_seconds=60)
+    cache.get_or_load(1, counting_loader([]))
+
+    with cache.deferred() as pending:
+        cache.invalidate([1])
+        with cache.deferred() as nested:
+            cache.invalidate([2])
+        assert nested is pending
+        assert cache.stats()['cache_size'] == 1
+    assert pending == {1, 2}
+
+    cache.invalidate(pending)
+    assert cache.stats()['cache_size'] == 0
+
+
+def test_evicts_least_recently_loaded():
+    cache, calls = ScoreFactorCache(ttl_seconds=60, max_size=2), []
+    load = counting_loader(calls)
+    for user_id in (1, 2, 3):
+        cache.get_or_load(user_id, load)
+
+    assert cache.stats()['cache_size'] == 2
+    cache.get_or_load(1, load)
+    assert calls == [1, 2, 3, 1]
+
+
+def test_clear():
+    cache = ScoreFactorCache(ttl_seconds=60)
+    cache.get_or_load(1, counting_loader([]))
+    cache.clear()
+
+    assert cache.stats()['cache_size'] == 0
+
+
+def test_single_writer_invalidates_after_commit(tmp_path):
+    db = Database(str(tmp_path / 'trustai.db'), single_writer=True)
+    user_id = db.create_user('alice', 'alice@example.com', 'hash')
+    assert not db.get_score_factors(user_id)['verification_status']
+
+    db.set_user_verified(user_id)
+    assert db.get_score_factors(user_id)['verification_status']
+    db.close()
@@ -0,0 +1,113 @@
+"""
+SQLAlchemy backend schema migrations: upgrading existing databases and failing loudly
+"""
+
+import pytest
+from sqlalchemy import MetaData, create_engine, inspect, select, text
+
+from src import sqlalchemy_migrations
+from src.migrations import Migration
+from src.sqlalchemy_backend import SQLAlchemyDatabase, metadata
+from src.sqlalchemy_migrations import SA_MIGRATIONS, schema_version
+
+LATEST = SA_MIGRATIONS[-1].version
+
+
+def first_schema(url: str):
+    """A database as the first SQLAlchemy backend left it: create_all of the core tables, no schema_version"""
+    engine = create_engine(url)
+    metadata.create_all(engine)
+    with engine.begin() as conn:
+        for table in ('user_activity_hours', 'user_location_clusters', 'user_behavior_profiles',
+                      'user_behavior_counts', 'user_amount_stats', 'user_amount_buckets',
+                      'device_fingerprint_components'):
+            conn.execute(text(f'DROP TABLE {table}'))
+        conn.execute(text('DROP INDEX uq_device_fingerprints_user_fingerprint'))
+        conn.execute(text('DROP INDEX uq_user_locations_user_ip'))
+        conn.execute(text('CREATE INDEX idx_device_fingerprints_user_fingerprint ON device_fingerprints (user_id, fingerprint)'))
+        conn.execute(text('CREATE INDEX idx_user_locations_user_ip ON user_locations (user_id, ip_address)'))
+        for table, column in (('device_fingerprints', 'seen_count'), ('user_locations', 'seen_count'),
+                              ('users', 'decayed_trust_score'), ('users', 'trust_score_weight'),
+                              ('users', 'trust_score_updated_at')):
+            conn.execute(text(f'ALTER TABLE {table} DROP COLUMN {column}'))
+
+        conn.execute(text("INSERT INTO users (username, email, password_hash) VALUES ('alice', 'alice@example.com', 'hash')"))
+        for seen in ('2026-01-01 00:00:00', '2026-01-03 00:00:00', '2026-01-02 00:00:00'):
+            conn.execute(text(
+                "INSERT INTO device_fingerprints (user_id, fingerprint, first_seen, last_seen) VALUES (1, 'fp', :seen, :seen)"
+            ), {'seen': seen})
+    engine.dispose()
+
+
+def describe(engine):
+    """Columns and indexes of every table, to compare two schemas"""
+    reflected = MetaData()
+    reflected.reflect(engine)
+    return {
+        name: (
+            sorted((column.name, str(column.type), column.nullable) for column in table.columns),
+            sorted((index.name, bool(index.unique)) for index in table.indexes)
+        )
+        for name, table in reflected.tables.items()
+    }
+
+
+def test_fresh_database_is_at_latest_version(tmp_path):
+    db = SQLAlchemyDatabase(f"sqlite:///{tmp_path / 'fresh.db'}")
+
+    assert sqlalchemy_migrations.get_schema_version(db.engine) == LATEST
+    assert set(metadata.tables) <= set(inspect(db.engine).get_table_names())
+
+
+def test_upgrades_first_schema_to_current(tmp_path):
+    url = f"sqlite:///{tmp_path / 'old.db'}"
+    first_schema(url)
+
+    db = SQLAlchemyDatabase(url)
+    fresh = SQLAlchemyDatabase(f"sqlite:///{tmp_path / 'fresh.db'}")
+    assert describe(db.engine) == describe(fresh.engine)
+
+    # Duplicate devices were merged before the unique index was built
+    [device] = db.get_user_devices(1, days=100000)
+    assert device['seen_count'] == 3
+    assert str(device['first_seen']).startswith('2026-01-01')
+    assert str(device['last_seen']).startswith('2026-01-03')
+
+    # The new columns work and the upserts hit the unique index
+    db.store_device_fingerprint(1, 'fp')
+    db.store_trust_score(1, {'score': 60.0, 'risk_factors': {}})
+    assert db.get_user_devices(1, days=100000)[0]['seen_count'] == 4
+    assert db.get_user(1)['decayed_trust_score'] == 60.0
+
+
+def test_migrations_run_once(tmp_path):
+    url = f"sqlite:///{tmp_path / 'trustai.db'}"
+    db = SQLAlchemyDatabase(url)
+
+    assert sqlalchemy_migrations.run_migrations(db.engine, metadata) == []
+    with db.engine.connect() as conn:
+        versions = [row.version for row in conn.execute(select(schema_version.c.version))]
+    assert versions == list(range(1, LATEST + 1))
+
+
+def test_backfills_are_announced(tmp_path, caplog):
+    url = f"sqlite:///{tmp_path / 'old.db'}"
+    first_schema(url)
+
+    SQLAlchemyDatabase(url)
+    assert 'rebuild-behavior-profiles' in caplog.text
+    assert 'rebuild-device-index' in caplog.text
+
+
+def test_init_errors_propagate(tmp_path, monkeypatch):
+    def fail(conn, metadata):
+        raise RuntimeError('boom')
+
+    failing = Migration(LATEST + 1, 'Broken', [fail])
+    monkeypatch.setattr(sqlalchemy_migrations, 'SA_MIGRATIONS', SA_MIGRATIONS + [failing])
+
+    with pytest.raises(RuntimeError, match='boom'):
+        SQLAlchemyDatabase(f"sqlite:///{tmp_path / 'trustai.db'}")
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'trustai.db'}")
+    assert sqlalchemy_migrations.get_schema_version(engine) == LATEST
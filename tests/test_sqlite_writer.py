@@ -0,0 +1,114 @@
+"""
+Single-writer thread: savepoint per command, errors on futures, draining on close
+"""
+
+import sqlite3
+import threading
+
+import pytest
+
+from src.database import Database
+from src.sqlite_writer import SQLiteWriter
+
+RESULT = {'score': 72.5, 'risk_level': 'low', 'decision': 'allow', 'risk_factors': {}}
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = str(tmp_path / 'writer.db')
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE items (value INTEGER UNIQUE)')
+    conn.close()
+    return path
+
+
+def values(path):
+    conn = sqlite3.connect(path)
+    try:
+        return [row[0] for row in conn.execute('SELECT value FROM items ORDER BY value')]
+    finally:
+        conn.close()
+
+
+def insert(conn, *items):
+    for value in items:
+        conn.execute('INSERT INTO items (value) VALUES (?)', (value,))
+    return len(items)
+
+
+def hold(writer):
+    """Keep the writer busy until the returned event is set, so the next commands share one batch"""
+    started, release = threading.Event(), threading.Event()
+
+    def wait(conn):
+        started.set()
+        release.wait(5)
+
+    writer.submit(wait)
+    started.wait(5)
+    return release
+
+
+def test_failing_command_rolls_back_alone(path):
+    writer = SQLiteWriter(path)
+    release = hold(writer)
+    before = writer.submit(insert, 1, 2)
+    # Inserts 3, then violates the unique constraint: both are undone
+    failing = writer.submit(insert, 3, 1)
+    after = writer.submit(insert, 4)
+    release.set()
+
+    assert before.result(5) == 2
+    assert after.result(5) == 1
+    with pytest.raises(sqlite3.IntegrityError):
+        failing.result(5)
+    assert values(path) == [1, 2, 4]
+
+    stats = writer.stats()
+    assert (stats['batches'], stats['commands'], stats['failed_commands'], stats['failed_batches']) == (2, 4, 1, 0)
+    writer.close()
+
+
+def test_errors_reach_the_caller(path):
+    writer = SQLiteWriter(path)
+
+    def broken(conn):
+        raise ValueError('bad command')
+
+    with pytest.raises(ValueError, match='bad command'):
+        writer.submit(broken).result(5)
+    assert writer.submit(insert, 1).result(5) == 1
+    writer.close()
+
+
+def test_close_drains_queued_commands(path):
+    writer = SQLiteWriter(path, batch_size=3)
+    release = hold(writer)
+    futures = [writer.submit(insert, value) for value in range(10)]
+
+    threading.Timer(0.05, release.set).start()
+    writer.close()
+
+    assert all(future.done() for future in futures)
+    assert values(path) == list(range(10))
+    assert not writer.stats()['running']
+    with pytest.raises(RuntimeError):
+        writer.submit(insert, 99)
+
+
+def test_database_writes_through_writer(tmp_path):
+    db = Database(str(tmp_path / 'trustai.db'), single_writer=True)
+    user_id = db.create_user('alice', 'alice@example.com', 'hash')
+    db.store_trust_score(user_id, RESULT)
+
+    assert db.get_user(user_id)['trust_score'] == 72.5
+    assert db.get_pool_stats()['writer']['commands'] >= 2
+
+    # Pooled connections are read-only in single-writer mode
+    conn = db.get_connection()
+    try:
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("DELETE FROM users")
+    finally:
+        conn.close()
+    db.close()
@@ -0,0 +1,157 @@
+"""
+TrustStore contract: every backend stores and reads back scoring history the same way
+"""
+
+from datetime import datetime
+
+import pytest
+
+from src.device_fingerprint import format_fingerprint
+from src.storage import TrustStore
+from src.trust_engine import TrustEngine
+
+from conftest import BACKENDS, make_store
+
+RESULT = {'score': 72.5, 'risk_level': 'low', 'decision': 'allow', 'risk_factors': {}}
+
+PHONE = {
+    'browser': 'Mobile Safari', 'browser_version': '17', 'os': 'iOS', 'os_version': '17',
+    'device_type': 'mobile', 'device_model': 'iPhone', 'network': '10.0.0.0/24'
+}
+
+
+def fingerprint(**changes) -> str:
+    return format_fingerprint(dict(PHONE, **changes))
+
+
+def test_implements_protocol(store):
+    assert isinstance(store, TrustStore)
+
+
+def test_users(store):
+    user_id = store.create_user('alice', 'alice@example.com', 'hash')
+
+    assert store.get_user(user_id)['username'] == 'alice'
+    assert store.get_user_by_username('alice')['id'] == user_id
+    assert store.get_user_by_email('alice@example.com')['id'] == user_id
+    assert store.get_user(user_id + 1000) is None
+    assert store.create_user('alice', 'other@example.com', 'hash') is None
+
+    store.set_user_verified(user_id)
+    assert store.get_user(user_id)['verified']
+
+
+def test_device_fingerprints_upsert_and_index(store):
+    user_id = store.create_user('alice', 'alice@example.com', 'hash')
+    known, other_network = fingerprint(), fingerprint(network='10.9.9.0/24')
+    store.store_device_fingerprint(user_id, known)
+    store.store_device_fingerprint(user_id, known)
+    store.store_device_fingerprint(user_id, 'legacy-hash')
+
+    devices = {device['fingerprint']: device for device in store.get_user_devices(user_id)}
+    assert devices[known]['seen_count'] == 2
+    assert store.get_user_snapshot(user_id).device_count == 2
+
+    # Shares the indexed components except the network
+    assert store.find_similar_devices(user_id, other_network) == [known]
+    # Shares only browser, os and device type: not a candidate
+    stranger = fingerprint(browser_version='1', os_version='1', device_model='Other', network='')
+    assert store.find_similar_devices(user_id, stranger) == []
+    assert store.find_similar_devices(user_id, 'legacy-hash') == ['legacy-hash']
+    assert store.find_similar_devices_bulk([(user_id, known), (user_id, stranger)]) == [[known], []]
+
+
+def test_user_locations_upsert(store):
+    user_id = store.create_user('alice', 'alice@example.com', 'hash')
+    store.store_user_location(user_id, '203.0.113.7', {'latitude': 52.52, 'longitude': 13.40, 'city': 'Berlin'})
+    store.store_user_location(user_id, '203.0.113.7', {})
+
+    [location] = store.get_user_locations(user_id)
+    assert location['seen_count'] == 2
+    assert location['city'] == 'Berlin'
+    assert len(store.get_user_snapshot(user_id).location_clusters) == 1
+
+
+def test_activities_feed_snapshot(store):
+    user_id = store.create_user('alice', 'alice@example.com', 'hash')
+    for merchant in ('Amazon', 'Amazon', 'Etsy'):
+        context = {'merchant': merchant, 'amount': 20.0, 'timestamp': datetime(2026, 10, 14, 9)}
+        store.log_activity(user_id, 'transaction', RESULT, context)
+    store.log_activity(user_id, 'login', RESULT, {'timestamp': datetime(2026, 10, 14, 21)})
+
+    snapshot = store.get_user_snapshot(user_id)
+    assert snapshot.time_patterns['typical_hours'] == [9, 21]
+    assert snapshot.behavior_profile.activity_count == 4
+    assert snapshot.behavior_profile.action_counts == {'transaction': 3, 'login': 1}
+    assert snapshot.behavior_profile.merchant_counts == {'Amazon': 2, 'Etsy': 1}
+
+
+def test_transactions_feed_velocity_and_amount_stats(store):
+    user_id = store.create_user('alice', 'alice@example.com', 'hash')
+    for amount in (10.0, 20.0, 30.0):
+        store.log_transaction(user_id, amount, 'Amazon', 'purchase', 70.0, 'low')
+
+    snapshot = store.get_user_snapshot(user_id)
+    assert snapshot.velocity[3600] == {'count': 3, 'amount': 60.0}
+    assert snapshot.amount_stats.count == 3
+    assert snapshot.amount_stats.mean == pytest.approx(20.0)
+
+
+def test_trust_scores(store):
+    user_id = store.create_user('alice', 'alice@example.com', 'hash')
+    store.store_trust_score(user_id, dict(RESULT, score=60.0))
+    store.store_trust_score(user_id, dict(RESULT, score=80.0))
+
+    user = store.get_user(user_id)
+    assert user['trust_score'] == 80.0
+    assert 60.0 < user['decayed_trust_score'] < 80.0
+    assert [row['score'] for row in store.get_trust_score_history(user_id)] == [80.0, 60.0]
+
+
+def test_score_factors_follow_writes(store):
+    user_id = store.create_user('alice', 'alice@example.com', 'hash')
+    before = store.get_score_factors(user_id)
+    store.store_device_fingerprint(user_id, fingerprint())
+    store.store_device_fingerprint(user_id, fingerprint())
+    store.set_user_verified(user_id)
+
+    after = store.get_score_factors(user_id)
+    assert (before['device_trust'], after['device_trust']) == (50.0, 55.0)
+    assert after['verification_status'] and not before['verification_status']
+
+
+def test_bulk_snapshots_match_single(store):
+    user_ids = [store.create_user(name, f'{name}@example.com', 'hash') for name in ('alice', 'bob')]
+    store.store_device_fingerprint(user_ids[0], fingerprint())
+    store.log_transaction(user_ids[1], 42.0, 'Etsy', 'purchase', 70.0, 'low')
+    store.log_activity(user_ids[1], 'login', RESULT, {'timestamp': datetime(2026, 10, 14, 9)})
+
+    snapshots = store.get_user_snapshots(user_ids)
+    for user_id in user_ids:
+        single = store.get_user_snapshot(user_id)
+        assert snapshots[user_id].device_count == single.device_count
+        assert snapshots[user_id].velocity == single.velocity
+        assert snapshots[user_id].time_patterns == single.time_patterns
+        assert vars(snapshots[user_id].behavior_profile) == vars(single.behavior_profile)
+
+
+def test_backends_score_alike(tmp_path):
+    contexts = [
+        {
+            'action': 'transaction', 'amount': amount, 'merchant': 'Amazon', 'transaction_type': 'purchase',
+            'ip_address': '10.0.0.5', 'timestamp': datetime(2026, 10, 14, 12),
+            'user_agent': 'Mozilla/5.0 (iPhone; CPU iPhone OS 17_1 like Mac OS X) AppleWebKit/605.1.15 '
+                          '(KHTML, like Gecko) Version/17.1 Mobile/15E148 Safari/604.1'
+        }
+        for amount in (25.0, 40.0, 5000.0)
+    ]
+
+    factors = {}
+    for backend in BACKENDS:
+        store = make_store(backend, tmp_path)
+        engine = TrustEngine(store)
+        user_id = store.create_user('alice', 'alice@example.com', 'hash')
+        factors[backend] = [engine.analyze_activity(dict(context, user_id=user_id))['risk_factors'] for context in contexts]
+        store.close()
+
+    assert all(result == factors['sqlite'] for result in factors.values())
@@ -0,0 +1,45 @@
+"""
+Time-decayed trust score folding
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.trust_decay import TRUST_SCORE_HALF_LIFE_HOURS, fold_trust_scores
+
+NOW = datetime(2026, 10, 14, 12, 0, 0)
+
+
+def test_first_scores_average():
+    assert fold_trust_scores(None, 0.0, None, 150.0, 2, NOW) == (75.0, 2.0)
+
+
+def test_same_time_scores_weigh_equally():
+    score, weight = fold_trust_scores(60.0, 1.0, NOW, 80.0, 1, NOW)
+    assert (score, weight) == (70.0, 2.0)
+
+
+def test_older_scores_decay_by_half_life():
+    updated_at = NOW - timedelta(hours=TRUST_SCORE_HALF_LIFE_HOURS)
+    score, weight = fold_trust_scores(40.0, 2.0, updated_at, 100.0, 1, NOW)
+
+    # The old weight halved to 1, so old and new count the same
+    assert weight == pytest.approx(2.0)
+    assert score == pytest.approx(70.0)
+
+    # Also accepts the stored 'YYYY-MM-DD HH:MM:SS' string
+    assert fold_trust_scores(40.0, 2.0, updated_at.strftime('%Y-%m-%d %H:%M:%S'), 100.0, 1, NOW) == (score, weight)
+
+
+def test_matches_weighted_average_of_history():
+    history = [(NOW - timedelta(hours=hours), value) for hours, value in ((72, 20.0), (30, 90.0), (5, 50.0), (0, 65.0))]
+
+    score, weight, updated_at = None, 0.0, None
+    for at, value in history:
+        score, weight = fold_trust_scores(score, weight, updated_at, value, 1, at)
+        updated_at = at
+
+    decays = [0.5 ** ((NOW - at).total_seconds() / 3600 / TRUST_SCORE_HALF_LIFE_HOURS) for at, _ in history]
+    assert weight == pytest.approx(sum(decays))
+    assert score == pytest.approx(sum(d * value for d, (_, value) in zip(decays, history)) / sum(decays))
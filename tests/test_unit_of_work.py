@@ -0,0 +1,149 @@
+"""
+Unit of work: one decision's writes commit or roll back together on every backend
+"""
+
+from datetime import datetime
+
+import pytest
+
+from src.memory_backend import InMemoryDatabase
+from src.trust_engine import TrustEngine
+
+from conftest import make_store
+
+RESULT = {'score': 72.5, 'risk_level': 'low', 'decision': 'allow', 'risk_factors': {}}
+BERLIN = {'latitude': 52.52, 'longitude': 13.40, 'city': 'Berlin', 'country': 'DE'}
+USER_AGENT = ('Mozilla/5.0 (iPhone; CPU iPhone OS 17_1 like Mac OS X) AppleWebKit/605.1.15 '
+              '(KHTML, like Gecko) Version/17.1 Mobile/15E148 Safari/604.1')
+
+
+def decision_writes(uow, user_id, result=RESULT):
+    uow.log_activity(user_id, 'transaction', RESULT, {'merchant': 'Amazon', 'amount': 25.0})
+    uow.log_transaction(user_id, 25.0, 'Amazon', 'purchase', 72.5, 'low')
+    uow.store_device_fingerprint(user_id, 'phone')
+    uow.store_user_location(user_id, '203.0.113.7', BERLIN)
+    uow.store_trust_score(user_id, result)
+
+
+def history(store, user_id):
+    """Everything a decision writes, as the store reports it"""
+    snapshot = store.get_user_snapshot(user_id)
+    user = store.get_user(user_id)
+    return {
+        'activities': len(store.get_user_activities(user_id)),
+        'transactions': [row['amount'] for row in store.get_user_transactions(user_id)],
+        'devices': {row['fingerprint']: row['seen_count'] for row in store.get_user_devices(user_id)},
+        'locations': {row['ip_address']: row['seen_count'] for row in store.get_user_locations(user_id)},
+        'scores': [row['score'] for row in store.get_trust_score_history(user_id)],
+        'trust_score': (user['trust_score'], user['decayed_trust_score']),
+        'velocity': snapshot.velocity,
+        'amounts': (snapshot.amount_stats.count, round(snapshot.amount_stats.mean, 6)),
+        'clusters': [(round(c['latitude'], 6), c['weight']) for c in snapshot.location_clusters],
+        'profile': (snapshot.behavior_profile.activity_count, dict(snapshot.behavior_profile.merchant_counts)),
+        'hours': snapshot.time_patterns,
+        'similar_devices': store.find_similar_devices(user_id, 'phone'),
+    }
+
+
+def test_commits_together(store):
+    user_id = store.create_user('alice', 'alice@example.com', 'hash')
+    before = history(store, user_id)
+
+    with store.unit_of_work() as uow:
+        decision_writes(uow, user_id)
+        # Nothing is written until the unit of work commits
+        assert history(store, user_id) == before
+
+    after = history(store, user_id)
+    assert after['activities'] == 1
+    assert after['transactions'] == [25.0]
+    assert after['devices'] == {'phone': 1}
+    assert after['locations'] == {'203.0.113.7': 1}
+    assert after['scores'] == [72.5]
+    assert after['velocity'][3600] == {'count': 1, 'amount': 25.0}
+
+
+def test_failing_write_rolls_back_the_group(store):
+    user_id = store.create_user('alice', 'alice@example.com', 'hash')
+    with store.unit_of_work() as uow:
+        decision_writes(uow, user_id)
+    before = history(store, user_id)
+
+    # The trust score comes last and has no score: every write before it is undone
+    with pytest.raises(KeyError):
+        with store.unit_of_work() as uow:
+            decision_writes(uow, user_id, result={'risk_factors': {}})
+
+    assert history(store, user_id) == before
+
+
+def test_failing_write_leaves_new_user_untouched(store):
+    user_id = store.create_user('alice', 'alice@example.com', 'hash')
+    before = history(store, user_id)
+
+    with pytest.raises(KeyError):
+        store.apply_writes([
+            ('store_device_fingerprint', (user_id, 'laptop')),
+            ('apply_writes', ([('log_transaction', (user_id, 10.0, 'Etsy', 'purchase', 70.0, 'low', None))],)),
+            ('store_trust_score', (user_id, {})),
+        ])
+
+    assert history(store, user_id) == before
+    assert store.find_similar_devices(user_id, 'laptop') == []
+
+
+def test_block_error_discards_writes(store):
+    user_id = store.create_user('alice', 'alice@example.com', 'hash')
+    before = history(store, user_id)
+
+    with pytest.raises(RuntimeError):
+        with store.unit_of_work() as uow:
+            decision_writes(uow, user_id)
+            raise RuntimeError('scoring failed')
+
+    assert history(store, user_id) == before
+
+
+def test_analyze_activities(store, tmp_path):
+    user_ids = [store.create_user(name, f'{name}@example.com', 'hash') for name in ('alice', 'bob', 'carol')]
+    contexts = [
+        {
+            'user_id': user_id, 'action': 'transaction', 'amount': amount, 'merchant': 'Amazon',
+            'transaction_type': 'purchase', 'ip_address': '10.0.0.5', 'user_agent': USER_AGENT,
+            'timestamp': datetime(2026, 10, 14, 12)
+        }
+        for user_id, amount in zip(user_ids, (25.0, 400.0, 9000.0))
+    ]
+
+    results = TrustEngine(store).analyze_activities(contexts)
+
+    # Each user's first decision: the batch scores match one-by-one scoring
+    for context, result in zip(contexts, results):
+        fresh = make_store('memory', tmp_path)
+        user_id = fresh.create_user('dave', 'dave@example.com', 'hash')
+        single = TrustEngine(fresh).analyze_activity(dict(context, user_id=user_id))
+        assert result['risk_factors'] == pytest.approx(single['risk_factors'])
+        assert (result['score'], result['decision']) == (single['score'], single['decision'])
+    for user_id, result in zip(user_ids, results):
+        assert [row['score'] for row in store.get_trust_score_history(user_id)] == [result['score']]
+        assert len(store.get_user_devices(user_id)) == 1
+    assert TrustEngine(store).analyze_activities([]) == []
+
+
+def test_memory_rollback_restores_full_activity_log():
+    store = InMemoryDatabase(activity_log_limit=3)
+    user_id = store.create_user('alice', 'alice@example.com', 'hash')
+    for _ in range(3):
+        store.log_activity(user_id, 'login', RESULT, {})
+    before = [activity['id'] for activity in store._activity_log]
+
+    # Two more activities push the two oldest out of the full log before the failure
+    with pytest.raises(KeyError):
+        store.apply_writes([
+            ('log_activity', (user_id, 'login', RESULT, {})),
+            ('log_activity', (user_id, 'login', RESULT, {})),
+            ('store_trust_score', (user_id, {})),
+        ])
+
+    assert [activity['id'] for activity in store._activity_log] == before
+    assert len(store.get_user_activities(user_id)) == 3
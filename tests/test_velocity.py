@@ -0,0 +1,107 @@
+"""
+Sliding-window transaction velocity: in-process rings and their SQLite persistence
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+import maintenance
+from src.database import Database
+from src.velocity import VelocityCounters, empty_velocity, load_velocity, save_velocity, window_starts
+
+NOW = datetime(2026, 10, 14, 12, 0, 0)
+
+
+def test_counts_per_window():
+    counters = VelocityCounters()
+    for seconds_ago, amount in ((10, 5.0), (120, 10.0), (1800, 20.0), (7200, 40.0)):
+        counters.add(1, NOW - timedelta(seconds=seconds_ago), amount)
+
+    assert counters.get(1, NOW) == {
+        60: {'count': 1, 'amount': 5.0},
+        300: {'count': 2, 'amount': 15.0},
+        3600: {'count': 3, 'amount': 35.0},
+        86400: {'count': 4, 'amount': 75.0},
+    }
+    assert counters.get(2, NOW) == empty_velocity()
+
+
+def test_windows_expire():
+    counters = VelocityCounters()
+    counters.add(1, NOW, 5.0)
+
+    later = counters.get(1, NOW + timedelta(minutes=2))
+    assert later[60]['count'] == 0
+    assert later[300] == {'count': 1, 'amount': 5.0}
+    assert counters.get(1, NOW + timedelta(days=2)) == empty_velocity()
+
+
+def test_events_older_than_a_window_are_ignored():
+    counters = VelocityCounters()
+    counters.add(1, NOW, 5.0)
+    counters.add(1, NOW - timedelta(minutes=10), 7.0)
+
+    velocity = counters.get(1, NOW)
+    assert velocity[60]['count'] == 1
+    assert velocity[300]['count'] == 1
+    assert velocity[3600] == {'count': 2, 'amount': 12.0}
+
+
+def test_window_starts_match_the_rings():
+    counters = VelocityCounters()
+    starts = window_starts(NOW)
+    for window, start in starts.items():
+        counters.add(window, start, 1.0)
+        counters.add(window, start - timedelta(seconds=1), 1.0)
+
+    for window in starts:
+        assert counters.get(window, NOW)[window]['count'] == 1
+
+
+def test_sqlite_round_trip(tmp_path):
+    db = Database(str(tmp_path / 'trustai.db'))
+    counters = VelocityCounters()
+    counters.add(1, NOW - timedelta(seconds=30), 5.0)
+    counters.add(1, NOW - timedelta(hours=2), 10.0)
+    counters.add(2, NOW, 1.0)
+
+    conn = db.get_connection()
+    try:
+        save_velocity(conn, counters)
+        save_velocity(conn, counters)   # saving the same buckets again adds them up
+        conn.commit()
+        velocities = load_velocity(conn, [1, 2, 3], NOW)
+    finally:
+        conn.close()
+
+    assert velocities[1][60] == {'count': 2, 'amount': 10.0}
+    assert velocities[1][86400] == {'count': 4, 'amount': 30.0}
+    assert velocities[2][60] == {'count': 2, 'amount': 2.0}
+    assert velocities[3] == empty_velocity()
+    db.close()
+
+
+def test_rebuild_velocity_command(tmp_path):
+    db = Database(str(tmp_path / 'trustai.db'))
+    user_id = db.create_user('alice', 'alice@example.com', 'hash')
+    db.log_transaction(user_id, 25.0, 'Amazon', 'purchase', 70.0, 'low')
+    conn = db.get_connection()
+    try:
+        conn.execute('DELETE FROM transaction_velocity')
+        conn.commit()
+    finally:
+        conn.close()
+
+    maintenance.rebuild_velocity(db)
+    assert db.get_user_snapshot(user_id).velocity[60] == {'count': 1, 'amount': 25.0}
+    db.close()
+
+
+def test_rebuild_velocity_command_refuses_memory_store(tmp_path):
+    # The counters live in the server processes; a rebuild here would not reach them
+    db = Database(str(tmp_path / 'trustai.db'), velocity_store='memory')
+
+    with pytest.raises(SystemExit, match='restart the servers'):
+        maintenance.rebuild_velocity(db)
+    db.close()
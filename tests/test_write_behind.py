@@ -0,0 +1,165 @@
+"""
+Write-behind queue: group commit limits and shutdown
+"""
+
+import threading
+import time
+
+import pytest
+
+from src.database import Database
+from src.write_behind import WriteBehindQueue
+
+RESULT = {'score': 72.5, 'risk_level': 'low', 'decision': 'allow', 'risk_factors': {}}
+
+
+class RecordingStore:
+    """Backend stand-in that records each committed batch; the first commit can be held open"""
+
+    def __init__(self, hold_first: bool = False):
+        self.batches = []
+        self.direct = []
+        self.lock = threading.Lock()
+        self.first_started = threading.Event()
+        self.release = threading.Event()
+        if not hold_first:
+            self.release.set()
+
+    def apply_writes(self, writes):
+        self.first_started.set()
+        self.release.wait(5)
+        with self.lock:
+            self.batches.append(list(writes))
+
+    def log_activity(self, *args):
+        with self.lock:
+            self.direct.append(('log_activity', args))
+
+    def store_trust_score(self, *args):
+        with self.lock:
+            self.direct.append(('store_trust_score', args))
+
+    def written(self):
+        with self.lock:
+            return [write for batch in self.batches for write in batch] + self.direct
+
+
+def test_flushes_at_batch_size():
+    store = RecordingStore(hold_first=True)
+    queue = WriteBehindQueue(store, batch_size=2, max_delay_ms=10000)
+
+    started = time.monotonic()
+    queue.store_trust_score(1, RESULT)
+    queue.store_trust_score(2, RESULT)
+    store.first_started.wait(5)
+    # Queued while the first batch commits: taken in full batches
+    for user_id in range(3, 9):
+        queue.store_trust_score(user_id, RESULT)
+    store.release.set()
+    queue.flush()
+
+    # Full batches never wait out max_delay_ms
+    assert time.monotonic() - started < 5
+    assert [len(batch) for batch in store.batches] == [2, 2, 2, 2]
+    queue.close()
+
+
+def test_flushes_after_max_delay():
+    store = RecordingStore()
+    queue = WriteBehindQueue(store, batch_size=100, max_delay_ms=100)
+
+    started = time.monotonic()
+    queue.store_trust_score(1, RESULT)
+    time.sleep(0.02)
+    queue.store_trust_score(2, RESULT)
+    queue.flush()
+
+    # One batch, committed once the first write had waited max_delay_ms
+    assert time.monotonic() - started >= 0.1
+    assert [len(batch) for batch in store.batches] == [2]
+    queue.close()
+
+
+def test_no_delay_commits_what_is_waiting():
+    store = RecordingStore()
+    queue = WriteBehindQueue(store, batch_size=100)
+
+    queue.store_trust_score(1, RESULT)
+    queue.flush()
+
+    assert [len(batch) for batch in store.batches] == [1]
+    assert queue.stats()['written'] == 1
+    queue.close()
+
+
+def test_close_drains_queue():
+    store = RecordingStore(hold_first=True)
+    queue = WriteBehindQueue(store, batch_size=10)
+    for user_id in range(25):
+        queue.store_trust_score(user_id, RESULT)
+
+    threading.Timer(0.05, store.release.set).start()
+    queue.close()
+
+    assert sorted(args[0] for _, args in store.written()) == list(range(25))
+    assert not queue.stats()['running']
+
+
+def test_submits_racing_close_are_never_dropped():
+    store = RecordingStore()
+    queue = WriteBehindQueue(store, batch_size=8)
+    go = threading.Event()
+
+    def submit(thread):
+        go.wait(5)
+        for n in range(200):
+            queue.log_activity(thread * 1000 + n, 'login', RESULT, {})
+
+    threads = [threading.Thread(target=submit, args=(thread,)) for thread in range(4)]
+    for thread in threads:
+        thread.start()
+    go.set()
+    time.sleep(0.001)
+    queue.close()
+    for thread in threads:
+        thread.join(5)
+
+    # Queued before close (committed by the writer) or written directly after it
+    written = [args[0] for _, args in store.written()]
+    assert sorted(written) == sorted(thread * 1000 + n for thread in range(4) for n in range(200))
+
+
+def test_failed_batch_is_written_one_by_one():
+    class FailingBatchStore(RecordingStore):
+        def apply_writes(self, writes):
+            raise RuntimeError('constraint failed')
+
+    store = FailingBatchStore()
+    queue = WriteBehindQueue(store)
+    queue.log_activity(1, 'login', RESULT, {})
+    queue.store_trust_score(1, RESULT)
+    queue.close()
+
+    assert [method for method, _ in store.direct] == ['log_activity', 'store_trust_score']
+    assert queue.stats()['failed_batches'] == 1
+
+
+def test_persists_to_database(tmp_path):
+    db = Database(str(tmp_path / 'trustai.db'))
+    user_id = db.create_user('alice', 'alice@example.com', 'hash')
+    queue = WriteBehindQueue(db, max_delay_ms=5)
+
+    with queue.unit_of_work() as uow:
+        uow.log_activity(user_id, 'login', RESULT, {})
+        uow.store_trust_score(user_id, RESULT)
+    queue.store_trust_score(user_id, dict(RESULT, score=40.0))
+    queue.close()
+
+    assert [row['score'] for row in db.get_trust_score_history(user_id)] == [40.0, 72.5]
+    assert db.get_user(user_id)['trust_score'] == 40.0
+    db.close()
+
+
+def test_rejects_empty_batches():
+    with pytest.raises(ValueError):
+        WriteBehindQueue(RecordingStore(), batch_size=0)